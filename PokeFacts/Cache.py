@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# Cache.py
+# ~~~~~~~~
+# Small caching helpers shared by the lookup code
+
+import threading
+
+from collections import OrderedDict
+
+# size-bounded least-recently-used cache with hit/miss/eviction counters
+# a maxsize of 0 (or less) disables the cache, every `get` is then a miss
+class LRUCache():
+
+    def __init__(self, maxsize=128):
+        self.maxsize    = maxsize
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+        self._data      = OrderedDict()
+        self._lock      = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size':         len(self._data),
+            'maxsize':      self.maxsize,
+            'hits':         self.hits,
+            'misses':       self.misses,
+            'evictions':    self.evictions,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
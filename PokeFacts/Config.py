@@ -58,6 +58,47 @@ RESPONDER_CHECK_MENTIONS = True
 # should respond to mentions in subreddits outside of SUBREDDITS?
 RESPONDER_CHECK_MENTIONS_OTHER_SUBREDDITS = True
 
+# INGESTION CONFIG
+# ----------------
+
+# each listing (comments, submissions, edited comments) is polled at an
+# interval that follows its traffic (see Ingestion.py), in seconds, at least
+# INGEST_MIN_INTERVAL and at most INGEST_MAX_INTERVAL apart. The inbox is
+# polled every INGEST_MIN_INTERVAL
+INGEST_MIN_INTERVAL = 5
+INGEST_MAX_INTERVAL = 120
+
+# the intervals aim at getting about this many new things per poll
+INGEST_TARGET_BATCH = 20
+
+# listing requests per minute for all the listings together, the intervals
+# are stretched when they'd go over it (replies are not counted)
+INGEST_REQUESTS_PER_MINUTE = 30
+
+# reddit returns nothing newer than a deleted thing, so the cursor of a
+# listing is dropped after this many polls in a row with nothing new
+INGEST_CURSOR_RESET_POLLS = 10
+
+# PIPELINE CONFIG
+# ---------------
+
+# if true, the calls are looked up on a resolver thread and the replies are
+# sent by reply workers (see Pipeline.py), instead of one thing at a time
+# by the main loop
+PIPELINE_ENABLED = True
+
+# number of threads sending replies
+PIPELINE_REPLY_WORKERS = 4
+
+# things waiting to be resolved, and replies waiting to be sent (per
+# worker), at most. The main loop waits when they're full
+PIPELINE_QUEUE_SIZE = 100
+
+# replies per second at most, and how many can be sent at once after a
+# pause. Below that the rate follows the rate limit reddit reports
+PIPELINE_REPLY_RATE = 1.0
+PIPELINE_REPLY_BURST = 5
+
 # IDENTIFIER CONFIG
 # -----------------
 
@@ -92,6 +133,79 @@ DATA_CONF = {
 }
 DATA_USE_SYMSPELL = True
 
+# only the first letters of each word are used to build the SymSpell
+# dictionary, which keeps it small (`None` to use whole words, otherwise
+# must be greater than the max edit distance of 3)
+DATA_SYMSPELL_PREFIX_LENGTH = 7
+
+# similarity scorer used to rank term candidates (see Similarity.py)
+#  - "sequencematcher": difflib.SequenceMatcher, the reference scorer
+#  - "indel": fast normalized indel (longest common subsequence) ratio, but
+#    about 1% of the misspelled searches resolve to another item with it
+DATA_SCORER = "sequencematcher"
+
+# when no word of a search term is known to any type (e.g. run-together or
+# garbled names), the candidates are the terms sharing the most trigrams
+# (3 letter sequences) with it instead:
+DATA_TRIGRAM_CANDIDATES = 25    # at most this many candidates are scored
+DATA_TRIGRAM_MIN_OVERLAP = 0.5  # trigrams in common, as a share of the trigrams of
+                                # both the term and the candidate (Dice coefficient)
+DATA_TRIGRAM_MIN_RATIO = 0.8    # similarity the best candidate needs to exceed to be used
+
+# a search term that only one item's terms start with (e.g. "crob" for "crobat")
+# is resolved to that item before any spelling correction, if it has at least
+# this many characters
+DATA_PREFIX_MIN_LENGTH = 4
+
+# precompiled snapshot of the built search index, used on start/reload
+# when the data files haven't changed (set to `None` to always rebuild)
+# build it ahead of time with `python -m PokeFacts.Snapshot`
+DATA_SNAPSHOT_FILE = '/data/store.snapshot'
+
+# keep only the search index in memory, the data of the items is written to
+# the payload file (when the store is built) and read from it when needed
+DATA_LAZY_PAYLOADS = False
+DATA_PAYLOAD_FILE = '/data/items.payload'
+DATA_PAYLOAD_CACHE_SIZE = 64 # number of decoded items kept in memory
+
+# number of search results kept in the LRU result cache (0 to disable)
+DATA_CACHE_SIZE = 2048
+
+# number of spelling corrections remembered by each store, a word is
+# corrected once and the correction reused by every searched type (0 disables it)
+DATA_CORRECTION_CACHE_SIZE = 8192
+
+# DONE QUEUE CONFIG
+# -----------------
+
+# the things the bot processed are remembered (to not reply twice, and to
+# edit the reply when they're edited) for DONE_TTL seconds, the most
+# recently used DONE_MEMORY_SIZE of them in memory (see DoneQueue.py)
+DONE_TTL = 7 * 24 * 3600
+DONE_MEMORY_SIZE = 100000
+
+# SQLite file keeping them across restarts (set to `None` to keep them in
+# memory only). Processed things are written every DONE_BATCH_SIZE things or
+# DONE_FLUSH_INTERVAL seconds, replies right away
+DONE_STORE_FILE = '/data/done.sqlite3'
+DONE_BATCH_SIZE = 100
+DONE_FLUSH_INTERVAL = 10
+
+# after a restart, the things posted while the bot was down are answered,
+# if it was down for less than this many seconds (only the last ones otherwise)
+DONE_CATCHUP_MAX = 3600
+
+# METRICS CONFIG
+# --------------
+
+# time the stages of every lookup and record the candidate set sizes, to see
+# where the time of slow calls goes (see Metrics.py and the "SearchMetrics"
+# operator command). Can be switched with "ReloadConfig"
+METRICS_ENABLED = False
+
+# number of samples kept per stage
+METRICS_WINDOW = 1000
+
 # RESPONSE CONFIG
 # ---------------
 
@@ -99,6 +213,13 @@ REPLY_TEMPLATE_FILE = "/data/response.txt"
 REPLY_SHOULD_STICKY = False # should sticky comment if reply is top level?
 REPLY_SHOULD_DISTINGUISH = False # should distinguish comment?
 
+# the response of each item is rendered once per data load, when the item is
+# first called. Set to render the responses of all the items when the data
+# is (re)loaded instead. Ignored when DATA_LAZY_PAYLOADS is set: rendering
+# every item reads all of their data back into memory, which is what the
+# lazy payloads avoid
+REPLY_PRERENDER = False
+
 # MATCH STRING
 # ------------
 
@@ -120,14 +241,15 @@ MATCH_STANDALONE_VALUE      = r"[A-Za-zÀ-ÿ0-9\'\-]+"
 
 # DO NOT CHANGE ANYTHING BELOW THIS LINE
 # --------------------------------------
+# the named groups are read by Helpers.CallExtractor
 MATCH_STRING  = ''
-MATCH_STRING += '(' + '|'.join(re.escape(item) for item in MATCH_PAIR_PREFIXES) + ')'
-MATCH_STRING += MATCH_PAIR_VALUE
-MATCH_STRING += '(' + '|'.join(re.escape(item) for item in MATCH_PAIR_SUFFIXES) + ')'
+MATCH_STRING += '(?P<pair_prefix>' + '|'.join(re.escape(item) for item in MATCH_PAIR_PREFIXES) + ')'
+MATCH_STRING += '(?P<pair_identifier>' + MATCH_PAIR_VALUE + ')'
+MATCH_STRING += '(?P<pair_suffix>' + '|'.join(re.escape(item) for item in MATCH_PAIR_SUFFIXES) + ')'
 MATCH_STRING += '|'
-MATCH_STRING += r"(?:^|\s+)"
-MATCH_STRING += '(' + '|'.join(re.escape(item) for item in MATCH_STANDALONE_PREFIXES) + ')'
-MATCH_STRING += MATCH_STANDALONE_VALUE
+MATCH_STRING += r"(?<!\S)" # at the start or after whitespace, which isn't part of the match
+MATCH_STRING += '(?P<standalone_prefix>' + '|'.join(re.escape(item) for item in MATCH_STANDALONE_PREFIXES) + ')'
+MATCH_STRING += '(?P<standalone_identifier>' + MATCH_STANDALONE_VALUE + ')'
 if not type(SUBREDDITS) == list or len(SUBREDDITS) == 0 or "all" in SUBREDDITS:
     print("Invalid Configuration!")
     sys.exit(0)
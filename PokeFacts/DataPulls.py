@@ -1,20 +1,34 @@
 #!/usr/bin/env python3
 
-import re
 import sys
 import json
+import heapq
+import bisect
+import time
+import types
 import codecs
+import threading
 
-from difflib import SequenceMatcher
+from array import array
 from collections import Counter
 
 try:
+    from PokeFacts import Cache
     from PokeFacts import Config
     from PokeFacts import Helpers
+    from PokeFacts import Metrics
+    from PokeFacts import Payloads
+    from PokeFacts import Similarity
+    from PokeFacts import Snapshot
     from PokeFacts import SymSpell
 except ImportError:
+    import Cache
     import Config
     import Helpers
+    import Metrics
+    import Payloads
+    import Similarity
+    import Snapshot
     import SymSpell
 
 # DataPulls.py
@@ -28,6 +42,7 @@ class DataPulls():
         self.store = None
         self.reloadFunc = None
         self.scriptpath = None
+        self.reloadLock = threading.Lock()
 
         if store:
             self.store = store
@@ -37,22 +52,49 @@ class DataPulls():
             self.reload()
 
     # reload - should reload the data to pull from
-    def reload(self):
+    # the new store is fully built before it replaces the current one,
+    # lookups always run against a single, complete store
+    # prepare: prepare(store) is called with the new store before it
+    # replaces the current one, while nothing else uses it yet
+    def reload(self, prepare=None):
         if self.reloadFunc:
             self.reloadFunc()
+            if prepare:
+                prepare(self.store)
         elif self.scriptpath:
-            self.store = ItemStore(Config.DATA_CONF)
-
-            for file in Config.DATA_FILES:
-                file = self.scriptpath + '/' + file.lstrip('/')
-                with codecs.open(file, "r", "utf-8") as data_file:
-                    self.store.addItems(json.load(data_file))
-
-            for file in Config.DATA_SYNONYM_FILES:
-                file = self.scriptpath + '/' + file.lstrip('/')
-                with codecs.open(file, "r", "utf-8") as data_file:
-                    self.store.addSynonyms(json.load(data_file))
+            store = loadStore(self.scriptpath)
+            if prepare:
+                prepare(store)
+            self.store = store
 
+    # reloadAsync - reloads the data on a background thread, the current
+    # store keeps serving lookups until the new one is swapped in. If the
+    # reload fails (e.g. invalid json) the current store is kept.
+    # When done, calls `callback(store, seconds, error)` from the
+    # background thread, `error` is None if the reload succeeded.
+    # `prepare` is as in reload, an error in it fails the reload.
+    # Returns False if a reload is already in progress
+    def reloadAsync(self, callback=None, prepare=None):
+        if not self.reloadLock.acquire(blocking=False):
+            return False
+
+        thread = threading.Thread(target=self.reloadInBackground, args=(callback, prepare),
+                                  name="DataPulls.reload", daemon=True)
+        thread.start()
+        return True
+
+    def reloadInBackground(self, callback, prepare=None):
+        start = time.time()
+        error = None
+        try:
+            self.reload(prepare)
+        except Exception as e:
+            error = e
+        finally:
+            self.reloadLock.release()
+
+        if callback:
+            callback(self.store, time.time() - start, error)
 
     # getInfo - returns information for the given identifier
     # the result of this function will be used as the elements
@@ -64,18 +106,147 @@ class DataPulls():
     #  - has multiple whitespace replaced with a single space
     #  - has no leading or trailing whitespace
     def getInfo(self, identifier, type=True):
+        started = Metrics.start()
         result = self.store.search(identifier, type=type)
+        Metrics.stop('getInfo', started)
         if result.isEmpty():
             return None
         else:
             return result
-    
+
+    # getInfoMany - getInfo for a list of (identifier, type) pairs,
+    # returns the results in the same order
+    def getInfoMany(self, queries):
+        started = Metrics.start()
+        results = self.store.searchMany(queries)
+        Metrics.stop('getInfo', started)
+        return [None if result.isEmpty() else result for result in results]
+
+
+def sourcePath(scriptpath, file):
+    return scriptpath + '/' + file.lstrip('/')
+
+# buildStore - builds a new ItemStore from the json data files
+def buildStore(scriptpath):
+    store = ItemStore(Config.DATA_CONF)
+
+    for file in Config.DATA_FILES:
+        with codecs.open(sourcePath(scriptpath, file), "r", "utf-8") as data_file:
+            store.addItems(json.load(data_file))
+
+    for file in Config.DATA_SYNONYM_FILES:
+        with codecs.open(sourcePath(scriptpath, file), "r", "utf-8") as data_file:
+            store.addSynonyms(json.load(data_file))
+
+    if Config.DATA_LAZY_PAYLOADS:
+        store.storePayloads(sourcePath(scriptpath, Config.DATA_PAYLOAD_FILE), snapshotKey(scriptpath))
+
+    return store
+
+# snapshotKey - the key a snapshot must have to be used for the current
+# data files, code and configuration
+def snapshotKey(scriptpath):
+    files = [sourcePath(scriptpath, file) for file in Config.DATA_FILES + Config.DATA_SYNONYM_FILES]
+    # the modules of every class pickled into the snapshot, and of the normalizer
+    files += [__file__, Cache.__file__, Helpers.__file__, Payloads.__file__, Similarity.__file__, SymSpell.__file__]
+
+    return Snapshot.sourceKey(files, extra=(
+        ItemStore.__module__,
+        sorted(Config.DATA_CONF.items(), key=str),
+        Config.IDENTIFIER_TO_LOWER,
+        Config.IDENTIFIER_NO_ACCENTS,
+        Config.IDENTIFIER_SANITIZE,
+        Config.DATA_USE_SYMSPELL,
+        Config.DATA_SYMSPELL_PREFIX_LENGTH,
+        Config.DATA_SCORER,
+        Config.DATA_LAZY_PAYLOADS,
+    ))
+
+def snapshotPath(scriptpath):
+    if not Config.DATA_SNAPSHOT_FILE:
+        return None
+    return sourcePath(scriptpath, Config.DATA_SNAPSHOT_FILE)
+
+# buildSnapshot - builds the store from the json data files and writes it
+# to the snapshot file, returns the snapshot file path
+def buildSnapshot(scriptpath):
+    snapshot_file = snapshotPath(scriptpath)
+    if snapshot_file is None:
+        return None
+
+    Snapshot.save(snapshot_file, snapshotKey(scriptpath), buildStore(scriptpath))
+    return snapshot_file
+
+# loadStore - returns the ItemStore for the data files, uses the snapshot
+# if it is up to date, otherwise builds the store and rewrites the snapshot
+def loadStore(scriptpath):
+    snapshot_file = snapshotPath(scriptpath)
+    if snapshot_file is None:
+        return buildStore(scriptpath)
+
+    key = snapshotKey(scriptpath)
+    store = Snapshot.load(snapshot_file, key)
+    if store is not None:
+        return store
+
+    store = buildStore(scriptpath)
+    try:
+        Snapshot.save(snapshot_file, key, store)
+    except (IOError, OSError):
+        pass # the snapshot is only an optimization, the store was still built
+    return store
 
 def get(source, property):
     if property in source:
         return source[property]
     return None
 
+# normalizes a term the same way identifiers are normalized
+# by Helpers.validateIdentifier
+def normalizeTerm(term):
+    return Helpers.Helpers.normalizeIdentifier(term)
+
+# deepSizeOf(obj, seen=None) - approximate size in bytes of `obj` and of
+# everything it refers to (modules, classes and functions excluded)
+# objects whose id is in `seen` are skipped and measured objects are added
+# to it, so objects shared between calls with the same `seen` count once
+def deepSizeOf(obj, seen=None):
+    if seen is None:
+        seen = set()
+
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType,
+                                               types.MethodType, types.BuiltinFunctionType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(obj.__dict__)
+            for cls in type(obj).__mro__:
+                slots = cls.__dict__.get('__slots__', ())
+                for slot in ((slots,) if isinstance(slots, str) else slots):
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+
+    return size
+
+# trigrams(token) - the set of 3 character sequences of `token`
+# (or the token itself when it's shorter than that)
+def trigrams(token):
+    if len(token) < 3:
+        return set([token])
+    return set(token[i:i + 3] for i in range(len(token) - 2))
+
 def castArray(x):
     if type(x) == list:
         return x
@@ -83,12 +254,21 @@ def castArray(x):
         return [x]
 
 class Item():
+    __slots__ = ('_value', 'payloads', 'hasValue', 'type', 'term')
+
     def __init__(self, value = None, hasValue=True, type=None, term=None):
-        self.value      = value
+        self._value     = value # the item's data, or its index in `payloads`
+        self.payloads   = None  # Payloads.PayloadFile holding the item's data, if any
         self.hasValue   = hasValue
         self.type       = type
         self.term       = term
 
+    @property
+    def value(self):
+        if self.payloads is None:
+            return self._value
+        return self.payloads.get(self._value)
+
     def get(self, specific_property=None):
         if specific_property is None:
             return self.value
@@ -111,15 +291,62 @@ class Item():
         return Item(hasValue=False)
 
 class ItemStore():
-    def __init__(self, config):
-        self.index      = ItemCluster(None)
+    def __init__(self, config, cache_size=None, scorer=None):
+        # spelling dictionary of all the words of all the terms in this store,
+        # shared by its clusters and freed together with the store
+        self.spelling   = SymSpell.SymSpell(prefix_length=Config.DATA_SYMSPELL_PREFIX_LENGTH)
+
+        # similarity scorer used to rank term candidates (see Similarity.py and `scorer`)
+        self._scorer    = Similarity.getScorer(Config.DATA_SCORER) if scorer is None else scorer
+
+        self.index      = ItemCluster(None, store=self)
         self.config     = config
+        self.exact      = {} # term (and its no-space variant) -> clusters with that term,
+                             # in cluster order
+        self.words      = {} # word -> {type: ids of that type's terms using the word}
+                             # the id arrays are shared with the clusters' TermHolders
+        self.terms      = [] # term id -> TermEntry
+        self.termIds    = {} # term -> term id
+
+        # search results, keyed by (normalized term, search type). The cache
+        # belongs to the store so it's invalidated together with the data
+        # when DataPulls.reload() swaps in a new store
+        self.cache      = Cache.LRUCache(Config.DATA_CACHE_SIZE if cache_size is None else cache_size)
+
+        # word -> (spelling suggestion, similarity to the word). The spelling
+        # dictionary is shared by all the clusters, so a word only needs to be
+        # corrected once no matter how many clusters are searched
+        self.corrections = Cache.LRUCache(Config.DATA_CORRECTION_CACHE_SIZE)
 
         if not 'type_property' in self.config:
             self.config['type_property'] = 'type'
             
         if not 'term_property' in self.config:
             self.config['term_property'] = 'terms'
+
+    # the search results and corrections depend on the scorer, so they're
+    # dropped when it's replaced
+    @property
+    def scorer(self):
+        return self._scorer
+
+    @scorer.setter
+    def scorer(self, scorer):
+        self._scorer = scorer
+        self.cache.clear()
+        self.corrections.clear()
+
+    # the caches aren't part of the snapshot
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = self.cache.maxsize
+        state['corrections'] = self.corrections.maxsize
+        return state
+
+    def __setstate__(self, state):
+        state['cache'] = Cache.LRUCache(state['cache'])
+        state['corrections'] = Cache.LRUCache(state['corrections'])
+        self.__dict__.update(state)
     
     # search(search_term, item_type=True)
     # item_type:
@@ -127,7 +354,41 @@ class ItemStore():
     #   or:
     #    None - only items without a type
     #    True - all types
+    # results are cached, including empty results
     def search(self, search_term, type=True):
+        return self.searchMany([(search_term, type)])[0]
+
+    # searchMany(queries) - search for a list of (search_term, type) pairs
+    # returns the results in the same order. Each distinct (normalized)
+    # query is only searched once
+    def searchMany(self, queries):
+        results     = []
+        found       = {}
+
+        for search_term, type in queries:
+            started = Metrics.start()
+            search_term = normalizeTerm(search_term)
+            Metrics.stop('normalizeTerm', started)
+            key = (search_term, tuple(type) if isinstance(type, list) else type)
+
+            if not key in found:
+                result = self.cache.get(key)
+                if result is None:
+                    started = Metrics.start()
+                    result = self.searchUncached(search_term, type)
+                    Metrics.stop('search', started)
+                    self.cache.put(key, result)
+                found[key] = result
+
+            results.append(found[key])
+
+        return results
+
+    def searchUncached(self, search_term, type=True):
+        item = self.findExact(search_term, type)
+        if item is not None:
+            return item
+
         if type == True:
             return ClusterSearchHelper( list(self.index.clusters.values()) ).findItem(search_term)
         elif isinstance(type, list):
@@ -139,32 +400,190 @@ class ItemStore():
         else:
             return self.index.findCluster(type).findItem(search_term)
 
+    # complete(prefix, k=10, type=True) - up to `k` items whose term (or its
+    # no-space variant) starts with `prefix`, shortest terms first
+    # type: the type(s) to complete, as in `search`
+    def complete(self, prefix, k=10, type=True):
+        prefix = normalizeTerm(prefix)
+
+        if type == True:
+            clusters = list(self.index.clusters.values())
+        else:
+            clusters = [self.index.clusters[t] for t in castArray(type) if t in self.index.clusters]
+
+        items = {}
+        for cluster in clusters:
+            for item in cluster.prefixItems(prefix):
+                items[id(item)] = item
+
+        return heapq.nsmallest(k, items.values(), key=lambda item: (len(item.term), item.term))
+
     def addItems(self, data):
         for item in data:
             self.addItem(item)
 
     def addItem(self, item_value):
-        item_term = item_value[self.config['term_property']]
-        
-        if Config.IDENTIFIER_NO_ACCENTS:
-            item_term = Helpers.Helpers.removeAccents(item_term)
-
-        if Config.IDENTIFIER_TO_LOWER:
-            item_term = item_term.lower()
-            
-        if type(Config.IDENTIFIER_SANITIZE) == str:
-            item_term = re.sub(Config.IDENTIFIER_SANITIZE, '', item_term) # remove symbols
-
-        item_term = re.sub(r'\s+', ' ', item_term).strip() # remove extraneous whitespace
+        # terms and types are interned, they're shared with the term entries
+        # and used as keys of several maps
+        item_term = sys.intern(normalizeTerm(item_value[self.config['term_property']]))
+        item_type = item_value.get(self.config['type_property'])
 
         item = Item(term = item_term,
                     value = item_value,
                     # get the items type, use None if the item does not have a type
-                    type  = item_value[self.config['type_property']]
-                                if self.config['type_property'] in item_value else None )
+                    type  = sys.intern(item_type) if isinstance(item_type, str) else item_type )
 
         type_cluster = self.index.requireCluster(item.type)
         type_cluster.addItem(item)
+        self.cache.clear()
+        self.corrections.clear()
+
+        cluster_order = list(self.index.clusters.values())
+        for term in (item.term, sys.intern(item.term.replace(" ", ""))):
+            clusters = self.exact.setdefault(term, [])
+            if not type_cluster in clusters:
+                clusters.append(type_cluster)
+                clusters.sort(key=cluster_order.index)
+
+    # allItems() - yields every item of the store once
+    def allItems(self):
+        seen = set()
+        for cluster in self.index.clusters.values():
+            for item in cluster.items.values():
+                if not id(item) in seen:
+                    seen.add(id(item))
+                    yield item
+
+    # itemCounts - number of items for each type
+    def itemCounts(self):
+        return dict((cluster.terms[0], len(set(map(id, cluster.items.values()))))
+                        for cluster in self.index.clusters.values())
+
+    # memoryReport() - approximate memory used by the store, in bytes:
+    #   clusters: type -> {'items', 'term_maps', 'word_counts'} of that type
+    #   spelling: the spelling dictionary
+    #   index:    the store-wide term, word, exact match and synonym maps
+    #   payloads: the offset tables of the payload files (not the mapped files)
+    #   caches:   the search result and spelling correction caches
+    #   total:    all of the above
+    # objects shared between parts are counted in the first part they're in
+    def memoryReport(self):
+        clusters = list(self.index.clusters.values())
+
+        # each part is measured on its own, so the walk must
+        # never get to the store or the clusters through a reference
+        seen = set(map(id, [self, self.index] + clusters + [cluster.termholder for cluster in clusters]))
+
+        payloads = set()
+        for cluster in clusters:
+            for item in cluster.items.values():
+                if item.payloads is not None:
+                    payloads.add(item.payloads)
+        payloads_size = sum(deepSizeOf(payload_file, seen) for payload_file in payloads)
+
+        report = {'clusters': {}}
+        for cluster in clusters:
+            holder = cluster.termholder
+            term_ids = sorted(set(term_id for term_ids in holder._wordToTermMap.values() for term_id in term_ids))
+            report['clusters'][cluster.terms[0]] = {
+                'items':        deepSizeOf(cluster.items, seen),
+                'term_maps':    deepSizeOf(holder._wordToTermMap, seen)
+                                    + deepSizeOf(holder._trigramToTermMap, seen)
+                                    + deepSizeOf(cluster.sortedTerms, seen)
+                                    + deepSizeOf(holder._trie, seen)
+                                    + sum(deepSizeOf(self.terms[term_id], seen) for term_id in term_ids),
+                'word_counts':  deepSizeOf(holder._words, seen),
+            }
+
+        report['spelling'] = deepSizeOf(self.spelling, seen)
+        report['index']    = sum(deepSizeOf(part, seen) for part in
+                                 (self.terms, self.termIds, self.words, self.exact, self.index.synonyms))
+        report['payloads'] = payloads_size
+        report['caches']   = deepSizeOf(self.cache, seen) + deepSizeOf(self.corrections, seen)
+        report['total']    = sum(sum(part.values()) for part in report['clusters'].values()) \
+                                + report['spelling'] + report['index'] + report['payloads'] + report['caches']
+        return report
+
+    # findExact(search_term, type=True)
+    # returns the item whose term is exactly `search_term` in the
+    # searched type(s), or None. When several types have that term,
+    # the type is picked in the same order the fuzzy search would use
+    def findExact(self, search_term, type=True):
+        clusters = self.exact.get(search_term)
+        if clusters is None:
+            return None
+
+        if type == True:
+            return clusters[0].items[search_term]
+
+        for t in castArray(type):
+            for cluster in clusters:
+                if t in cluster.terms:
+                    return cluster.items[search_term]
+
+        return None
+
+    # addTerm(term) - id of the TermEntry of `term`, creating the entry if
+    # needed. Entries are shared by all the clusters and referred to by id
+    def addTerm(self, term):
+        if term in self.termIds:
+            return self.termIds[term]
+
+        term_id = len(self.terms)
+        self.terms.append(TermEntry(term, intern=True))
+        self.termIds[self.terms[term_id].term] = term_id
+        return term_id
+
+    # storePayloads(file, key) - moves the data of the items out of memory into
+    # the payload file `file` (see Payloads.py), items then read their data
+    # from the memory-mapped file when needed
+    def storePayloads(self, file, key):
+        items = []
+        seen = set()
+        for cluster in self.index.clusters.values():
+            for item in cluster.items.values():
+                if item.payloads is None and not id(item) in seen:
+                    seen.add(id(item))
+                    items.append(item)
+
+        offsets = Payloads.save(file, key, [item.value for item in items])
+        payloads = Payloads.PayloadFile(file, key, offsets, Config.DATA_PAYLOAD_CACHE_SIZE)
+
+        for index, item in enumerate(items):
+            item._value = index
+            item.payloads = payloads
+
+    # registers the term id array of a type's terms using `word`
+    # in the merged word index
+    def addWordTerms(self, word, type, term_ids):
+        if not word in self.words:
+            self.words[word] = {}
+        self.words[word][type] = term_ids
+
+    # leastCommonTerms(words) - type -> ids of the terms using the least common of `words`
+    # within that type (the first of the words on ties), for every type using
+    # any of the words
+    def leastCommonTerms(self, words):
+        least_common = {}
+        for word in words:
+            for type, terms in self.words.get(word, {}).items():
+                if not type in least_common or len(terms) < len(least_common[type]):
+                    least_common[type] = terms
+        return least_common
+
+    # spellingSuggestion(word) - (best spelling dictionary match for `word` or
+    # None, similarity of the match to `word`). Similarities of 0.7 or less
+    # may be returned as 0.0, the term correction ignores such matches anyway
+    def spellingSuggestion(self, word):
+        suggestion = self.corrections.get(word)
+        if suggestion is None:
+            started = Metrics.start()
+            best_word = self.spelling.best_word(word)
+            Metrics.stop('spelling', started)
+            similarity = 0 if best_word is None else self.scorer.ratio(word, best_word, 0.7)
+            suggestion = (best_word, similarity)
+            self.corrections.put(word, suggestion)
+        return suggestion
 
     def addSynonyms(self, synonyms):
         for old_word, new_word in synonyms.items():
@@ -173,16 +592,19 @@ class ItemStore():
     # only works with single words, not phrases
     def addSynonym(self, old_word, new_word):
         self.index.addSynonym(old_word, new_word)
+        self.cache.clear()
 
 class ItemCluster():
 
-    def __init__(self, terms, isFalse = False):
+    def __init__(self, terms, isFalse = False, store = None):
         # attributes applying to this cluster
         self.parent     = None
         self.terms      = castArray(terms)
         self.isFalse    = isFalse
         self.items      = {} # real term -> map
+        self.sortedTerms = [] # the keys of `items`, sorted, for prefix lookups
         self.synonyms   = {}
+        self.store      = store # the ItemStore this cluster belongs to
 
         # attributes applying to child clusters
         self.termholder = TermHolder(self)
@@ -195,7 +617,7 @@ class ItemCluster():
         return ClusterSearchHelper(self).findItem(search_term)
 
     def addItem(self, item):
-        term_no_spaces = item.term.replace(" ", "")
+        term_no_spaces = sys.intern(item.term.replace(" ", ""))
 
         if item.term in self.items:
             return
@@ -203,8 +625,18 @@ class ItemCluster():
         self.termholder.addTerm(item.term)
         self.termholder.addTerm(term_no_spaces)
 
-        self.items[item.term] = item
-        self.items[term_no_spaces] = item
+        for term in (item.term, term_no_spaces):
+            if not term in self.items:
+                bisect.insort(self.sortedTerms, term)
+            self.items[term] = item
+
+    # prefixItems(prefix) - yields the items with a term starting with
+    # `prefix`, in term order (an item can be yielded for each of its terms)
+    def prefixItems(self, prefix):
+        index = bisect.bisect_left(self.sortedTerms, prefix)
+        while index < len(self.sortedTerms) and self.sortedTerms[index].startswith(prefix):
+            yield self.items[self.sortedTerms[index]]
+            index += 1
 
     def addSynonym(self, old_word, new_word):
         self.synonyms[old_word] = new_word
@@ -239,14 +671,14 @@ class ItemCluster():
         if term in self.clusters:
             return self.clusters[term]
         else:
-            cluster = ItemCluster(term)
+            cluster = ItemCluster(term, store=self.store)
             cluster.parent = self
             self.clusters[term] = cluster
             return cluster
 
     @staticmethod
     def newFalseCluster():
-        return ItemCluster(None, isFalse=False)
+        return ItemCluster(None, isFalse=True)
 
 class ClusterSearchHelper():
 
@@ -260,26 +692,134 @@ class ClusterSearchHelper():
         if not any(self.clusters):
             return Item.newFalseItem()
 
+        # a prefix of a single item's terms (e.g. "crob" for "crobat"), unless
+        # the term is made of known words (e.g. "attack" isn't "attack order")
+        prefix_item = None
+        if not self.isVocabulary(search_term):
+            prefix_item = self.findPrefix(search_term)
+
         if len(self.clusters) == 1:
             source_cluster = self.clusters[0]
-            real_term, likely = source_cluster.termholder.termcorrection(search_term)
+            term = TermEntry(search_term)
+            real_term, likely = source_cluster.termholder.termcorrection(term, not self.knowsWord(term))
         else:
             real_term, source_cluster = self.findTerm(search_term)
 
+        # the prefix item is only used if it's closer to the term than the
+        # spelling correction (e.g. "absoli" is absol, not absolite)
+        if prefix_item is not None:
+            scorer = self.clusters[0].store.scorer
+            if real_term is None or scorer.ratio(search_term, real_term) < scorer.ratio(search_term, prefix_item.term):
+                return prefix_item
+
         if real_term is None:
             return Item.newFalseItem()
         
         return source_cluster.items[real_term]
 
+    # isVocabulary(term) - whether every word of `term` is a word of the
+    # terms of the store (of any type)
+    def isVocabulary(self, term):
+        words = self.clusters[0].store.words
+        return all(word in words for word in term.split())
+
+    # knowsWord(term) - whether any word of `term`, once corrected, is used by
+    # the terms of any type of the store, not only the types searched: the
+    # trigram fallback is for misspelled terms, not for the terms of another
+    # type (e.g. "bite" when searching the pokemon)
+    def knowsWord(self, term):
+        store = self.clusters[0].store
+        clusters = self.clusters if store is None else store.index.clusters.values()
+        return any(cluster.termholder.knowsword(term) for cluster in clusters if not cluster.isFalse)
+
+    # findPrefix(prefix) - the item whose terms are the only ones starting with
+    # `prefix` among all the clusters, None if there are several or none
+    def findPrefix(self, prefix):
+        if len(prefix) < Config.DATA_PREFIX_MIN_LENGTH:
+            return None
+
+        started = Metrics.start()
+        found = None
+        for cluster in self.clusters:
+            for item in cluster.prefixItems(prefix):
+                if found is None:
+                    found = item
+                elif item is not found:
+                    Metrics.stop('prefix', started)
+                    return None
+        Metrics.stop('prefix', started)
+        return found
+
     def findTerm(self, term):
         term = TermEntry(term)
 
+        # the words are corrected the same way for every cluster unless a
+        # cluster has its own synonyms, or the spelling dictionary isn't shared
+        first = self.clusters[0]
+        if not Config.DATA_USE_SYMSPELL or \
+                any(cluster.synonyms or cluster.parent is not first.parent for cluster in self.clusters):
+            return self.findTermEach(term)
+
+        # so the words are corrected once, the candidates of every cluster are
+        # found with one pass over the store's merged word index, and each
+        # candidate is scored once even if several clusters share it
+        new_words1, new_words2 = first.termholder.correctwords(term)
+        new_token1 = ''.join(sorted(new_words1))
+        new_token2 = ''.join(sorted(new_words2))
+        least_common = first.store.leastCommonTerms(new_words1)
+        scores = {}
+
+        # if none of the words is known to any type of the store, the
+        # candidates are found by trigrams instead (see knowsWord)
+        use_trigrams = not least_common
+
+        likely_ratio = 0
+        likely_term = None
+        likely_cluster = None
+
+        for cluster in self.clusters:
+            if term.term in cluster.items:
+                return term.term, cluster
+
+            # candidates at or below 80% or the likely ratio wouldn't be picked
+            if use_trigrams:
+                term_candidate, ratio_candidate = cluster.termholder.trigramcorrection(
+                        new_token1, new_token2, max(likely_ratio, 0.80), scores)
+            else:
+                candidates = least_common.get(cluster.terms[0])
+                if candidates is None:
+                    continue
+
+                term_candidate, ratio_candidate = cluster.termholder.bestcandidate(
+                        candidates, new_token1, new_token2, max(likely_ratio, 0.80), scores)
+
+            # if 100%, no point in checking the rest
+            # if above 90%, then it's close enough
+            if ratio_candidate >= 0.9:
+                return term_candidate, cluster
+
+            # ignore if likelyhood is less than 80%
+            if ratio_candidate <= 0.80:
+                continue
+
+            if ratio_candidate > likely_ratio:
+                likely_ratio    = ratio_candidate
+                likely_term     = term_candidate
+                likely_cluster  = cluster
+        
+        return likely_term, likely_cluster
+
+    # findTermEach(term) - findTerm, correcting the term for each cluster separately
+    def findTermEach(self, term):
+        # as in findTerm, trigrams are only used if no type knows any word
+        use_trigrams = not self.knowsWord(term)
+
         likely_ratio = 0
         likely_term = None
         likely_cluster = None
 
         for cluster in self.clusters:
-            term_candidate, ratio_candidate = cluster.termholder.termcorrection(term)
+            term_candidate, ratio_candidate = cluster.termholder.termcorrection(term, use_trigrams)
             #print('Got', term_candidate, 'at ratio', ratio_candidate)
             # if 100%, no point in checking the rest
             # if above 90%, then it's close enough
@@ -303,14 +843,112 @@ class ClusterSearchHelper():
 # term as the value of different keys (words). So we have
 # all the keys with the same term point to the same object
 class TermEntry():
+    __slots__ = ('term', 'words', 'tokenized')
 
-    def __init__(self, term):
-        self.term = term
-        self.words = term.split()
-        self.sortedWords = sorted(self.words)
-        self.tokenized = ''.join(self.sortedWords)
-
-termWordDict = SymSpell.SymSpell()
+    # intern: intern the term and its words, for entries kept in the store
+    def __init__(self, term, intern=False):
+        if intern:
+            self.term = sys.intern(term)
+            self.words = tuple(sys.intern(word) for word in term.split())
+        else:
+            self.term = term
+            self.words = tuple(term.split())
+        self.tokenized = ''.join(sorted(self.words))
+
+# helper class used by TermHolder when SymSpell is off: a trie of the
+# known words, searched for the words within a small edit distance
+class WordTrie():
+    __slots__ = ('root',)
+
+    def __init__(self):
+        self.root = {} # char -> child node, '' -> the word ending at this node
+
+    def add(self, word):
+        node = self.root
+        for char in word:
+            if not char in node:
+                node[char] = {}
+            node = node[char]
+        node[''] = word
+
+    # search(word, max_distance) - word -> distance of the trie's words at most
+    # `max_distance` edits away from `word`. The edits are the ones of
+    # TermHolder.edits1: deleting any character, swapping two adjacent
+    # characters, and replacing or inserting a character of ALPHABET. The
+    # distance is the (unrestricted) Damerau-Levenshtein distance with these
+    # edits, computed one row per trie node. Nodes whose row is already over
+    # `max_distance` aren't descended into
+    def search(self, word, max_distance):
+        found = {}
+        length = len(word)
+        over = max_distance + 1
+        path = []                       # the characters from the root to the current node
+        rows = [list(range(length + 1))] # the row of each node along the path
+
+        def descend(node):
+            for char, child in node.items():
+                if char == '':
+                    continue
+
+                i = len(rows)
+                prev = rows[-1]
+                insertable = char in ALPHABET
+                row = [over] * (length + 1)
+                row[0] = prev[0] + 1 if insertable and prev[0] < max_distance else over
+
+                for j in range(max(1, i - max_distance), min(length, i + max_distance) + 1):
+                    query_char = word[j - 1]
+                    if query_char == char:
+                        cost = prev[j - 1]
+                    elif insertable:
+                        cost = prev[j - 1] + 1                  # replace
+                    else:
+                        cost = over
+                    if row[j - 1] + 1 < cost:
+                        cost = row[j - 1] + 1                   # delete query_char
+                    if insertable and prev[j] + 1 < cost:
+                        cost = prev[j] + 1                      # insert char
+
+                    # swap: query_char last seen at k in the path, char last
+                    # seen at l in the word, with what's in between inserted
+                    # or deleted. Only a gap of one can stay within distance 2
+                    if i > 1 and j > 1:
+                        if path[i - 2] == query_char:
+                            k = i - 1
+                        elif i > 2 and path[i - 3] == query_char and path[i - 2] in ALPHABET:
+                            k = i - 2
+                        else:
+                            k = 0
+
+                        if k:
+                            if word[j - 2] == char:
+                                l = j - 1
+                            elif j > 2 and word[j - 3] == char:
+                                l = j - 2
+                            else:
+                                l = 0
+
+                            if l:
+                                swap = rows[k - 1][l - 1] + (i - k - 1) + 1 + (j - l - 1)
+                                if swap < cost:
+                                    cost = swap
+
+                    row[j] = cost if cost < over else over
+
+                if min(row) > max_distance:
+                    continue
+
+                if '' in child and row[length] <= max_distance:
+                    found[child['']] = row[length]
+
+                path.append(char)
+                rows.append(row)
+                descend(child)
+                rows.pop()
+                path.pop()
+
+        descend(self.root)
+        return found
 
 # helper class used by ItemCluster
 class TermHolder():
@@ -318,134 +956,249 @@ class TermHolder():
     def __init__(self, parent_cluster):
         self.parent_cluster = parent_cluster
 
-        #self.symspell = SymSpell.SymSpell()
-
         self._PN = 0 # the total number of words
-        self._terms = set() # list of all terms
         self._words = Counter() # word -> number of times the word is used
 
-        self._wordToTermMap = {} # word to term cluster
+        self._wordToTermMap = {} # word -> array of the ids of the terms using it,
+                                 # see ItemStore.terms
+        self._trigramToTermMap = {} # trigram -> array of the ids of the terms whose
+                                    # tokenized form has it
+        self._trie = WordTrie() # the words, for spelling correction when SymSpell is off
     
-    # approximate size of this TermHolder Object
+    # approximate size of this TermHolder Object, not counting the term entries
+    # (see ItemStore.memoryReport for the size of the whole store)
     def getByteSize(self):
-        return sys.getsizeof(self._terms) + sys.getsizeof(self._words) \
-                + sys.getsizeof(self._wordToTermMap) + sys.getsizeof(self.symspell.dictionary)
+        seen = set()
+        return deepSizeOf(self._words, seen) + deepSizeOf(self._wordToTermMap, seen) \
+                + deepSizeOf(self._trigramToTermMap, seen)
 
     def addTerm(self, term):
-        term = TermEntry(term)
-
-        self._terms.add(term)
+        store = self.parent_cluster.store
+        term_id = store.addTerm(term)
+        term = store.terms[term_id]
 
         for word in term.words:
+            if not Config.DATA_USE_SYMSPELL and not word in self._words:
+                self._trie.add(word)
+
             self._words[word] += 1
             self._PN += 1
 
             if not word in self._wordToTermMap:
-                self._wordToTermMap[word] = []
-            self._wordToTermMap[word].append(term)
+                self._wordToTermMap[word] = array('I')
+                store.addWordTerms(word, self.parent_cluster.terms[0], self._wordToTermMap[word])
+            self._wordToTermMap[word].append(term_id)
 
             if Config.DATA_USE_SYMSPELL:
-                #self.symspell.create_dictionary_entry(word)
-                termWordDict.create_dictionary_entry(word)
+                self.parent_cluster.store.spelling.create_dictionary_entry(word)
+
+        for trigram in trigrams(term.tokenized):
+            if not trigram in self._trigramToTermMap:
+                self._trigramToTermMap[sys.intern(trigram)] = array('I')
+            term_ids = self._trigramToTermMap[trigram]
+            # single word terms are added twice (as their no-space variant)
+            if not term_ids or term_ids[-1] != term_id:
+                term_ids.append(term_id)
 
     # ------------------------------------------------------------------------------------------
     # TERM CORRECTION
 
-    def termcorrection(self, term):
-        if term in self._terms:
-            return term, 1.00
+    # use_trigrams: if none of the words of `term` is known, look for
+    # candidates by trigrams (see trigramcorrection)
+    def termcorrection(self, term, use_trigrams=True):
+        if not isinstance(term, TermEntry):
+            term = TermEntry(term)
+
+        if term.term in self.parent_cluster.items:
+            return term.term, 1.00
+
+        new_words1, new_words2 = self.correctwords(term)
 
         least_common_word = None
         min_word_count = float('inf')
-
-        if not isinstance(term, TermEntry):
-            term = TermEntry(term)
         
         # here we're trying to find the least common word
         # in this term in hopes that the cluster using
         # that word has a small amount of term candidates
+        for word in new_words1:
+            if word in self._words:
+                count = self._words[word]
+                if count < min_word_count:
+                    min_word_count = count
+                    least_common_word = word
+
+        new_token1 = ''.join(sorted(new_words1))
+        new_token2 = ''.join(sorted(new_words2))
+
+        if least_common_word is None:
+            if use_trigrams:
+                return self.trigramcorrection(new_token1, new_token2)
+            return None, 0.0
+
+        return self.bestcandidate(self._wordToTermMap[least_common_word], new_token1, new_token2)
+
+    # knowsword(term) - whether any word of `term`, once corrected,
+    # is used by the terms of this cluster
+    def knowsword(self, term):
+        if not isinstance(term, TermEntry):
+            term = TermEntry(term)
+        return any(word in self._words for word in self.correctwords(term)[0])
+
+    # trigramcorrection(token1, token2, min_ratio=0, scores=None)
+    # fallback for run-together or garbled terms with no known word: the terms
+    # sharing the most trigrams with `token1` are scored like bestcandidate
+    # does, the best one is only returned if it's more similar than
+    # Config.DATA_TRIGRAM_MIN_RATIO (and `min_ratio`), as findTerm requires
+    # They're only compared with `token1`: `token2` has the corrections of
+    # the words that weren't similar enough to be kept, which a candidate
+    # could match without being similar to the term
+    def trigramcorrection(self, token1, token2, min_ratio=0, scores=None):
+        min_ratio = max(min_ratio, Config.DATA_TRIGRAM_MIN_RATIO)
+        term, ratio = self.bestcandidate(self.trigramcandidates(token1), token1, token1, min_ratio, scores)
+        if ratio <= min_ratio:
+            return None, 0.0
+        return term, ratio
+
+    # trigramcandidates(token) - ids of the terms sharing the most trigrams
+    # with `token`, at most Config.DATA_TRIGRAM_CANDIDATES of them. The
+    # trigrams in common must be a share of the trigrams of both (Dice
+    # coefficient), so a short term inside a long one isn't a candidate
+    def trigramcandidates(self, token):
+        started = Metrics.start()
+        token_trigrams = trigrams(token)
+
+        overlap = Counter()
+        for trigram in token_trigrams:
+            overlap.update(self._trigramToTermMap.get(trigram, ()))
+
+        terms = self.parent_cluster.store.terms
+        min_overlap = Config.DATA_TRIGRAM_MIN_OVERLAP / 2.0
+        candidates = [term_id for term_id, count in overlap.items()
+                      if count >= min_overlap * (len(token_trigrams) + len(trigrams(terms[term_id].tokenized)))]
+        candidates.sort(key=lambda term_id: (-overlap[term_id], term_id))
+        Metrics.stop('trigrams', started)
+        Metrics.size('trigram_candidates', len(overlap)) # before the overlap filter and the cap
+        return candidates[:Config.DATA_TRIGRAM_CANDIDATES]
+
+    # correctwords(term) - the words of `term` spelling corrected twice:
+    #  - words that couldn't be corrected with enough similarity are kept as is
+    #  - only the corrections, words that couldn't be corrected are dropped
+    def correctwords(self, term):
         new_words1 = []
         new_words2 = []
         for word in term.words:
             old_word = word
-            new_word = self.correction(old_word)
-
-            word_similarity = 0 if new_word is None else TermHolder.similar(old_word, new_word)
+            new_word, word_similarity = self.wordcorrection(old_word)
 
             if new_word is None or word_similarity <= 0.7:
                 new_words1.append(old_word)
-                word = old_word
             else:
                 new_words1.append(new_word)
-                word = new_word
             
             if new_word is not None:
                 new_words2.append(new_word)
 
-            if word in self._words:
-                count = self._words[word]
-                if count < min_word_count:
-                    min_word_count = count
-                    least_common_word = word
-
-        if least_common_word is None:
-            return None, 0.0
-
-        new_token1 = ''.join(sorted(new_words1))
-        new_token2 = ''.join(sorted(new_words2))
-
+        return new_words1, new_words2
+
+    # bestcandidate(candidates, token1, token2, min_ratio=0, scores=None)
+    # candidates: ids of the candidate terms
+    # returns the candidate term most similar to either of the tokenized
+    # search terms, with its ratio. Ratios below `min_ratio` are of no use
+    # to the caller, so they're allowed to be scored as 0.0
+    # scores: tokenized candidate -> ratio, shared between calls that
+    # use the same search tokens and a min_ratio that never decreases
+    def bestcandidate(self, candidates, token1, token2, min_ratio=0, scores=None):
+        if scores is None:
+            scores = {}
+
+        started = Metrics.start()
+        terms = self.parent_cluster.store.terms
         max_candidate = None
         max_ratio = 0
-        #print(':', new_token1, new_token2, '/', least_common_word, '/', [x.tokenized for x in self._wordToTermMap[least_common_word]])
 
         # loop over all term candidates in the cluster and compare the similarity
         # to our term. Retrieve the candidate with the most similarity
-        for idx, candidate in enumerate(self._wordToTermMap[least_common_word]):
-            ratio1 = TermHolder.similar(new_token1, candidate.tokenized)
-            if ratio1 > max_ratio:
+        for term_id in candidates:
+            candidate = terms[term_id]
+            ratio = scores.get(candidate.tokenized)
+            if ratio is None:
+                cutoff = max(max_ratio, min_ratio)
+                ratio = self.similar(token1, candidate.tokenized, cutoff)
+                ratio = max(ratio, self.similar(token2, candidate.tokenized, max(cutoff, ratio)))
+                scores[candidate.tokenized] = ratio
+
+            if ratio > max_ratio:
                 max_candidate = candidate
-                max_ratio = ratio1
+                max_ratio = ratio
+
+        Metrics.stop('scoring', started)
+        Metrics.size('candidates', len(candidates))
 
-            ratio2 = TermHolder.similar(new_token2, candidate.tokenized)
-            if ratio2 > max_ratio:
-                max_candidate = candidate
-                max_ratio = ratio2
-        
         if max_candidate is None:
             return None, 0.00
 
         return max_candidate.term, max_ratio
 
-    @staticmethod
-    def similar(a, b):
-        return SequenceMatcher(None, a, b).ratio()
+    # similarity ratio of `a` and `b` using the store's scorer, ratios
+    # below `cutoff` may be returned as 0.0
+    def similar(self, a, b, cutoff=0.0):
+        return self.parent_cluster.store.scorer.ratio(a, b, cutoff)
 
     # ------------------------------------------------------------------------------------------
     # WORD CORRECTION
 
     def correction(self, word):
         "Most probable spelling correction for word."
-        
-        if Config.DATA_USE_SYMSPELL:
-            #candidates = [ self.symspell.best_word(word) ]
-            candidates = [ termWordDict.best_word(word) ]
-        else:
-            candidates = self.candidates(word)
+        return self.wordcorrection(word)[0]
 
+    # wordcorrection(word) - (most probable spelling correction for `word`,
+    # similarity of the correction to `word`)
+    def wordcorrection(self, word):
+        started = Metrics.start()
         synonym = self.parent_cluster.findSynonym(word)
-        if synonym is not None:
-            candidates.append(synonym)
-        else:
-            return candidates[0]
+        Metrics.stop('synonyms', started)
 
-        return max(candidates, key=self.P)
+        if Config.DATA_USE_SYMSPELL:
+            # the suggestion only depends on the store's spelling dictionary,
+            # so it's memoized by the store and shared by all the clusters
+            best_word, similarity = self.parent_cluster.store.spellingSuggestion(word)
+            if synonym is None:
+                return best_word, similarity
+            candidates = [ best_word, synonym ]
+        else:
+            started = Metrics.start()
+            candidates = sorted(self.candidates(word))
+            Metrics.stop('spelling', started)
+            if synonym is not None:
+                candidates.append(synonym)
+
+        best_word = max(candidates, key=self.P)
+        return best_word, 0 if best_word is None else self.similar(word, best_word, 0.7)
     
     def P(self, word):
         "Probability of `word`."
         return self._words[word] / self._PN
     
-    # courtesy http://norvig.com/spell-correct.html
+    # candidates(word) - the set of known words closest to `word`: the word if
+    # it's known, else the known words one edit away (see edits1), else the
+    # ones two edits away, else just the word
+    # the same candidates as http://norvig.com/spell-correct.html, but found
+    # with a bounded search of the trie instead of generating all the edits
     def candidates(self, word):
+        if word in self._words:
+            return set([word])
+
+        # most misspellings are one edit away, and searching
+        # one edit away is much cheaper than two
+        for distance in (1, 2):
+            known = set(self._trie.search(word, distance))
+            if known:
+                return known
+        return set([word])
+
+    # the original candidates(word), kept as the reference for the trie search
+    # courtesy http://norvig.com/spell-correct.html
+    def editcandidates(self, word):
         edits1 = TermHolder.edits1(word)
         edits2 = TermHolder.edits2(word)
         return set(self.known([word]) or self.known(edits1) or self.known(edits2) or [word])
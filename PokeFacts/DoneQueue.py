@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+# DoneQueue.py
+# ~~~~~~~~~~~~
+# The things (comments, submissions, messages) the bot has processed, with
+# the id of its reply to each, so that it doesn't reply twice and edits its
+# reply when a thing is edited. A record is
+#   {"reply_id": id of the bot's reply or None, "last_process": epoch seconds}
+#
+#  - DoneQueue keeps the most recently used Config.DONE_MEMORY_SIZE records
+#    in memory (Cache.LRUCache), for Config.DONE_TTL seconds
+#  - SqliteDoneQueue also writes them to a SQLite file, so they outlive a
+#    restart. Records are written in batches, replies right away; a record
+#    not in memory anymore is read back from the file
+#
+# A thing is registered with `start` when the bot starts processing it, and
+# only written once it's done: `setReply` when the reply is sent, `add` when
+# there's nothing to send or it failed. Until then it's pending, in memory
+# only, so a thing still waiting for its reply when the bot stops is
+# processed again after the restart (the catch-up goes back to the oldest
+# pending thing). Pending things are forgotten after Config.DONE_TTL, and
+# the oldest once there are more than Config.DONE_MEMORY_SIZE of them.
+#
+# load(path) returns the one for Config.DONE_STORE_FILE. Records must be
+# changed through `add` and `setReply` (not in place) to be written.
+
+import os
+import time
+import atexit
+import weakref
+import sqlite3
+import threading
+
+try:
+    from PokeFacts import Cache
+    from PokeFacts import Config
+except ImportError:
+    import Cache
+    import Config
+
+# the SqliteDoneQueues not closed yet, closed when the bot exits
+OPEN = weakref.WeakSet()
+
+def closeAll():
+    for done in list(OPEN):
+        done.close()
+
+atexit.register(closeAll)
+
+class DoneQueue():
+
+    def __init__(self, size=None, ttl=None, clock=time.time):
+        self.ttl    = Config.DONE_TTL if ttl is None else ttl
+        self.clock  = clock
+        self.memory = Cache.LRUCache(Config.DONE_MEMORY_SIZE if size is None else size)
+        self.pending = {} # id -> creation time of the things started and not done yet
+        self.lock   = threading.RLock()
+
+    def expired(self, record):
+        return record["last_process"] < self.clock() - self.ttl
+
+    # get(id) - the record of the thing, None if it wasn't processed (or too long ago)
+    def get(self, id):
+        record = self.memory.get(id)
+        if record is None or self.expired(record):
+            return None
+        return record
+
+    # start(id, created=None) - the record of the thing, a pending one if it
+    # wasn't processed. `created` is the time the thing was posted
+    def start(self, id, created=None):
+        with self.lock:
+            record = self.get(id)
+            if record is None:
+                record = {"reply_id": None, "last_process": self.clock()}
+                self.memory.put(id, record)
+                self.pending[id] = self.clock() if created is None else created
+                if len(self.pending) > self.memory.maxsize:
+                    self.prunePending()
+            return record
+
+    # prunePending() - forgets the pending things posted more than the TTL
+    # ago, then if there are still too many, all but the newest half
+    def prunePending(self):
+        with self.lock:
+            now = self.clock()
+            self.pending = dict((id, created) for id, created in self.pending.items() if created >= now - self.ttl)
+            if len(self.pending) > self.memory.maxsize:
+                newest = sorted(self.pending.items(), key=lambda item: item[1], reverse=True)
+                self.pending = dict(newest[:self.memory.maxsize // 2])
+
+    # add(id) - the record of the thing, done without a reply if it
+    # wasn't processed or was pending
+    def add(self, id):
+        with self.lock:
+            record = self.get(id)
+            if record is None or id in self.pending:
+                if record is None:
+                    record = {"reply_id": None, "last_process": self.clock()}
+                self.pending.pop(id, None)
+                self.memory.put(id, record)
+                self.write(id, record)
+            return record
+
+    # setReply(id, reply_id) - records the bot's reply to the thing, it's done
+    def setReply(self, id, reply_id):
+        with self.lock:
+            record = dict(self.get(id) or {"last_process": self.clock()}, reply_id=reply_id)
+            self.pending.pop(id, None)
+            self.memory.put(id, record)
+            self.write(id, record, now=True)
+
+    def write(self, id, record, now=False):
+        pass
+
+    def flush(self):
+        pass
+
+    # the time the bot was last active with these records, None if unknown
+    def lastActive(self):
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.pending.clear()
+
+    def close(self):
+        pass
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats['pending'] = len(self.pending)
+        return stats
+
+    def __contains__(self, id):
+        return self.get(id) is not None
+
+    def __len__(self):
+        return len(self.memory)
+
+class SqliteDoneQueue(DoneQueue):
+
+    def __init__(self, path, size=None, ttl=None, batch=None, interval=None, clock=time.time):
+        DoneQueue.__init__(self, size, ttl, clock)
+
+        self.path       = path
+        self.batch      = Config.DONE_BATCH_SIZE if batch is None else batch
+        self.interval   = Config.DONE_FLUSH_INTERVAL if interval is None else interval
+        self.dirty      = {} # id -> record not written yet
+        self.flushed    = clock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS done (id TEXT PRIMARY KEY, reply_id TEXT, last_process REAL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+        self.connection.commit()
+
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'last_active'").fetchone()
+        self.last_active = row[0] if row else None
+
+        OPEN.add(self)
+
+    def get(self, id):
+        record = DoneQueue.get(self, id)
+        if record is not None:
+            return record
+
+        with self.lock:
+            record = self.dirty.get(id)
+            if record is None:
+                row = self.connection.execute("SELECT reply_id, last_process FROM done WHERE id = ?", (id,)).fetchone()
+                if row is None:
+                    return None
+                record = {"reply_id": row[0], "last_process": row[1]}
+
+        if self.expired(record):
+            return None
+        self.memory.put(id, record)
+        return record
+
+    def write(self, id, record, now=False):
+        self.dirty[id] = record
+        if now or len(self.dirty) >= self.batch or self.clock() - self.flushed >= self.interval:
+            self.flush()
+
+    # flush() - writes the records not written yet, and forgets the expired
+    # ones. The bot is recorded active until now, or until the oldest
+    # pending thing, which is then processed again after a restart
+    def flush(self):
+        with self.lock:
+            if self.connection is None:
+                return
+            now = self.clock()
+            self.prunePending()
+            last_active = min([now] + list(self.pending.values()))
+
+            self.connection.executemany("INSERT OR REPLACE INTO done VALUES (?, ?, ?)",
+                [(id, record["reply_id"], record["last_process"]) for id, record in self.dirty.items()])
+            self.connection.execute("DELETE FROM done WHERE last_process < ?", (now - self.ttl,))
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('last_active', ?)", (last_active,))
+            self.connection.commit()
+            self.dirty = {}
+            self.flushed = now
+
+    def lastActive(self):
+        return self.last_active
+
+    def clear(self):
+        with self.lock:
+            DoneQueue.clear(self)
+            self.dirty = {}
+            self.connection.execute("DELETE FROM done")
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.flush()
+                self.connection.close()
+                self.connection = None
+            OPEN.discard(self)
+
+    def stats(self):
+        stats = DoneQueue.stats(self)
+        stats['unwritten'] = len(self.dirty)
+        return stats
+
+# load(path=None) - the done queue for the file at `path` (from Config.DONE_STORE_FILE),
+# only in memory if it's None
+def load(path=None):
+    if path is None:
+        return DoneQueue()
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    return SqliteDoneQueue(path)
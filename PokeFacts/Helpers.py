@@ -21,6 +21,55 @@ SUBREDDIT = 5
 AWARD = 6
 PROMOCAMPAIGN = 8
 
+WHITESPACE = re.compile(r'\s+')
+
+# character (code point) -> the character without its accents, filled in
+# as characters are seen, for str.translate
+# e.g. "é" -> "e"
+class AccentTable(dict):
+    def __missing__(self, char):
+        stripped = ''.join(c for c in unicodedata.normalize('NFD', chr(char))
+                            if unicodedata.category(c) != 'Mn')
+        self[char] = stripped
+        return stripped
+
+ACCENT_TABLE = AccentTable()
+
+_sanitize = (None, None) # (Config.IDENTIFIER_SANITIZE, the compiled pattern)
+
+# the compiled Config.IDENTIFIER_SANITIZE, compiled again if the config changes
+def sanitizePattern():
+    global _sanitize
+    if _sanitize[0] != Config.IDENTIFIER_SANITIZE:
+        _sanitize = (Config.IDENTIFIER_SANITIZE, re.compile(Config.IDENTIFIER_SANITIZE))
+    return _sanitize[1]
+
+# finds the calls in a body with a single pass of Config.MATCH_STRING
+# create a new one when the config is reloaded
+class CallExtractor():
+
+    def __init__(self):
+        self.pattern    = re.compile(Config.MATCH_STRING)
+        self.pairs      = dict(zip(Config.MATCH_PAIR_PREFIXES, Config.MATCH_PAIR_SUFFIXES))
+
+    # extract(body) - yields (prefix, identifier, span) for each call in `body`
+    # identifier: normalized (see Helpers.normalizeIdentifier)
+    # span: (start, end) of the call in `body`, prefix and suffix included
+    def extract(self, body):
+        for match in self.pattern.finditer(body):
+            prefix = match.group('pair_prefix')
+            if prefix is not None:
+                if match.group('pair_suffix') != self.pairs[prefix]:
+                    continue
+                identifier = match.group('pair_identifier')
+            else:
+                prefix = match.group('standalone_prefix')
+                identifier = match.group('standalone_identifier')
+
+            identifier = Helpers.normalizeIdentifier(identifier)
+            if identifier:
+                yield prefix, identifier, match.span()
+
 class Helpers():
 
     # main - CallResponse instance
@@ -58,72 +107,51 @@ class Helpers():
     def isValidMessage(self, message):
         return False
 
+    # validateIdentifier(query) - (normalized identifier, prefix) of a call
+    # such as "{charizard}" or "!charizard", (False, None) if it isn't one
     def validateIdentifier(self, query):
         if len(query) <= 1:
             return False, None
-        
-        if Config.IDENTIFIER_NO_ACCENTS:
-            query = Helpers.removeAccents(query)
-
-        if Config.IDENTIFIER_TO_LOWER:
-            query = query.lower()
-        
-        prefix_cache = {}
-        
-        def find_prefix(options):
-            idx = 0
 
-            for opt in options:
-                opt_len = len(opt)
-
-                if not opt_len in prefix_cache:
-                    prefix_cache[opt_len] = query[:opt_len]
-
-                if prefix_cache[opt_len] == opt:
+        for prefix, suffix in zip(Config.MATCH_PAIR_PREFIXES, Config.MATCH_PAIR_SUFFIXES):
+            if query.startswith(prefix):
+                if not query.endswith(suffix):
+                    return False, None
+                identifier = query[len(prefix):len(query) - len(suffix)]
+                break
+        else:
+            # if no results for pair prefixes, try standalone prefixes
+            for prefix in Config.MATCH_STANDALONE_PREFIXES:
+                if query.startswith(prefix):
+                    identifier = query[len(prefix):]
                     break
-                
-                idx += 1
-
-            if idx == len(options):
-                return -1, 0
-
-            return idx, len(options[idx])
-
-        idx, offset = find_prefix(Config.MATCH_PAIR_PREFIXES)
-
-        # if no results for pair prefixes, try standalone prefixes
-        if idx == -1:
-            idx, offset = find_prefix(Config.MATCH_STANDALONE_PREFIXES)
-
-            # if still no results, return false
-            if idx == -1:
+            else:
                 return False, None
 
-            identifier = query[offset:]
-            prefix = Config.MATCH_STANDALONE_PREFIXES[idx]
-        else:
-            suffix = Config.MATCH_PAIR_SUFFIXES[idx]
-            suffix_len = len(suffix)
+        return Helpers.normalizeIdentifier(identifier), prefix
 
-            if not query[-suffix_len:] == suffix:
-                return False, None
+    # normalizes an identifier (or an item term, so that they can be compared):
+    # accents removed, lower case, symbols removed and extraneous whitespace
+    # removed, as set by the IDENTIFIER_* config
+    # e.g. " Flabébé!  " -> "flabebe"
+    @staticmethod
+    def normalizeIdentifier(text):
+        if Config.IDENTIFIER_NO_ACCENTS and not text.isascii():
+            text = text.translate(ACCENT_TABLE)
 
-            identifier = query[offset:-suffix_len]
-            prefix = Config.MATCH_PAIR_PREFIXES[idx]
-        
-        if type(Config.IDENTIFIER_SANITIZE) == str:
-            identifier = re.sub(Config.IDENTIFIER_SANITIZE, '', identifier) # remove symbols
+        if Config.IDENTIFIER_TO_LOWER:
+            text = text.lower()
 
-        identifier = re.sub(r'\s+', ' ', identifier).strip() # remove extraneous whitespace
+        if type(Config.IDENTIFIER_SANITIZE) == str:
+            text = sanitizePattern().sub('', text) # remove symbols
 
-        return identifier, prefix
+        return WHITESPACE.sub(' ', text).strip() # remove extraneous whitespace
 
     # removes accents
     # e.g. "Flabébé" -> "Flabebe"
     @staticmethod
     def removeAccents(s):
-        return ''.join(c for c in unicodedata.normalize('NFD', s)
-                        if unicodedata.category(c) != 'Mn')
+        return s.translate(ACCENT_TABLE)
 
     def typeof(self, x):
         if not type(x) == str:
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# Ingestion.py
+# ~~~~~~~~~~~~
+# Polls the reddit listings the bot reads (new comments, new submissions,
+# edited comments, the unread inbox) through a single scheduler, instead of
+# fetching all of them again on every loop:
+#  - the new comments and submissions keep a cursor, the fullname of the
+#    newest thing they got, and only ask reddit for the things newer than
+#    that (`before`). The edited comments don't: a thing edited again moves
+#    to the top of the listing, and if it was the cursor nothing would ever
+#    be newer than it, so the edits are told apart by their edit time
+#  - each listing is polled at an interval that follows its traffic: about
+#    the time it takes to get INGEST_TARGET_BATCH new things at the rate
+#    observed so far, between INGEST_MIN_INTERVAL and INGEST_MAX_INTERVAL.
+#    The inbox is always polled every INGEST_MIN_INTERVAL, so that operator
+#    commands don't wait for a quiet listing's interval
+#  - if the listings together would poll more often than the
+#    INGEST_REQUESTS_PER_MINUTE budget, the intervals of the others are
+#    stretched by the same factor, so busier listings keep a bigger share of
+#    what's left of the budget
+
+import time
+
+from collections import deque
+
+try:
+    from PokeFacts import Config
+except ImportError:
+    import Config
+
+# weight of the latest poll in the traffic rate of a listing
+RATE_SMOOTHING = 0.3
+
+# the key of a thing in the listing of edited things: a thing edited
+# again comes back in the listing, and is new again
+def editKey(thing):
+    return (thing.fullname, thing.edited)
+
+class ListingSource():
+
+    # name: identifies the listing, its state is kept when the config is reloaded
+    # fetch: fetch(limit, params) returns the things of the listing, newest first
+    # handle: handle(thing) is called by the bot for each new thing
+    # use_cursor: only fetch the things newer than the last one seen (the inbox
+    #   of unread messages doesn't need it, messages are marked read instead)
+    # key: key(thing) identifies the things already seen, their fullname by default
+    # interval: poll every `interval` seconds, instead of following the traffic
+    def __init__(self, name, fetch, handle=None, limit=100, use_cursor=True, key=None, interval=None):
+        self.name       = name
+        self.fetch      = fetch
+        self.handle     = handle
+        self.limit      = limit
+        self.use_cursor = use_cursor
+        self.key        = key or (lambda thing: thing.fullname)
+        self.fixed      = interval
+
+        self.cursor     = None  # fullname of the newest thing seen
+        self.emptyPolls = 0     # polls in a row with a cursor and nothing new
+        self.rate       = None  # new things per second, smoothed
+        self.interval   = interval or Config.INGEST_MIN_INTERVAL # seconds between polls, before stretching
+        self.lastPoll   = None
+        self.nextPoll   = 0.0
+        self.polls      = 0
+        self.things     = 0     # new things got in total
+        self.seen       = deque(maxlen=2 * limit if limit else 200) # keys of the latest things
+
+    # takes over the cursor and traffic of `source`, the same listing
+    # before the config was reloaded
+    def inherit(self, source):
+        for attribute in ('cursor', 'emptyPolls', 'rate', 'interval', 'lastPoll', 'nextPoll',
+                          'polls', 'things', 'seen'):
+            setattr(self, attribute, getattr(source, attribute))
+        if self.fixed is not None:
+            self.interval = self.fixed
+            self.nextPoll = min(self.nextPoll, (self.lastPoll or 0.0) + self.fixed)
+
+    # poll(now) - the new things of the listing, oldest first
+    def poll(self, now):
+        params = {}
+        if self.use_cursor and self.cursor is not None:
+            params['before'] = self.cursor
+
+        things = []
+        keys = set()
+        for thing in self.fetch(self.limit, params):
+            if thing is None:
+                break
+            # when the page newer than the cursor is short, praw goes on with
+            # the things older than it (`after`), which were seen already
+            if 'before' in params and thing.fullname == params['before']:
+                break
+            # things seen before can come back if the cursor was reset, and
+            # a thing can be in two pages if the listing changed in between
+            key = self.key(thing)
+            if not key in self.seen and not key in keys:
+                keys.add(key)
+                things.append(thing)
+
+        if things:
+            if self.use_cursor:
+                self.cursor = things[0].fullname
+            self.emptyPolls = 0
+            self.seen.extend(self.key(thing) for thing in reversed(things))
+        elif self.cursor is not None:
+            # reddit returns nothing newer than a deleted thing, so a
+            # cursor that stays empty is dropped: the next poll gets the
+            # latest things again
+            self.emptyPolls += 1
+            if self.emptyPolls >= Config.INGEST_CURSOR_RESET_POLLS:
+                self.cursor = None
+                self.emptyPolls = 0
+
+        self.adapt(now, len(things))
+        self.polls += 1
+        self.things += len(things)
+
+        things.reverse()
+        return things
+
+    # adapt(now, count) - updates the traffic rate and the interval
+    # after a poll that got `count` new things
+    def adapt(self, now, count):
+        if self.lastPoll is not None and now > self.lastPoll:
+            rate = count / (now - self.lastPoll)
+            if self.rate is None:
+                self.rate = rate
+            else:
+                self.rate = RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.rate
+        self.lastPoll = now
+
+        if self.fixed is not None:
+            self.interval = self.fixed
+            return
+
+        if self.limit and count >= self.limit:
+            # a full page, there may be more waiting
+            interval = Config.INGEST_MIN_INTERVAL
+        elif self.rate:
+            interval = Config.INGEST_TARGET_BATCH / self.rate
+        else:
+            interval = Config.INGEST_MAX_INTERVAL
+
+        # quiet listings slow down gradually, busy ones speed up at once
+        interval = min(interval, 2 * self.interval)
+        self.interval = max(Config.INGEST_MIN_INTERVAL, min(Config.INGEST_MAX_INTERVAL, interval))
+
+    def stats(self):
+        return {
+            'polls':    self.polls,
+            'things':   self.things,
+            'rate':     self.rate or 0.0,
+            'interval': self.interval,
+            'cursor':   self.cursor,
+        }
+
+class Scheduler():
+
+    def __init__(self, sources=()):
+        self.sources = []
+        self.setSources(sources)
+
+    # setSources(sources) - the listings to poll, those with the name of a
+    # current listing keep its cursor and traffic
+    def setSources(self, sources):
+        current = dict((source.name, source) for source in self.sources)
+        for source in sources:
+            if source.name in current:
+                source.inherit(current[source.name])
+        self.sources = list(sources)
+
+    # stretch() - the factor applied to the intervals of the listings that
+    # follow their traffic, so that all the listings together don't use more
+    # than Config.INGEST_REQUESTS_PER_MINUTE. Fixed intervals aren't stretched
+    def stretch(self):
+        fixed = sum(60.0 / source.interval for source in self.sources if source.fixed is not None)
+        requests_per_minute = sum(60.0 / source.interval for source in self.sources if source.fixed is None)
+        budget = max(Config.INGEST_REQUESTS_PER_MINUTE - fixed, 1.0)
+        return max(1.0, requests_per_minute / budget)
+
+    # poll(now=None) - polls the listings that are due, returns a
+    # list of (source, new things oldest first), one per listing polled
+    def poll(self, now=None):
+        if now is None:
+            now = time.time()
+
+        polled = []
+        for source in self.sources:
+            if source.nextPoll <= now:
+                polled.append((source, source.poll(now)))
+
+        stretch = self.stretch()
+        for source, things in polled:
+            source.nextPoll = now + source.interval * (stretch if source.fixed is None else 1.0)
+
+        return polled
+
+    # seconds until the next listing is due
+    def sleepTime(self, now=None):
+        if not self.sources:
+            return Config.INGEST_MIN_INTERVAL
+        if now is None:
+            now = time.time()
+        return max(0.0, min(source.nextPoll for source in self.sources) - now)
+
+    def stats(self):
+        return dict((source.name, source.stats()) for source in self.sources)
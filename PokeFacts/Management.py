@@ -3,22 +3,34 @@
 import os
 import sys
 import praw
+import queue
 import psutil
 import signal
 import traceback
 
+try:
+    from PokeFacts import Config
+    from PokeFacts import Metrics
+except ImportError:
+    import Config
+    import Metrics
+
 class Management():
 
     def __init__(self, main):
         self.main = main
+        self.pending_replies = queue.Queue() # (message, reply body) to send from the main loop
 
     # If a reddit user whose username is in the Config.OPERATORS list
     # sends a private message to the bot, this method will be called.
-    def processOperatorCommand(self, operator, subject, body):
+    # `message` is the operator's message, for commands that reply later
+    def processOperatorCommand(self, operator, subject, body, message=None):
         self.main.logger.info('Got operator command from ' + str(operator) + ': ' + subject)
 
         operator_commands = {
-            "ReloadData":       self.bot_reloadData,
+            "ReloadData":       lambda: self.bot_reloadData(message),
+            "MemoryReport":     lambda: self.bot_memoryReport(message),
+            "SearchMetrics":    lambda: self.bot_searchMetrics(message),
             "ReloadConfig":     self.bot_reloadConfig,
             "ClearDoneQueue":   self.bot_clearDoneQueue,
             "BotShutdown":      self.bot_shutdown,
@@ -32,14 +44,119 @@ class Management():
         except KeyError:
             return False            
 
-    def bot_reloadData(self):
-        try:
-            self.main.logger.info('Reloading data...')
-            self.main.data.reload()
-            self.main.logger.info('Data reloaded.')
-            return True
-        except IOError:
-            return False
+    # the data is reloaded in the background, the bot keeps answering with
+    # the current data until the new data is ready. The operator gets a
+    # second reply once the new data is in use (or the reload failed)
+    # The new store is measured (and its replies rendered) before it's
+    # swapped in, while the pipeline threads only read the current one
+    def bot_reloadData(self, message=None):
+        self.main.logger.info('Reloading data...')
+        prepared = {}
+
+        def prepare(store):
+            if Config.REPLY_PRERENDER and not Config.DATA_LAZY_PAYLOADS:
+                prepared['fragments'] = self.main.renders.renderAll(store)
+            prepared['size'] = store.memoryReport()['total']
+
+        def done(store, seconds, error):
+            if error is not None:
+                self.main.logger.error('Data reload failed, keeping the current data: ' + repr(error))
+                self.queueReply(message, 'Data reload failed, still using the current data: ' + repr(error))
+            else:
+                if 'fragments' in prepared:
+                    self.main.renders.prerender(store, prepared['fragments'])
+
+                counts = ', '.join('%d %s' % (amount, type) for type, amount in store.itemCounts().items())
+                size = Management.formatSize(prepared['size'])
+                self.main.logger.info('Data reloaded in %.2fs (%s, %s)' % (seconds, counts, size))
+                self.queueReply(message, 'Data reloaded in %.2fs: %s. Memory used by the data: %s.' % (seconds, counts, size))
+
+        return self.main.data.reloadAsync(done, prepare)
+
+    # replies with the memory used by the current data, per type
+    # and for each part of the search index
+    def bot_memoryReport(self, message=None):
+        report = self.main.data.store.memoryReport()
+        self.main.logger.info('Memory used by the data: ' + Management.formatSize(report['total']))
+        self.queueReply(message, Management.formatMemoryReport(report))
+        return True
+
+    # formats an ItemStore.memoryReport as a reddit markdown table
+    @staticmethod
+    def formatMemoryReport(report):
+        size = Management.formatSize
+
+        lines = [
+            'Memory used by the data: **%s**' % size(report['total']),
+            '',
+            'Type | Items | Term maps | Word counts',
+            ':--|--:|--:|--:',
+        ]
+        for type, parts in sorted(report['clusters'].items(), key=lambda part: str(part[0])):
+            lines.append('%s | %s | %s | %s' % (type, size(parts['items']), size(parts['term_maps']), size(parts['word_counts'])))
+
+        lines += [
+            '',
+            'Spelling dictionary | Indexes | Payload offsets | Caches',
+            '--:|--:|--:|--:',
+            '%s | %s | %s | %s' % (size(report['spelling']), size(report['index']),
+                                   size(report['payloads']), size(report['caches'])),
+        ]
+        return '\n'.join(lines)
+
+    # replies with the lookup stage timers and candidate set sizes
+    # (see Metrics.py, collected while Config.METRICS_ENABLED is set)
+    def bot_searchMetrics(self, message=None):
+        self.queueReply(message, Management.formatMetricsReport(Metrics.report()))
+        return True
+
+    # formats a Metrics.report as reddit markdown tables
+    @staticmethod
+    def formatMetricsReport(report):
+        lines = [
+            'Search metrics are **%s**' % ('on' if report['enabled'] else 'off'),
+            '',
+            'Stage | Calls | Mean ms | p50 ms | p90 ms | p99 ms | Max ms',
+            ':--|--:|--:|--:|--:|--:|--:',
+        ]
+        for stage, timer in sorted(report['timers'].items()):
+            lines.append('%s | %d | %.3f | %.3f | %.3f | %.3f | %.3f' % (stage, timer['count'],
+                timer['mean'], timer['p50'], timer['p90'], timer['p99'], timer['max']))
+
+        lines += [
+            '',
+            'Set size | Count | Mean | p50 | p90 | p99 | Max',
+            ':--|--:|--:|--:|--:|--:|--:',
+        ]
+        for name, sizes in sorted(report['sizes'].items()):
+            lines.append('%s | %d | %.1f | %d | %d | %d | %d' % (name, sizes['count'],
+                sizes['mean'], sizes['p50'], sizes['p90'], sizes['p99'], sizes['max']))
+
+        return '\n'.join(lines)
+
+    @staticmethod
+    def formatSize(size):
+        if size < 1024 * 1024:
+            return '%.1fKB' % (size / 1024.0)
+        return '%.2fMB' % (size / 1024.0 / 1024.0)
+
+    def queueReply(self, message, body):
+        if message is not None:
+            self.pending_replies.put((message, body))
+
+    # sends the replies queued by background tasks,
+    # called from the main loop. A reply that fails is
+    # logged and dropped, the others are still sent
+    def sendPendingReplies(self):
+        while True:
+            try:
+                message, body = self.pending_replies.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                message.reply(body)
+            except Exception:
+                self.main.logger.exception('Failed to reply to operator message ' + str(getattr(message, 'id', message)))
 
     def bot_reloadConfig(self):
         try:
@@ -50,10 +167,21 @@ class Management():
             return False
 
     def bot_clearDoneQueue(self):
-        self.main.done = {}
+        self.main.done.clear()
         return True
 
+    # waits (up to a minute) for the replies already in the pipeline to be
+    # sent, stops its threads, and writes the done queue
+    def bot_flushPending(self):
+        if self.main.pipeline is not None:
+            if not self.main.pipeline.drain(60):
+                self.main.logger.warning('Replies still pending: ' + str(self.main.pipeline.stats()))
+            if not self.main.pipeline.close(5):
+                self.main.logger.warning('Pipeline threads still running: ' + str(self.main.pipeline.stats()))
+        self.main.done.flush()
+
     def bot_shutdown(self):
+        self.bot_flushPending()
         sys.exit(0)
 
     def bot_isNohupMode(self):
@@ -68,6 +196,7 @@ class Management():
 
     def bot_restart(self):
         self.main.logger.info('Initializing restart sequence')
+        self.bot_flushPending()
         try:
             # close open files/resources to prevent possible memory leaks
             p = psutil.Process(os.getpid())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Metrics.py
+# ~~~~~~~~~~
+# Switchable timers for the stages of a lookup (identifier validation,
+# normalization, spelling correction, synonyms, candidate scoring, ...)
+# and histograms of the candidate set sizes, to find out where the time of
+# a slow call goes. Off unless Config.METRICS_ENABLED is set, and then a
+# stage costs a function call and a config check.
+#
+# The last Config.METRICS_WINDOW samples of each stage are kept, report()
+# summarizes them (operators get the same with the "SearchMetrics" command).
+# Stages nest, e.g. the time of "getInfo" includes its "spelling" time.
+#
+#   started = Metrics.start()
+#   ...
+#   Metrics.stop('stage', started)
+#   Metrics.size('candidates', len(candidates))
+
+import time
+import bisect
+import threading
+
+from collections import deque
+
+try:
+    from PokeFacts import Config
+except ImportError:
+    import Config
+
+# histogram bucket upper bounds: stage times in milliseconds and set sizes
+TIME_BUCKETS = (0.01, 0.1, 1, 10, 100)
+SIZE_BUCKETS = (1, 10, 100, 1000)
+
+# histogram of the last `window` samples, with the count and total of all the samples
+# samples can be added from several threads (e.g. the pipeline's, see Pipeline.py)
+class RollingHistogram():
+
+    def __init__(self, bounds, window=1000):
+        self.bounds     = bounds
+        self.samples    = deque(maxlen=window)
+        self.count      = 0
+        self.total      = 0.0
+        self.lock       = threading.Lock()
+
+    def add(self, value):
+        with self.lock:
+            self.samples.append(value)
+            self.count += 1
+            self.total += value
+
+    # percentiles, maximum and bucket counts are those of the window,
+    # `buckets` is a list of (upper bound, count), the last bound is None
+    def summary(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            count = self.count
+            total = self.total
+
+        buckets = [0] * (len(self.bounds) + 1)
+        for value in samples:
+            buckets[bisect.bisect_left(self.bounds, value)] += 1
+
+        def percentile(fraction):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+        return {
+            'count':    count,
+            'mean':     total / count if count else 0.0,
+            'window':   len(samples),
+            'p50':      percentile(0.50),
+            'p90':      percentile(0.90),
+            'p99':      percentile(0.99),
+            'max':      samples[-1] if samples else 0.0,
+            'buckets':  list(zip(self.bounds + (None,), buckets)),
+        }
+
+_lock   = threading.Lock()
+_timers = {} # stage -> RollingHistogram of its times in milliseconds
+_sizes  = {} # name -> RollingHistogram of the set sizes
+
+def enabled():
+    return Config.METRICS_ENABLED
+
+# start() - the start time of a stage for `stop`, None when metrics are off
+def start():
+    if not Config.METRICS_ENABLED:
+        return None
+    return time.perf_counter()
+
+# stop(stage, started) - records the time of `stage` since `started` (from `start`)
+def stop(stage, started):
+    if started is None:
+        return
+    histogram(_timers, stage, TIME_BUCKETS).add((time.perf_counter() - started) * 1e3)
+
+# size(name, value) - records the size of a set (e.g. the number of candidates scored)
+def size(name, value):
+    if not Config.METRICS_ENABLED:
+        return
+    histogram(_sizes, name, SIZE_BUCKETS).add(value)
+
+def histogram(histograms, name, bounds):
+    result = histograms.get(name)
+    if result is None:
+        with _lock:
+            result = histograms.setdefault(name, RollingHistogram(bounds, Config.METRICS_WINDOW))
+    return result
+
+# report() - {'enabled', 'timers': stage -> summary in milliseconds,
+# 'sizes': name -> summary} (see RollingHistogram.summary)
+def report():
+    with _lock:
+        timers = dict(_timers)
+        sizes = dict(_sizes)
+
+    return {
+        'enabled':  enabled(),
+        'timers':   dict((stage, timer.summary()) for stage, timer in timers.items()),
+        'sizes':    dict((name, value.summary()) for name, value in sizes.items()),
+    }
+
+# forgets every sample
+def reset():
+    with _lock:
+        _timers.clear()
+        _sizes.clear()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Payloads.py
+# ~~~~~~~~~~~
+# This file writes and reads the payload file used when item data is
+# kept out of memory (Config.DATA_LAZY_PAYLOADS). The ItemStore then only
+# holds the terms and an offset table, and an item's data is decoded from
+# the memory-mapped payload file when it's needed.
+#
+# A payload file is laid out as:
+#   MAGIC (6 bytes) | FORMAT_VERSION (2 bytes) | key (32 bytes) | payloads
+#
+# Each payload is the compact utf-8 json encoding of one item's data. The
+# key ties the payload file to the data (and snapshot) it was written for.
+
+import os
+import json
+import mmap
+import struct
+import tempfile
+
+from array import array
+
+try:
+    from PokeFacts import Cache
+except ImportError:
+    import Cache
+
+MAGIC           = b'PFDATA'
+FORMAT_VERSION  = 1
+HEADER          = struct.Struct('<6sH32s')
+
+# save(file, key, values) - writes the payload file, returns the offset
+# table: payload i is stored at offsets[i]:offsets[i + 1]
+# the file is replaced atomically, so stores still using a memory map of
+# the previous file keep reading the previous file. It's written to a
+# temporary file of its own first, so that writers don't overwrite each other
+def save(file, key, values):
+    offsets = array('Q', [HEADER.size])
+
+    payload_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(file)),
+                                               prefix=os.path.basename(file) + '.', suffix='.tmp', delete=False)
+    try:
+        with payload_file:
+            payload_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, key))
+            for value in values:
+                payload = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                payload_file.write(payload)
+                offsets.append(offsets[-1] + len(payload))
+        os.replace(payload_file.name, file)
+    except BaseException:
+        os.unlink(payload_file.name)
+        raise
+
+    return offsets
+
+# read-only view of a payload file, with a small cache of decoded payloads
+class PayloadFile():
+
+    def __init__(self, file, key, offsets, cache_size=64):
+        self.file       = file
+        self.key        = key
+        self.offsets    = offsets
+        self.cache      = Cache.LRUCache(cache_size)
+        self._map       = None
+        self.open()
+
+    # maps the file, raises IOError if it isn't the payload file for `key`
+    def open(self):
+        with open(self.file, 'rb') as payload_file:
+            header = payload_file.read(HEADER.size)
+            if len(header) != HEADER.size or HEADER.unpack(header) != (MAGIC, FORMAT_VERSION, self.key):
+                raise IOError("%s is not the payload file of this data" % self.file)
+
+            self._map = mmap.mmap(payload_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) != self.offsets[-1]:
+            self.close()
+            raise IOError("%s is not the payload file of this data" % self.file)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    # get(index) - the decoded payload at `index`
+    def get(self, index):
+        value = self.cache.get(index)
+        if value is None:
+            value = json.loads(self._map[self.offsets[index]:self.offsets[index + 1]].decode('utf-8'))
+            self.cache.put(index, value)
+        return value
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # the memory map and the cache aren't pickled, the file is
+    # mapped again (and checked against the key) when unpickled
+    def __getstate__(self):
+        return (self.file, self.key, self.offsets, self.cache.maxsize)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+# Pipeline.py
+# ~~~~~~~~~~~
+# Splits the handling of the things the bot reads into stages, so a reply
+# waiting on reddit doesn't hold up the next things:
+#  - fetching: the main loop polls the listings (see Ingestion.py) and puts
+#    the things to answer in the pipeline, it waits when the pipeline is full
+#  - resolving: one thread looks up the calls of each thing and renders the
+#    reply (CPU only), see CallResponse.resolve
+#  - replying: Config.PIPELINE_REPLY_WORKERS threads send the replies. The
+#    replies to a same thing always go to the same worker, so they're sent
+#    in order (a reply, then its edits)
+# The stages are connected by queues of Config.PIPELINE_QUEUE_SIZE things,
+# when a stage falls behind, the stages before it wait.
+#
+# The replies are sent under a token bucket, whose rate follows the rate
+# limit reddit reports (reddit.auth.limits) after each reply, leaving the
+# listing requests of the ingestion their share.
+#
+# close() stops the threads once the things already put are handled.
+
+import sys
+import time
+import queue
+import threading
+import traceback
+
+try:
+    from PokeFacts import Config
+    from PokeFacts import Metrics
+except ImportError:
+    import Config
+    import Metrics
+
+# put in the queues by close(), ends the thread reading it
+STOP = object()
+
+# a reply to send: `body` to reply to `thing` with (or to edit the previous reply with)
+class Reply():
+    def __init__(self, thing, body, ttype):
+        self.thing  = thing
+        self.body   = body
+        self.ttype  = ttype
+
+# allows `rate` requests per second, up to `burst` at once after a pause
+class TokenBucket():
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate   = rate
+        self.rate       = rate
+        self.burst      = burst
+        self.tokens     = float(burst)
+        self.clock      = clock
+        self.sleep      = sleep
+        self.updated    = clock()
+        self.lock       = threading.Lock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # acquire() - waits for a token, returns the seconds waited
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+    # follow(remaining, reset_timestamp, reserved_rate=0.0) - adapts the rate to
+    # the `remaining` requests reddit allows until `reset_timestamp` (epoch
+    # seconds), minus `reserved_rate` requests per second kept for other uses
+    def follow(self, remaining, reset_timestamp, reserved_rate=0.0):
+        if remaining is None or reset_timestamp is None:
+            return
+
+        seconds = max(1.0, reset_timestamp - time.time())
+        available = remaining - reserved_rate * seconds
+        with self.lock:
+            self.refill()
+            # at least one request per period, reddit resets the count then
+            self.rate = min(self.max_rate, max(1.0, available) / seconds)
+            self.tokens = min(self.tokens, max(0.0, available))
+
+class Pipeline():
+
+    # resolve: resolve(thing) returns the Reply for the thing, or None
+    # send: send(reply) sends a Reply
+    # limits: limits() returns reddit's rate limit, e.g. lambda: reddit.auth.limits
+    # failed: failed(thing) is called when resolving or replying to the thing raised
+    def __init__(self, resolve, send, limits=None, logger=None,
+                 workers=None, size=None, bucket=None, failed=None):
+        workers = Config.PIPELINE_REPLY_WORKERS if workers is None else workers
+        size    = Config.PIPELINE_QUEUE_SIZE if size is None else size
+
+        self.resolve    = resolve
+        self.send       = send
+        self.limits     = limits
+        self.logger     = logger
+        self.failed     = failed
+        self.bucket     = TokenBucket(Config.PIPELINE_REPLY_RATE, Config.PIPELINE_REPLY_BURST) if bucket is None else bucket
+
+        self.things     = queue.Queue(size)
+        self.replies    = [queue.Queue(size) for i in range(max(1, workers))]
+        self.pending    = 0 # things put and not done yet
+        self.done       = threading.Condition()
+        self.sent       = 0
+        self.closed     = False
+
+        self.threads = [threading.Thread(target=self.resolver, name='resolver', daemon=True)]
+        for index, replies in enumerate(self.replies):
+            self.threads.append(threading.Thread(target=self.replier, args=(replies,),
+                                                 name='replier-%d' % index, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    # put(thing) - queues a thing to resolve, waits if the pipeline is full
+    def put(self, thing):
+        if self.closed:
+            raise RuntimeError('put in a closed pipeline')
+        with self.done:
+            self.pending += 1
+        self.things.put(thing)
+
+    def queueReply(self, reply):
+        self.replies[hash(reply.thing.id) % len(self.replies)].put(reply)
+
+    def finish(self):
+        with self.done:
+            self.pending -= 1
+            if self.pending == 0:
+                self.done.notify_all()
+
+    # drain(timeout=None) - waits until every thing put was resolved and
+    # its reply sent, returns False on timeout
+    def drain(self, timeout=None):
+        with self.done:
+            return self.done.wait_for(lambda: self.pending == 0, timeout)
+
+    # close(timeout=None) - stops the threads after the things already put
+    # are resolved and their replies sent, returns False if some are
+    # still running after `timeout` seconds
+    def close(self, timeout=None):
+        if not self.closed:
+            self.closed = True
+            self.things.put(STOP)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def resolver(self):
+        while True:
+            thing = self.things.get()
+            if thing is STOP:
+                for replies in self.replies:
+                    replies.put(STOP)
+                return
+
+            reply = None
+            try:
+                started = Metrics.start()
+                reply = self.resolve(thing)
+                Metrics.stop('resolve', started)
+            except Exception:
+                self.error('Failed to resolve ' + str(getattr(thing, 'fullname', thing)), thing)
+
+            if reply is None:
+                self.finish()
+            else:
+                self.queueReply(reply)
+
+    def replier(self, replies):
+        while True:
+            reply = replies.get()
+            if reply is STOP:
+                return
+
+            try:
+                started = Metrics.start()
+                self.bucket.acquire()
+                Metrics.stop('replyWait', started)
+
+                started = Metrics.start()
+                self.send(reply)
+                Metrics.stop('reply', started)
+                with self.done:
+                    self.sent += 1
+
+                if self.limits is not None:
+                    limits = self.limits()
+                    self.bucket.follow(limits.get('remaining'), limits.get('reset_timestamp'),
+                                       Config.INGEST_REQUESTS_PER_MINUTE / 60.0)
+            except Exception:
+                self.error('Failed to reply to ' + str(reply.thing.fullname), reply.thing)
+            finally:
+                self.finish()
+
+    def error(self, message, thing):
+        if self.logger is not None:
+            self.logger.exception(message)
+        else:
+            print(message, file=sys.stderr)
+        traceback.print_exc()
+
+        if self.failed is not None:
+            try:
+                self.failed(thing)
+            except Exception:
+                traceback.print_exc()
+
+    def stats(self):
+        return {
+            'things':   self.things.qsize(),
+            'replies':  sum(replies.qsize() for replies in self.replies),
+            'pending':  self.pending,
+            'sent':     self.sent,
+            'rate':     self.bucket.rate,
+        }
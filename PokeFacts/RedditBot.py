@@ -8,16 +8,18 @@
 # First a new instance of CallResponse is created as "redditbot"
 # Then the 'main' function is called in an infinite loop
 #   - the main function calls redditbot.action() in a large try-catch
-# The 'action' function checks various streams (comments, submissions, etc.)
-# It passes on the stream things to the 'process' functions, the process
-# function determines if it will respond to the thing. If so, it invokes
-# 'get_calls' to see if the given thing called the bot.
+# The 'action' function polls the listings (comments, submissions, etc.) that
+# are due, through the scheduler of Ingestion.py, which only fetches the new
+# things of each listing and spreads the requests over the busiest ones.
+# It passes on the new things to the 'process' function, the process
+# function determines if it will respond to the thing. If so, 'resolve'
+# invokes 'get_calls' to see if the given thing called the bot.
 # If there are no calls, the thing is ignored. Otherwise it passes the result
 # of 'get_calls' on the Responder, which'll return the response body back to
-# the 'process' function and the process function will reply.
+# 'resolve', and 'send_reply' will reply. With the pipeline on (Pipeline.py),
+# 'resolve' and 'send_reply' run on their own threads.
 
 import os
-import re
 import sys
 import time
 import praw
@@ -29,14 +31,22 @@ import traceback
 try:
     from PokeFacts import Config
     from PokeFacts import DataPulls
+    from PokeFacts import DoneQueue
     from PokeFacts import Helpers
+    from PokeFacts import Ingestion
     from PokeFacts import Management
+    from PokeFacts import Metrics
+    from PokeFacts import Pipeline
     from PokeFacts import Responder
 except ImportError:
     import Config
     import DataPulls
+    import DoneQueue
     import Helpers
+    import Ingestion
     import Management
+    import Metrics
+    import Pipeline
     import Responder
 try:
     from layer7_utilities import Logger
@@ -60,7 +70,9 @@ except ImportError:
 
 # Call the bot, get a response...
 class CallResponse():
-    def __init__(self, reddit=None, data=None):
+    # done: the DoneQueue to use, by default the one of Config.DONE_STORE_FILE,
+    # or one in memory only when not connected to reddit
+    def __init__(self, reddit=None, data=None, done=None):
         self.startTime  = time.time()
         self.scriptfile = os.path.abspath(__file__)
         self.scriptpath = os.path.dirname(self.scriptfile)
@@ -70,12 +82,34 @@ class CallResponse():
         self.r = Config.reddit() if reddit is None else reddit
         self.logger.info('Connected to reddit account: {}'.format(self.r.user.me() if self.r else "-"))
 
-        self.done       = {}
+        self.done       = self.loadDoneQueue() if done is None else done
         self.helpers    = Helpers.Helpers(self.r)
         self.mgmt       = Management.Management(self)
         self.data       = DataPulls.DataPulls(scriptpath=self.scriptpath) if data is None else data
+        self.renders    = Responder.RenderCache() # the response fragments of the current data
+        self.ingestion  = Ingestion.Scheduler()
+        self.pipeline   = None
+
+        if Config.PIPELINE_ENABLED and self.r:
+            self.pipeline = Pipeline.Pipeline(self.resolve, self.send_reply, lambda: self.r.auth.limits, self.logger,
+                                              failed=self.failed)
+
+        if Config.REPLY_PRERENDER and not Config.DATA_LAZY_PAYLOADS:
+            self.renders.prerender(self.data.store)
         
         self.reloadConfig(True)
+
+        # catch up on the things posted while the bot was down, the done
+        # queue keeps it from replying twice to those it had seen
+        last_active = self.done.lastActive()
+        if last_active is not None:
+            self.startTime = max(last_active, self.startTime - Config.DONE_CATCHUP_MAX)
+            self.logger.info('Catching up from %s' % time.ctime(self.startTime))
+
+    def loadDoneQueue(self):
+        if not self.r or Config.DONE_STORE_FILE is None:
+            return DoneQueue.load()
+        return DoneQueue.load(self.scriptpath + '/' + Config.DONE_STORE_FILE.lstrip('/'))
     
     # Reload the configuration. If the Config.py file was modified, this
     # function will make those changes go into effect
@@ -84,7 +118,7 @@ class CallResponse():
             importlib.reload(Config)
             self.logger.info('Reloading config...')
         
-        self.match_p    = re.compile(Config.MATCH_STRING)
+        self.extractor  = Helpers.CallExtractor()
         self.subreddit  = self.r.subreddit('+'.join(Config.SUBREDDITS)) if self.r else None
         self.srmodnames = list(sr.lower() for sr in Config.SUBREDDITS if self.helpers.isBotModeratorOf(sr, 'posts'))
 
@@ -92,9 +126,12 @@ class CallResponse():
             self.modded = self.r.subreddit('+'.join(self.srmodnames))
         else:
             self.modded = None
+
+        # the listings are rebuilt for the new subreddits, but keep their cursors
+        self.ingestion.setSources(self.listingSources())
         
         template_file = codecs.open(self.scriptpath + '/' + Config.REPLY_TEMPLATE_FILE.lstrip('/'), "r", "utf-8")
-        self.response_template = template_file.read()
+        self.response_template = Responder.ReplyTemplate(template_file.read())
         template_file.close()
 
         self.logger.info('Initialized and ready to go on: ' + (', '.join(Config.SUBREDDITS)))
@@ -102,38 +139,40 @@ class CallResponse():
     # get a list of call items in the given body
     # list will be empty if the bot was not called
     def get_calls(self, body):
-        items = []
-        seen  = set()
-
-        it = re.finditer(self.match_p, body)
-        for match in it:
-            match = match.group(0)
-
-            identifier, prefix = self.helpers.validateIdentifier(match)
-
+        calls_started = Metrics.start()
+        items   = []
+        seen    = set()
+        matches = []
+        queries = []
+
+        started = Metrics.start()
+        for prefix, identifier, (start, end) in self.extractor.extract(body):
             search_type = True
             if 'type_for_prefix' in Config.DATA_CONF:
                 if prefix in Config.DATA_CONF['type_for_prefix']:
                     search_type = Config.DATA_CONF['type_for_prefix'][prefix]
 
-            if not identifier == False:
-                info = self.data.getInfo(identifier, type=search_type)
-                if not info is None and not info.term in seen:
-                    seen.add(info.term)
+            matches.append(body[start:end])
+            queries.append((identifier, search_type))
+        Metrics.stop('extractCalls', started)
 
-                    self.logger.info("Got info for: %s"%match)
-                    items.append(info)
-        
+        # all the calls of the body are looked up together
+        for match, info in zip(matches, self.data.getInfoMany(queries)):
+            if not info is None and not info.term in seen:
+                seen.add(info.term)
+
+                self.logger.info("Got info for: %s"%match)
+                items.append(info)
+
+        Metrics.stop('get_calls', calls_started)
+        Metrics.size('calls', len(matches))
         return items
     
     # will compile the response for the bot to send given a list of call items
+    # the response of each item is only rendered once per store (see Responder.RenderCache)
     def get_response(self, parent_thing, items):
-        response_body = ''
-
-        for item in items[:-1]:
-            response_body += Responder.getResponse(item)
-        else:
-            response_body += Responder.getResponse(items[-1], True)
+        store = self.data.store
+        response_body = Responder.SEPARATOR.join(self.renders.get(store, item) for item in items)
 
         return self.response_template.format(** {
             'author':       parent_thing.author.name,
@@ -152,8 +191,9 @@ class CallResponse():
             return True
 
         seen = False
-        if thing.id in self.done:
-            last_process = self.done[thing.id]['last_process']
+        record = self.done.get(thing.id)
+        if record is not None:
+            last_process = record['last_process']
             seen = True
 
         if not seen:
@@ -177,6 +217,8 @@ class CallResponse():
     #  - edits previous response if already responded
     #  - this function does NOT check if the thing is from an approved
     #    subreddit, the 'action' function takes care of those checks
+    # With the pipeline on, the thing is only queued here, it's resolved
+    # and replied to in the background (see Pipeline.py)
     # Returns:
     #   true - if should continue
     #   false - if should break
@@ -185,16 +227,41 @@ class CallResponse():
             if not ignore_break:
                 return False
         
-        if thing.id not in self.done:
-            self.done[thing.id] = {
-                "reply_id":     None,
-                "last_process": time.time()
-            }
-        
+        # registered before the thing is queued, so that the thing isn't
+        # taken for a new one if a listing returns it again meanwhile. It's
+        # only written as done once its reply is sent (see DoneQueue.start)
+        self.done.start(thing.id, thing.created_utc)
+
+        if self.pipeline is not None:
+            self.pipeline.put(thing)
+        else:
+            try:
+                reply = self.resolve(thing)
+                if reply is not None:
+                    self.send_reply(reply)
+            except Exception:
+                self.failed(thing)
+                raise
+
+        return True
+
+    # resolve(thing) - the Pipeline.Reply to send for the thing, None if it
+    # didn't call the bot (the thing is then done)
+    def resolve(self, thing):
+        reply = self.resolveCalls(thing)
+        if reply is None:
+            self.done.add(thing.id)
+        return reply
+
+    # failed(thing) - resolving or replying to the thing raised, it's done
+    # without a reply, instead of staying pending (see DoneQueue.start)
+    def failed(self, thing):
+        self.done.add(thing.id)
+
+    # only looks up the calls of the thing and renders the response
+    def resolveCalls(self, thing):
         ttype       = self.helpers.typeof(thing)        # thing type (int)
-        noun        = self.helpers.nounForType(ttype)   # thing type noun
         is_valid    = True                              # if the thing is valid for processing
-        subject     = None                              # thing subject (if applicable)
         body        = None                              # thing body
         items       = []                                # call items
 
@@ -206,105 +273,123 @@ class CallResponse():
             is_valid  = self.helpers.isValidSubmission(thing)
         elif ttype == Helpers.MESSAGE:
             body      = thing.body
-            subject   = thing.subject
             is_valid  = self.helpers.isValidMessage(thing) # returns False
-            if thing.author is not None and thing.author.name in Config.OPERATORS:
-                response = self.mgmt.processOperatorCommand(thing.author.name, subject, body)
-                if type(response) == str:
-                    thing.reply(response)
 
         if not is_valid:
-            return True
+            return None
         
-        items           = self.get_calls(body)
-        reply_thing     = None                      # the comment created by the bot's reply
+        items = self.get_calls(body)
+        if not any(items):
+            return None
+
+        self.logger.info("Got " + str(len(items)) + " calls from " + thing.fullname)
+        return Pipeline.Reply(thing, self.get_response(thing, items), ttype)
+
+    # send the reply, or edit the previous reply to the same thing
+    # the exceptions other than reddit's refusals are raised, the caller
+    # records the thing as failed (`process`, or the pipeline's `failed`)
+    def send_reply(self, reply):
+        thing       = reply.thing
+        ttype       = reply.ttype
+        noun        = self.helpers.nounForType(ttype)   # thing type noun
+        reply_thing = None                              # the comment created by the bot's reply
 
-        if any(items):
-            self.logger.info("Got " + str(len(items)) + " calls from " + thing.fullname)
-            try:
-                # compile reply
-                response_body = self.get_response(thing, items)
-
-                # check if already there already exists a reply for this thing
-                if self.done[thing.id]["reply_id"] is not None:
-                    reply_thing = self.r.comment(id=self.done[thing.id]["reply_id"])
-                    reply_thing.edit(response_body)
-                    self.logger.info("> Edited reply to " + noun + " by %s, id - %s"%(str(thing.author), thing.fullname))
-                else:
-                    reply_thing = thing.reply(response_body)
-                    self.logger.info("> Replied to " + noun + " by %s, id - %s"%(str(thing.author), thing.fullname))
-
-                    # optionals
-                    if self.mgmt.bot_isModerator(thing.subreddit):
-                        if ttype == Helpers.SUBMISSION and Config.REPLY_SHOULD_STICKY:
-                            reply_thing.mod.distinguish(sticky=True)
-                        elif ttype == Helpers.COMMENT and Config.REPLY_SHOULD_DISTINGUISH:
-                            reply_thing.mod.distinguish()
-
-                # update reply_id in done queue
-                self.done[thing.id]["reply_id"] = reply_thing.id
-            except praw.exceptions.APIException:
-                self.logger.warning("> " + noun + " was deleted, id - %s"%str(thing.fullname))
-            except prawcore.exceptions.Forbidden:
-                pass # this exception happens if we're banned from the subreddit
+        # the done queue may have been cleared since the thing was processed
+        done = self.done.start(thing.id, thing.created_utc)
 
-        return True
+        try:
+            # check if already there already exists a reply for this thing
+            if done["reply_id"] is not None:
+                reply_thing = self.r.comment(id=done["reply_id"])
+                reply_thing.edit(reply.body)
+                self.logger.info("> Edited reply to " + noun + " by %s, id - %s"%(str(thing.author), thing.fullname))
+            else:
+                reply_thing = thing.reply(reply.body)
+                self.logger.info("> Replied to " + noun + " by %s, id - %s"%(str(thing.author), thing.fullname))
+
+                # optionals
+                if self.mgmt.bot_isModerator(thing.subreddit):
+                    if ttype == Helpers.SUBMISSION and Config.REPLY_SHOULD_STICKY:
+                        reply_thing.mod.distinguish(sticky=True)
+                    elif ttype == Helpers.COMMENT and Config.REPLY_SHOULD_DISTINGUISH:
+                        reply_thing.mod.distinguish()
+
+            # update reply_id in done queue
+            self.done.setReply(thing.id, reply_thing.id)
+        except praw.exceptions.APIException:
+            self.logger.warning("> " + noun + " was deleted, id - %s"%str(thing.fullname))
+            self.done.add(thing.id)
+        except prawcore.exceptions.Forbidden:
+            # this exception happens if we're banned from the subreddit
+            self.done.add(thing.id)
+
+    # the listings polled by self.ingestion, with the function handling their things
+    def listingSources(self):
+        sources = []
+        if not self.r:
+            return sources
+
+        if Config.RESPONDER_CHECK_COMMENTS:
+            sources.append(Ingestion.ListingSource('comments',
+                lambda limit, params: self.subreddit.comments(limit=limit, params=params), self.process))
+
+        # self posts
+        if Config.RESPONDER_CHECK_SUBMISSIONS:
+            sources.append(Ingestion.ListingSource('submissions',
+                lambda limit, params: self.subreddit.new(limit=limit, params=params), self.process))
+
+        # edited comments for modded subs, a comment edited again moves to
+        # the top of the listing, so it's read without a cursor
+        if Config.RESPONDER_CHECK_EDITED and not self.modded is None:
+            sources.append(Ingestion.ListingSource('edited',
+                lambda limit, params: self.modded.mod.edited(limit=limit, params=params), self.process,
+                use_cursor=False, key=Ingestion.editKey))
+
+        # messages (for operator sent commands) and mentions, unread
+        # messages are marked read so they don't need a cursor. Polled
+        # as often as allowed, operator commands shouldn't wait
+        sources.append(Ingestion.ListingSource('inbox',
+            lambda limit, params: self.r.inbox.unread(limit=limit), self.processMessage,
+            limit=None, use_cursor=False, interval=Config.INGEST_MIN_INTERVAL))
+
+        return sources
+
+    # process an unread message of the inbox
+    # operator commands are run here, on the main loop
+    def processMessage(self, message):
+        message.mark_read()
+
+        if message.subject == 'username mention':
+            print("got mention: " + message.fullname)
+            if not Config.RESPONDER_CHECK_MENTIONS:
+                return
+            print(" - will proceed to processing")
+
+        if self.helpers.typeof(message) == Helpers.MESSAGE:
+            if message.author is not None and message.author.name in Config.OPERATORS:
+                response = self.mgmt.processOperatorCommand(message.author.name, message.subject, message.body, message)
+                if type(response) == str:
+                    message.reply(response)
+
+        self.process(message, ignore_break = True)
 
     # main loop action
     def action(self):
         self.logger.debug("<<<Next Loop>>>")
 
-        # check comments
-        if Config.RESPONDER_CHECK_COMMENTS:
-            amount = 0
-            self.logger.debug('-----[ Checking new comments ]-----')
-            for comment in self.subreddit.comments(limit=200):
-                if comment is None:
-                    break
-                if not self.process(comment):
-                    self.logger.debug('-----> Broke out of comments loop ' + str(amount))
-                    break
-                amount += 1
-        
-        # check self posts
-        if Config.RESPONDER_CHECK_SUBMISSIONS:
-            amount = 0
-            self.logger.debug('-----[ Checking new submissions ]-----')
-            for submission in self.subreddit.new(limit=100):
-                if submission is None:
-                    break
-                if not self.process(submission):
-                    self.logger.debug('-----> Broke out of submissions loop ' + str(amount))
-                    break
-                amount += 1
-
-        # check edited comments for modded subs
-        if Config.RESPONDER_CHECK_EDITED and not self.modded is None:
-            amount = 0
-            self.logger.debug('-----[ Checking edited comments ]-----')
-            for edited_thing in self.modded.mod.edited(limit=100):
-                if edited_thing is None:
-                    break
-                if not self.process(edited_thing):
-                    self.logger.debug('-----> Broke out of edited loop ' + str(amount))
-                    break
-                amount += 1
-                    
-        # check messages (for operator sent commands)
-        self.logger.debug('-----[ Checking unread inbox ]-----')
-        for message in self.r.inbox.unread(limit=None):
-            if message is None:
-                break
-
-            message.mark_read()
-
-            if message.subject == 'username mention':
-                print("got mention: " + message.fullname)
-                if not Config.RESPONDER_CHECK_MENTIONS:
-                    continue
-                print(" - will proceed to processing")
-
-            self.process(message, ignore_break = True)
+        # replies to operator commands that finished in the background
+        self.mgmt.sendPendingReplies()
+
+        # only the new things of the listings that are due are fetched, the
+        # things that were created before the bot started are still skipped
+        # by 'process' (see 'should_break')
+        for source, things in self.ingestion.poll():
+            self.logger.debug('-----[ %d new %s ]-----' % (len(things), source.name))
+            for thing in things:
+                source.handle(thing)
+
+        # wait for the next listing, but not so long that pending replies wait too
+        time.sleep(min(self.ingestion.sleepTime(), Config.INGEST_MIN_INTERVAL))
 
 def main(redditbot):
     try:
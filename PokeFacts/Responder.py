@@ -5,6 +5,8 @@
 # This file is tasked with compiling a response given a list
 # of call items (i.e. a list of results of DataPulls.getInfo)
 
+import string
+
 def xstr(x):
     if x is None:
         return ''
@@ -150,22 +152,110 @@ def respondItem(call_item):
 
     return response
 
-# getResponse - this function should return the response body
-# for the given call item (as returned by DataPulls.getInfo)
-def getResponse(item, is_last = False):  
-    response_types = {
-        "pokemon":  respondPokemon,
-        "ability":  respondAbility,
-        "move":     respondMove,
-        "item":     respondItem,
-    }
+RESPONSE_TYPES = {
+    "pokemon":  respondPokemon,
+    "ability":  respondAbility,
+    "move":     respondMove,
+    "item":     respondItem,
+}
+
+# separates the responses of the items of a reply
+SEPARATOR = '---' + "\n\n"
+
+# getFragment - the response body for the given call item
+# (as returned by DataPulls.getInfo), without the separator
+def getFragment(item):
     try:
-        response = response_types[item.type]( item.get() )
+        return RESPONSE_TYPES[item.type]( item.get() )
     except KeyError:
-        response = ""
+        return ""
+
+# getResponse - the response body for the given call item (as returned
+# by DataPulls.getInfo), followed by the separator unless it's the last.
+# The bot joins the fragments itself (see RedditBot.get_response)
+def getResponse(item, is_last = False):
+    response = getFragment(item)
 
     if not is_last:
-        response += '---'
-        response += "\n\n"
+        response += SEPARATOR
+
+    return response
 
-    return response
\ No newline at end of file
+# the response fragment of each item of a store, rendered once: the items
+# don't change while their store is in use, the fragments are dropped when
+# another store is used (the data was reloaded)
+class RenderCache():
+
+    def __init__(self):
+        self.state = (None, {}) # (store, id(item) -> (item, fragment))
+
+    # get(store, item) - getFragment(item), `item` being an item of `store`
+    def get(self, store, item):
+        fragments = self.fragments(store)
+
+        entry = fragments.get(id(item))
+        if entry is None or entry[0] is not item:
+            entry = (item, getFragment(item))
+            fragments[id(item)] = entry
+        return entry[1]
+
+    # renders the fragments of all the items of `store` at once, or uses
+    # `fragments` rendered beforehand by renderAll
+    def prerender(self, store, fragments=None):
+        if fragments is None:
+            fragments = RenderCache.renderAll(store)
+        self.state = (store, fragments)
+
+    # the fragments of all the items of `store`, for prerender
+    @staticmethod
+    def renderAll(store):
+        return dict((id(item), (item, getFragment(item))) for item in store.allItems())
+
+    def fragments(self, store):
+        current, fragments = self.state
+        if current is not store:
+            fragments = {}
+            self.state = (store, fragments)
+        return fragments
+
+    def __len__(self):
+        return len(self.state[1])
+
+# a str.format template (i.e. response.txt) parsed once, formatting it
+# is a join of its literal text and the values of its fields
+class ReplyTemplate():
+
+    def __init__(self, text):
+        self.text = text
+        self.parts = [] # literal text, or (field name, conversion, format spec)
+
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if literal:
+                self.parts.append(literal)
+            if field is None:
+                continue
+
+            # fields such as {author.name} or {body:{width}} are left to str.format
+            if not field.isidentifier() or '{' in spec:
+                self.parts = None
+                break
+            self.parts.append((field, conversion, spec))
+
+    # format(**values) - the same as `text.format(**values)`
+    def format(self, **values):
+        if self.parts is None:
+            return self.text.format(**values)
+
+        return ''.join(part if type(part) is str else ReplyTemplate.formatField(values, *part)
+                        for part in self.parts)
+
+    @staticmethod
+    def formatField(values, field, conversion, spec):
+        value = values[field]
+        if conversion == 'r':
+            value = repr(value)
+        elif conversion == 'a':
+            value = ascii(value)
+        elif conversion == 's':
+            value = str(value)
+        return format(value, spec)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+# Similarity.py
+# ~~~~~~~~~~~~~
+# Similarity scorers used by TermHolder to rank term candidates.
+# A scorer has a `name` (its key in SCORERS) and a method
+#   ratio(a, b, cutoff=0.0) - similarity of `a` and `b`, between 0.0
+#   (nothing in common) and 1.0 (equal). If the ratio is below `cutoff`,
+#   the scorer may stop early and return 0.0 instead of the exact ratio
+#
+#  - SequenceMatcherScorer: difflib.SequenceMatcher, the reference scorer
+#  - IndelScorer: normalized indel (insert/delete) similarity computed with
+#    a bit-parallel longest common subsequence, much faster to compute. It
+#    ranks some candidates differently (see tests/test_Similarity.py)
+
+from difflib import SequenceMatcher
+
+class SequenceMatcherScorer():
+    name = 'sequencematcher'
+
+    def ratio(self, a, b, cutoff=0.0):
+        matcher = SequenceMatcher(None, a, b)
+        if cutoff > 0 and (matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff):
+            return 0.0
+        return matcher.ratio()
+
+# ratio = 2 * LCS(a, b) / (len(a) + len(b)), which is the ratio SequenceMatcher
+# would give if it found the longest common subsequence instead of the
+# longest common blocks
+class IndelScorer():
+    name = 'indel'
+
+    def __init__(self):
+        self._pattern = None # (string, character -> bitmask) of the last `a`
+
+    def ratio(self, a, b, cutoff=0.0):
+        total = len(a) + len(b)
+        if total == 0:
+            return 1.0
+
+        # the LCS is at most as long as the shorter string
+        if cutoff > 0 and 2.0 * min(len(a), len(b)) / total < cutoff:
+            return 0.0
+
+        length = self.lcsLength(a, b, cutoff * total / 2.0)
+        if length is None:
+            return 0.0
+        return 2.0 * length / total
+
+    # lcsLength(a, b, minimum=0) - length of the longest common subsequence,
+    # bit-parallel (Allison-Dix/Hyyro): one big-int operation per character
+    # of `b`. None as soon as it's known to be shorter than `minimum`: every
+    # character of `b` missing from `a` lowers the longest it can be
+    def lcsLength(self, a, b, minimum=0):
+        if not a or not b:
+            return 0 if minimum <= 0 else None
+
+        pattern = self._pattern
+        if pattern is None or pattern[0] != a:
+            masks = {}
+            bit = 1
+            for char in a:
+                masks[char] = masks.get(char, 0) | bit
+                bit <<= 1
+            pattern = self._pattern = (a, masks)
+        masks = pattern[1]
+
+        full = (1 << len(a)) - 1
+        row = full
+        longest = len(b)
+        for char in b:
+            matches = masks.get(char)
+            if matches:
+                u = row & matches
+                row = ((row + u) | (row - u)) & full
+            else:
+                longest -= 1
+                if longest < minimum:
+                    return None
+
+        return len(a) - bin(row).count('1')
+
+SCORERS = {
+    SequenceMatcherScorer.name: SequenceMatcherScorer,
+    IndelScorer.name:           IndelScorer,
+}
+
+def getScorer(name):
+    return SCORERS[name]()
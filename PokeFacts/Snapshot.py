@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Snapshot.py
+# ~~~~~~~~~~~
+# This file reads and writes the precompiled on-disk snapshot of the
+# fully built search index, so that the bot doesn't need to re-parse
+# the json data files and rebuild every index on each start/reload.
+#
+# A snapshot file is laid out as:
+#   MAGIC (6 bytes) | FORMAT_VERSION (2 bytes) | key (32 bytes) | pickle payload
+#
+# The key is a sha256 digest over the source files (data files, synonym
+# files and the modules defining the pickled classes) plus any extra
+# configuration that affects how the index is built. A snapshot is only
+# used when its key matches, otherwise the caller should rebuild from source.
+#
+# Build the snapshot ahead of time with:
+#   python -m PokeFacts.Snapshot
+
+import gc
+import os
+import sys
+import time
+import pickle
+import struct
+import hashlib
+import tempfile
+
+MAGIC           = b'PFSNAP'
+FORMAT_VERSION  = 1
+HEADER          = struct.Struct('<6sH32s')
+
+# computes the snapshot key for the given source files and extra config
+def sourceKey(files, extra=None):
+    digest = hashlib.sha256()
+    digest.update(struct.pack('<H', FORMAT_VERSION))
+
+    for file in files:
+        digest.update(os.path.basename(file).encode('utf-8'))
+        with open(file, 'rb') as source_file:
+            digest.update(hashlib.sha256(source_file.read()).digest())
+
+    digest.update(repr(extra).encode('utf-8'))
+    return digest.digest()
+
+# load(file, key) - returns the unpickled payload of the snapshot,
+# or None if the snapshot doesn't exist, is outdated or unreadable
+def load(file, key):
+    try:
+        with open(file, 'rb') as snapshot_file:
+            header = snapshot_file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                return None
+
+            magic, version, snapshot_key = HEADER.unpack(header)
+            if magic != MAGIC or version != FORMAT_VERSION or snapshot_key != key:
+                return None
+
+            # unpickling creates a lot of container objects, the cyclic
+            # garbage collector would otherwise run many times while loading
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.load(snapshot_file)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+    except (IOError, OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+# save(file, key, payload) - writes the snapshot, the file is
+# replaced atomically so a running bot never reads a partial file
+# (each writer uses its own temporary file, so two processes writing the
+# same snapshot don't mix their writes)
+def save(file, key, payload):
+    snapshot_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(file)),
+                                                prefix=os.path.basename(file) + '.', suffix='.tmp', delete=False)
+    try:
+        with snapshot_file:
+            snapshot_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, key))
+            pickle.dump(payload, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(snapshot_file.name, file)
+    except BaseException:
+        os.unlink(snapshot_file.name)
+        raise
+
+if __name__ == '__main__':
+    try:
+        from PokeFacts import DataPulls
+    except ImportError:
+        import DataPulls
+
+    scriptpath = os.path.dirname(os.path.abspath(DataPulls.__file__))
+
+    start = time.time()
+    snapshot_file = DataPulls.buildSnapshot(scriptpath)
+    if snapshot_file is None:
+        print("Snapshots are disabled (Config.DATA_SNAPSHOT_FILE is not set)")
+        sys.exit(1)
+    print("Built %s in %.2fs" % (snapshot_file, time.time() - start))
+
+    start = time.time()
+    DataPulls.loadStore(scriptpath)
+    print("Loaded snapshot in %.1fms" % ((time.time() - start) * 1000))
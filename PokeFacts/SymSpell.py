@@ -56,11 +56,270 @@ From the original SymSpell documentation:
 This modification of the Python2 port ports the program to Python3 and modifies
 the program into a class such that we can initialize multiple SymSpell dictionaries.
 
+The `SymSpell` class is a rewrite of that port (which is kept as `LegacySymSpell`
+as the reference implementation for tests and benchmarks):
+  - delete candidates are generated with sets and a deque instead of list scans
+    and list slicing
+  - dictionary words and deletes are kept in separate dicts, a delete maps to
+    its single word directly instead of to a list
+  - deletes can be generated from a prefix of the words only (`prefix_length`,
+    as in SymSpell v6), which caps the dictionary size for long words
+  - the Damerau-Levenshtein distance is bounded, it stops as soon as the
+    distance is known to be above the best suggestion found so far
+It returns the same suggestions as `LegacySymSpell`, ties between suggestions of
+the same edit distance and frequency are broken in the order the original
+breadth-first search would have found them.
+
 '''
 
-import re
+from collections import deque
 
 class SymSpell(object):
+    def __init__(self, max_edit_distance=3, prefix_length=None, verbose=0):
+        if prefix_length is not None and prefix_length <= max_edit_distance:
+            raise ValueError("prefix_length must be greater than max_edit_distance")
+
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.verbose = verbose
+        # 0: top suggestion
+        # 1: all suggestions of smallest edit distance
+        # 2: all suggestions <= max_edit_distance (slower, no early termination)
+
+        self.words = {}     # word -> frequency of word in corpus
+        self.word_ids = {}  # word -> order in which the word was first added
+        self.deletes = {}   # delete (of the word prefix) -> the word, or a tuple of
+                            # words if there are several (most deletes have one word)
+        self.longest_word_length = 0
+
+    def get_deletes_list(self, w):
+        '''given a word, derive strings with up to max_edit_distance characters
+           deleted'''
+        deletes = set()
+        queue = [w]
+        for d in range(self.max_edit_distance):
+            temp_queue = []
+            for word in queue:
+                if len(word)>1:
+                    for c in range(len(word)):  # character index
+                        word_minus_c = word[:c] + word[c+1:]
+                        if word_minus_c not in deletes:
+                            deletes.add(word_minus_c)
+                            temp_queue.append(word_minus_c)
+            queue = temp_queue
+
+        return deletes
+
+    def create_dictionary_entry(self, w):
+        '''add word and its derived deletions to dictionary'''
+        if w in self.words:
+            # increment count of word in corpus
+            self.words[w] += 1
+            return False
+
+        self.words[w] = 1
+        self.word_ids[w] = len(self.word_ids)
+        self.longest_word_length = max(self.longest_word_length, len(w))
+
+        prefix = w if self.prefix_length is None else w[:self.prefix_length]
+        for item in self.get_deletes_list(prefix) | {prefix}:
+            if not item in self.deletes:
+                self.deletes[item] = w
+            elif type(self.deletes[item]) is str:
+                self.deletes[item] = (self.deletes[item], w)
+            else:
+                self.deletes[item] += (w,)
+
+        return True
+
+    def dameraulevenshtein(self, seq1, seq2, max_distance=None):
+        """Calculate the Damerau-Levenshtein (optimal string alignment) distance
+        between sequences, as LegacySymSpell.dameraulevenshtein does.
+
+        If `max_distance` is given, stops as soon as the distance is known to
+        be greater than `max_distance` and returns `max_distance + 1`.
+
+        >>> SymSpell().dameraulevenshtein('ba', 'abc')
+        2
+        >>> SymSpell().dameraulevenshtein('fee', 'deed')
+        2
+        >>> SymSpell().dameraulevenshtein('charizard', 'venusaur', 2)
+        3
+        """
+        if max_distance is None:
+            max_distance = max(len(seq1), len(seq2))
+
+        # common prefixes and suffixes don't change the distance
+        start = 0
+        end1, end2 = len(seq1), len(seq2)
+        while start < end1 and start < end2 and seq1[start] == seq2[start]:
+            start += 1
+        while end1 > start and end2 > start and seq1[end1 - 1] == seq2[end2 - 1]:
+            end1 -= 1
+            end2 -= 1
+        seq1, seq2 = seq1[start:end1], seq2[start:end2]
+
+        if abs(len(seq1) - len(seq2)) > max_distance:
+            return max_distance + 1
+        if not seq1 or not seq2:
+            return max(len(seq1), len(seq2))
+
+        # only the current and two previous rows are needed at once, and only
+        # the cells at most max_distance away from the diagonal: anything
+        # outside of that band is already more than max_distance
+        len1, len2 = len(seq1), len(seq2)
+        over = max_distance + 1
+        twoago = None
+        oneago = list(range(len2 + 1))
+        for x in range(1, len1 + 1):
+            char1 = seq1[x - 1]
+            lo = max(1, x - max_distance)
+            hi = min(len2, x + max_distance)
+
+            thisrow = [over] * (len2 + 1)
+            thisrow[0] = x
+            row_min = x if lo == 1 else over
+            for y in range(lo, hi + 1):
+                char2 = seq2[y - 1]
+                cost = oneago[y - 1] + (char1 != char2)
+                if oneago[y] + 1 < cost:
+                    cost = oneago[y] + 1
+                if thisrow[y - 1] + 1 < cost:
+                    cost = thisrow[y - 1] + 1
+                # This block deals with transpositions
+                if (x > 1 and y > 1 and char1 == seq2[y - 2]
+                    and seq1[x - 2] == char2 and char1 != char2
+                    and twoago[y - 2] + 1 < cost):
+                    cost = twoago[y - 2] + 1
+                thisrow[y] = cost
+                if cost < row_min:
+                    row_min = cost
+
+            # every later row is at least the minimum of this one
+            if row_min > max_distance:
+                return over
+            twoago, oneago = oneago, thisrow
+        return min(oneago[len2], over)
+
+    def get_suggestions(self, string):
+        '''return list of suggested corrections for potentially incorrectly
+           spelled word, as (correction, (frequency in corpus, edit distance))
+           sorted by ascending edit distance and descending frequency. With
+           verbose 0, only the top suggestion is returned'''
+        if (len(string) - self.longest_word_length) > self.max_edit_distance:
+            return []
+
+        if string in self.words:
+            outlist = [(string, (self.words[string], 0))]
+        else:
+            outlist = self.lookup(string)
+
+        if self.verbose == 0:
+            return outlist[0] if outlist else []
+        return outlist
+
+    def lookup(self, string):
+        max_distance = self.max_edit_distance
+        best_distance = max_distance
+        suggestions = {} # word -> edit distance
+        checked = set()
+
+        prefix = string if self.prefix_length is None else string[:self.prefix_length]
+        queue = deque([prefix])
+        queued = {prefix}
+
+        while queue:
+            q_item = queue.popleft()
+            q_distance = len(prefix) - len(q_item)
+
+            # candidates found from here on are at least q_distance away
+            if self.verbose < 2 and suggestions and q_distance > best_distance:
+                break
+
+            suggested = self.deletes.get(q_item, ())
+            if type(suggested) is str:
+                suggested = (suggested,)
+
+            for sc_item in suggested:
+                if sc_item in checked:
+                    continue
+                checked.add(sc_item)
+
+                if abs(len(sc_item) - len(string)) > best_distance:
+                    continue
+                item_dist = self.dameraulevenshtein(sc_item, string, best_distance)
+                if item_dist > best_distance:
+                    continue
+
+                if self.verbose < 2 and item_dist < best_distance:
+                    best_distance = item_dist
+                    suggestions = {k: v for k, v in suggestions.items() if v <= best_distance}
+                suggestions[sc_item] = item_dist
+
+            if q_distance < max_distance and len(q_item) > 1 and (self.verbose == 2 or q_distance < best_distance):
+                for c in range(len(q_item)):
+                    word_minus_c = q_item[:c] + q_item[c+1:]
+                    if word_minus_c not in queued:
+                        queued.add(word_minus_c)
+                        queue.append(word_minus_c)
+
+        outlist = sorted(((word, (self.words[word], dist)) for word, dist in suggestions.items()),
+                         key=lambda item: (item[1][1], -item[1][0]))
+
+        # break ties of the top suggestion the same way LegacySymSpell does
+        ties = [item for item in outlist if item[1] == outlist[0][1]] if outlist else []
+        if len(ties) > 1:
+            order = self.discovery_order(string, [word for word, _ in ties])
+            ties.sort(key=lambda item: order[item[0]])
+            outlist[:len(ties)] = ties
+
+        return outlist
+
+    def discovery_order(self, string, words):
+        '''returns word -> sort key giving the order in which the breadth-first
+           search of LegacySymSpell.get_suggestions finds the given words'''
+        remaining = set(words)
+        order = {}
+
+        queue = deque([string])
+        queued = {string}
+        position = 0
+        while queue and remaining:
+            q_item = queue.popleft()
+
+            for word in remaining:
+                if word == q_item:
+                    order[word] = (position, 0, 0)
+                elif 0 < len(word) - len(q_item) <= self.max_edit_distance and is_subsequence(q_item, word):
+                    order[word] = (position, 1, self.word_ids[word])
+            remaining.difference_update(order)
+
+            if len(string) - len(q_item) < self.max_edit_distance and len(q_item) > 1:
+                for c in range(len(q_item)):
+                    word_minus_c = q_item[:c] + q_item[c+1:]
+                    if word_minus_c not in queued:
+                        queued.add(word_minus_c)
+                        queue.append(word_minus_c)
+            position += 1
+
+        for word in remaining:
+            order[word] = (position, 1, self.word_ids[word])
+        return order
+
+    def best_word(self, s):
+        suggestion = self.get_suggestions(s)
+        if not suggestion:
+            return None
+        if self.verbose == 0:
+            return suggestion[0]
+        return suggestion[0][0]
+
+def is_subsequence(a, b):
+    '''is `a` a subsequence of `b`?'''
+    it = iter(b)
+    return all(c in it for c in a)
+
+class LegacySymSpell(object):
     def __init__(self):
         self.max_edit_distance = 3
         self.verbose = 0
@@ -0,0 +1 @@
+# This file is intentionally left blank
\ No newline at end of file
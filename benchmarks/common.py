@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+# common.py
+# ~~~~~~~~~
+# helpers shared by the benchmark scripts. Benchmarks load the real
+# data files in PokeFacts/data and are run from the repository root:
+#   python -m benchmarks.<name>
+
+import os
+import time
+
+from PokeFacts import Cache
+from PokeFacts import DataPulls
+
+SCRIPTPATH = os.path.dirname(os.path.abspath(DataPulls.__file__))
+
+# loads the shipped data, with the result cache disabled
+# so that every search runs the full lookup
+def loadStore():
+    store = DataPulls.loadStore(SCRIPTPATH)
+    store.cache = Cache.LRUCache(0)
+    return store
+
+# returns the best (lowest) time per call in seconds of `func`
+# called once for each element of `args_list`
+def timePerCall(func, args_list, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(args_list), 1)
+
+def formatTime(seconds):
+    if seconds < 1e-3:
+        return "%.2fus" % (seconds * 1e6)
+    return "%.3fms" % (seconds * 1e3)
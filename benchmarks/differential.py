@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# differential.py
+# ~~~~~~~~~~~~~~~
+# Differential test of ItemStore.search against the exhaustive reference
+# resolver (tests/reference.py) on the shipped data: a sample of the
+# generated search corpus (see corpus.searchCorpus) is searched in each
+# type configuration of the search benchmark, and every query for which the
+# two find different items is reported with its cause. Run it before and
+# after a change to the search to see which results the change affects.
+#
+#   python -m benchmarks.differential --queries 2000
+#   python -m benchmarks.differential --output divergences.json
+#
+# The reference scores every term for every query (~20ms a query), so the
+# whole corpus takes a while. With --max-divergences the exit status is 1
+# if there are more divergences than that.
+
+import sys
+import json
+import time
+import random
+import argparse
+
+from collections import Counter
+
+from benchmarks import common
+from benchmarks import search
+from tests import corpus
+from tests import reference
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare ItemStore.search with the exhaustive reference")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated corpus and of the sample")
+    parser.add_argument('--nonmatches', type=int, default=500, help="number of non-matching queries")
+    parser.add_argument('--queries', type=int, default=2000,
+                        help="number of queries sampled from the corpus, 0 for all of them")
+    parser.add_argument('--output', help="write the divergences to this json file")
+    parser.add_argument('--max-divergences', type=int, help="fail if there are more divergences than this")
+    args = parser.parse_args(argv)
+
+    store = common.loadStore()
+    resolver = reference.ReferenceResolver(store)
+
+    queries = corpus.searchCorpus(store, seed=args.seed, nonmatches=args.nonmatches)
+    if args.queries and args.queries < len(queries):
+        queries = random.Random(args.seed).sample(queries, args.queries)
+    types = sorted(cluster.terms[0] for cluster in store.index.clusters.values())
+
+    start = time.perf_counter()
+    divergences = []
+    searched = Counter()
+    for configuration in search.CONFIGURATIONS:
+        for index, (kind, query, item) in enumerate(queries):
+            type = search.searchType(configuration, item, types, index)
+            for divergence in reference.compare(store, [(query, type)], resolver):
+                divergence['kind'] = kind
+                divergence['configuration'] = configuration
+                divergences.append(divergence)
+            searched[kind] += 1
+    seconds = time.perf_counter() - start
+
+    for divergence in divergences:
+        print("%-11s %-6s %-24r found %-36s expected %-36s %s" % (divergence['kind'],
+            divergence['configuration'], divergence['query'], divergence['found'],
+            divergence['expected'], divergence['cause']))
+
+    print("")
+    print("%d searches in %.1fs, %d divergences" % (sum(searched.values()), seconds, len(divergences)))
+    by_kind = Counter(divergence['kind'] for divergence in divergences)
+    for kind in sorted(searched):
+        print("  %-22s %5d / %d" % (kind, by_kind[kind], searched[kind]))
+    for cause, count in Counter(divergence['cause'] for divergence in divergences).most_common():
+        print("  %-22s %5d" % (cause, count))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(divergences, output_file, indent=2, sort_keys=True)
+
+    if args.max_divergences is not None and len(divergences) > args.max_divergences:
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
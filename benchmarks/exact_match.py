@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+# exact_match.py
+# ~~~~~~~~~~~~~~
+# Compares the latency of exact hits (served by the ItemStore.exact
+# index) with a plain dict lookup and with the fuzzy correction path
+# that exact hits used to go through.
+#
+#   python -m benchmarks.exact_match
+
+from benchmarks import common
+
+# typo(term) - `term` with a letter dropped from the middle, so the typo
+# isn't a prefix that ClusterSearchHelper.findPrefix would resolve
+def typo(term):
+    middle = len(term) // 2
+    if term[middle] == ' ':
+        middle += 1
+    return term[:middle] + term[middle + 1:]
+
+def main():
+    store = common.loadStore()
+
+    terms = sorted(store.exact)
+    typos = [typo(term) for term in terms if len(term) > 4]
+    typos = [term for term in typos if term not in store.exact]
+    clusters = list(store.index.clusters.values())
+
+    results = [
+        ("dict lookup", common.timePerCall(store.exact.get, [(term,) for term in terms])),
+        ("exact hit, ItemStore.search", common.timePerCall(store.search, [(term,) for term in terms])),
+        ("fuzzy, ItemStore.search", common.timePerCall(store.search, [(term,) for term in typos], repeat=1)),
+        ("fuzzy, TermHolder.termcorrection (all clusters)", common.timePerCall(
+            lambda term: [cluster.termholder.termcorrection(term) for cluster in clusters],
+            [(term,) for term in typos], repeat=1)),
+    ]
+
+    print("%d exact terms, %d typos" % (len(terms), len(typos)))
+    for name, seconds in results:
+        print("%-50s %12s / call" % (name, common.formatTime(seconds)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# memory.py
+# ~~~~~~~~~
+# Reports the memory used by the search index built from the shipped
+# data, both when built from the json files and when loaded from a
+# snapshot (which is how a running bot gets it), and the share of each
+# part of the index (ItemStore.memoryReport). Run it after a data update
+# to see what the update costs before deploying it.
+#
+#   python -m benchmarks.memory
+
+import gc
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks import common
+from PokeFacts import DataPulls
+from PokeFacts import Snapshot
+
+# resident set size of this process in bytes, None if unknown
+def residentSize():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return None
+
+# traced = bytes allocated by `func()` that are still alive afterwards
+def measure(func):
+    gc.collect()
+    rss_before = residentSize()
+    tracemalloc.start()
+    try:
+        result = func()
+        gc.collect()
+        traced, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rss_after = residentSize()
+    rss = None if rss_before is None else rss_after - rss_before
+    return result, traced, peak, rss
+
+def formatSize(size):
+    if size is None:
+        return "n/a"
+    return "%.1fMB" % (size / 1024.0 / 1024.0)
+
+def main():
+    store, traced, peak, rss = measure(lambda: DataPulls.buildStore(common.SCRIPTPATH))
+
+    clusters = list(store.index.clusters.values())
+    items = set(id(item) for cluster in clusters for item in cluster.items.values())
+    word_lists = sum(len(types) for types in store.words.values())
+
+    print("%d items, %d words, %d word -> terms lists" % (len(items), len(store.words), word_lists))
+    print("%-24s %10s %10s %10s" % ("", "traced", "peak", "rss"))
+    print("%-24s %10s %10s %10s" % ("built from source", formatSize(traced), formatSize(peak), formatSize(rss)))
+
+    report = store.memoryReport()
+    print("")
+    for type, parts in sorted(report['clusters'].items(), key=lambda part: str(part[0])):
+        for name, size in sorted(parts.items()):
+            print("  %-22s %10s" % ("%s %s" % (type, name), formatSize(size)))
+    for name in ('spelling', 'index', 'payloads', 'caches', 'total'):
+        print("  %-22s %10s" % (name, formatSize(report[name])))
+    print("")
+
+    snapshot_dir = tempfile.mkdtemp()
+    snapshot_file = os.path.join(snapshot_dir, 'store.snapshot')
+    key = b'\0' * 32
+    try:
+        Snapshot.save(snapshot_file, key, store)
+        del store
+        gc.collect()
+
+        loaded, traced, peak, rss = measure(lambda: Snapshot.load(snapshot_file, key))
+        print("%-24s %10s %10s %10s" % ("loaded from snapshot", formatSize(traced), formatSize(peak), formatSize(rss)))
+        print("%-24s %10s" % ("snapshot file", formatSize(os.path.getsize(snapshot_file))))
+    finally:
+        os.remove(snapshot_file)
+        os.rmdir(snapshot_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+# replay.py
+# ~~~~~~~~~
+# Replays recorded comments, submissions and messages through
+# CallResponse.process, with a FakeReddit (tests/fakes.py) standing in for
+# praw, so that the whole bot (get_calls, DataPulls, Responder, the done
+# queue and, with --pipeline, the reply workers) can be load-tested without
+# reddit:
+#
+#   python -m benchmarks.replay                          # benchmarks/replay.jsonl
+#   python -m benchmarks.replay recorded.jsonl --repeat 20
+#   python -m benchmarks.replay --output baseline.json
+#   python -m benchmarks.replay --baseline baseline.json --threshold 0.2
+#   python -m benchmarks.replay --pipeline --latency 0.2   # replies take 200ms
+#
+# The input has a json object per line:
+#   kind        "comment", "submission" or "message"
+#   id          the id of the thing, a thing with the id of a previous thing
+#               is an edit of it
+#   body        the body of the comment or message, selftext of the submission
+#   author      (optional) "someone" by default, null for a deleted author
+#   subreddit   (optional) "pokemon" by default
+#   title, subject, is_self (optional) of submissions and messages
+# Each of the --repeat passes over the file uses new ids, the caches of the
+# store are only cleared before the first one.
+#
+# Reports the throughput, the latency percentiles of `process` (and with
+# the pipeline, from a thing being fed until its reply is sent), the number
+# of replies and edits, and the functions with the most CPU time in a
+# second, profiled pass (cProfile, the main thread only). The comparison
+# with a baseline fails if the throughput or a latency percentile regresses
+# by more than the threshold, or if the bot replied differently.
+
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import argparse
+
+from benchmarks import common
+from benchmarks.search import percentile, peakMemory
+from PokeFacts import Config
+from PokeFacts import DataPulls
+from PokeFacts import DoneQueue
+from PokeFacts import RedditBot
+from tests import fakes
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replay.jsonl')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class SilentLogger():
+    def __getattr__(self, name):
+        return lambda message: None
+
+def loadRecords(path):
+    with open(path, encoding='utf-8') as records_file:
+        return [json.loads(line) for line in records_file if line.strip()]
+
+# overrides(values) - sets the Config values, returns the previous ones for `restore`
+def overrides(values):
+    previous = dict((name, getattr(Config, name)) for name in values)
+    for name, value in values.items():
+        setattr(Config, name, value)
+    return previous
+
+def restore(previous):
+    for name, value in previous.items():
+        setattr(Config, name, value)
+
+# replayPass(store, records, ...) - feeds the records `repeat` times to a new bot,
+# returns (the fake reddit, latencies of `process` in seconds, seconds in total)
+def replayPass(store, records, repeat=1, pipeline=False, latency=0.0, workers=None, profile=None):
+    store.cache.clear()
+    store.corrections.clear()
+
+    previous = overrides({
+        'PIPELINE_ENABLED':         pipeline,
+        'PIPELINE_REPLY_WORKERS':   workers or Config.PIPELINE_REPLY_WORKERS,
+        'PIPELINE_REPLY_RATE':      1e9,
+        'PIPELINE_REPLY_BURST':     1e9,
+    })
+    try:
+        reddit = fakes.FakeReddit(latency)
+        main = RedditBot.CallResponse(reddit=reddit, data=DataPulls.DataPulls(store=store), done=DoneQueue.DoneQueue())
+        main.logger = SilentLogger()
+    finally:
+        restore(previous)
+
+    latencies = []
+    if profile is not None:
+        profile.enable()
+    started = time.perf_counter()
+    for repetition in range(repeat):
+        suffix = '_%d' % repetition if repetition else ''
+        for record in records:
+            thing = reddit.feed(record, suffix)
+            start = time.perf_counter()
+            main.process(thing, ignore_break = record['kind'] == 'message')
+            latencies.append(time.perf_counter() - start)
+    if main.pipeline is not None:
+        main.pipeline.drain()
+    seconds = time.perf_counter() - started
+    if profile is not None:
+        profile.disable()
+    if main.pipeline is not None:
+        main.pipeline.close()
+
+    return reddit, latencies, seconds
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return None
+    return {
+        'p50_ms':   round(percentile(latencies, 0.50) * 1e3, 4),
+        'p95_ms':   round(percentile(latencies, 0.95) * 1e3, 4),
+        'p99_ms':   round(percentile(latencies, 0.99) * 1e3, 4),
+        'max_ms':   round(latencies[-1] * 1e3, 4),
+    }
+
+# the `count` functions with the most time of their own in the profile
+def hotspots(profile, count):
+    stats = pstats.Stats(profile).stats
+    functions = sorted(stats.items(), key=lambda function: -function[1][2])[:count]
+
+    result = []
+    for (file, line, name), (primitive_calls, calls, own_time, total_time, callers) in functions:
+        if file.startswith(ROOT):
+            file = os.path.relpath(file, ROOT)
+        result.append({
+            'function':     '%s:%d(%s)' % (file, line, name),
+            'calls':        calls,
+            'own_ms':       round(own_time * 1e3, 2),
+            'total_ms':     round(total_time * 1e3, 2),
+        })
+    return result
+
+def run(path=SAMPLE, repeat=5, pipeline=False, latency=0.0, workers=None, profile=15):
+    records = loadRecords(path)
+
+    start = time.perf_counter()
+    store = DataPulls.loadStore(common.SCRIPTPATH)
+    load_time = time.perf_counter() - start
+
+    reddit, latencies, seconds = replayPass(store, records, repeat, pipeline, latency, workers)
+
+    report = {
+        'input':            os.path.basename(path),
+        'things':           len(latencies),
+        'repeat':           repeat,
+        'pipeline':         pipeline,
+        'latency':          latency,
+        'load_seconds':     round(load_time, 3),
+        'seconds':          round(seconds, 3),
+        'throughput':       round(len(latencies) / seconds, 1) if seconds else 0.0,
+        'process':          summarize(latencies),
+        'reply':            summarize(reddit.latencies),
+        'replies':          reddit.counts['replies'],
+        'edits':            reddit.counts['edits'],
+        'peak_memory_mb':   None if peakMemory() is None else round(peakMemory(), 1),
+        'hotspots':         [],
+    }
+
+    if profile:
+        profiler = cProfile.Profile()
+        replayPass(store, records, 1, False, latency, workers, profiler)
+        report['hotspots'] = hotspots(profiler, profile)
+
+    return report
+
+# compare(report, baseline, threshold, min_delta_ms) - the list of
+# regressions of `report` against `baseline`, as printable strings
+def compare(report, baseline, threshold, min_delta_ms=0.05):
+    regressions = []
+
+    if report['throughput'] < baseline['throughput'] * (1 - threshold):
+        regressions.append('throughput: %.1f < %.1f' % (report['throughput'], baseline['throughput']))
+
+    for stage in ('process', 'reply'):
+        result, base = report.get(stage), baseline.get(stage)
+        if result is None or base is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if result[metric] > base[metric] * (1 + threshold) and result[metric] - base[metric] >= min_delta_ms:
+                regressions.append('%s %s: %.4f > %.4f' % (stage, metric, result[metric], base[metric]))
+
+    # the same input must get the same answers
+    for count in ('replies', 'edits'):
+        if report[count] != baseline[count]:
+            regressions.append('%s: %d != %d' % (count, report[count], baseline[count]))
+
+    return regressions
+
+def printReport(report):
+    print("%d things (%s x %d)%s, store loaded in %.2fs, peak memory %sMB" % (
+        report['things'], report['input'], report['repeat'], ', pipeline' if report['pipeline'] else '',
+        report['load_seconds'], report['peak_memory_mb']))
+    print("%.3fs, %.1f things/s, %d replies, %d edits" % (
+        report['seconds'], report['throughput'], report['replies'], report['edits']))
+
+    print("%-10s %9s %9s %9s %9s" % ("", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    for stage in ('process', 'reply'):
+        if report[stage] is not None:
+            print("%-10s %9.4f %9.4f %9.4f %9.4f" % ((stage,) + tuple(report[stage][metric]
+                for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'))))
+
+    if report['hotspots']:
+        print("\n%9s %10s %10s  %s" % ("calls", "own ms", "total ms", "function"))
+        for function in report['hotspots']:
+            print("%9d %10.2f %10.2f  %s" % (function['calls'], function['own_ms'], function['total_ms'], function['function']))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded things through the bot, without reddit")
+    parser.add_argument('input', nargs='?', default=SAMPLE, help="JSONL file of things to replay")
+    parser.add_argument('--repeat', type=int, default=5, help="number of passes over the file")
+    parser.add_argument('--pipeline', action='store_true', help="resolve and reply on the pipeline threads")
+    parser.add_argument('--workers', type=int, help="number of reply workers of the pipeline")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds a reply or an edit takes")
+    parser.add_argument('--profile', type=int, default=15, help="number of hotspots to report (0 to not profile)")
+    parser.add_argument('--output', help="write the report to this json file")
+    parser.add_argument('--baseline', help="compare the report against this json file")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed relative regression of throughput and latency")
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help="latency increases smaller than this are never regressions")
+    args = parser.parse_args(argv)
+
+    report = run(args.input, args.repeat, args.pipeline, args.latency, args.workers, args.profile)
+    printReport(report)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if (baseline.get('input'), baseline.get('things')) != (report['input'], report['things']):
+            print("warning: the baseline was run on a different input")
+
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+        print("no regressions against " + args.baseline)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
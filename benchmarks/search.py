@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+# search.py
+# ~~~~~~~~~
+# Benchmark of ItemStore.search on the shipped data, with a reproducible
+# corpus of exact names, 1-3 edit typos, run-together names and non-matches
+# (see corpus.searchCorpus). Every query is searched in each type
+# configuration:
+#   all     - type=True
+#   type    - the expected item's type
+#   types   - a list of the expected item's type and another type
+#
+# The corpus is searched --repeat times with the spelling correction memo
+# cleared in between, the best time of each search is kept to reduce noise.
+# Reports latency percentiles, throughput and accuracy per kind of query and
+# configuration, and the peak memory of the process. Results can be written
+# to a json file and compared against a baseline written the same way:
+#
+#   python -m benchmarks.search --output baseline.json
+#   python -m benchmarks.search --baseline baseline.json --threshold 0.2
+#
+# The comparison fails (exit status 1) if a latency percentile (by at least
+# --min-delta-ms) or the peak memory grows, or the throughput drops, by more
+# than the threshold, or if an accuracy drops by more than
+# --accuracy-threshold (absolute).
+
+import sys
+import json
+import time
+import argparse
+
+from benchmarks import common
+from tests import corpus
+
+try:
+    import resource
+except ImportError:
+    resource = None # not available on Windows
+
+CONFIGURATIONS = ('all', 'type', 'types')
+
+# peak resident set size of this process in MB, None if unknown
+def peakMemory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024.0 / (1024.0 if sys.platform == 'darwin' else 1.0)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+# the `type` argument of the search for the given configuration
+def searchType(configuration, item, types, index):
+    if configuration == 'all':
+        return True
+
+    own_type = item.type if item is not None else types[index % len(types)]
+    if configuration == 'type':
+        return own_type
+    return [own_type, types[(types.index(own_type) + 1) % len(types)]]
+
+# correct if the expected term is found (in any type, several types may have
+# the same term), or nothing is found when nothing is expected
+def isCorrect(result, item):
+    if item is None:
+        return result.isEmpty()
+    return not result.isEmpty() and result.term == item.term
+
+def summarize(latencies, correct):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'count':        len(latencies),
+        'accuracy':     round(correct / float(len(latencies)), 4) if latencies else 0.0,
+        'p50_ms':       round(percentile(latencies, 0.50) * 1e3, 4),
+        'p95_ms':       round(percentile(latencies, 0.95) * 1e3, 4),
+        'p99_ms':       round(percentile(latencies, 0.99) * 1e3, 4),
+        'throughput':   round(len(latencies) / total, 1) if total else 0.0,
+    }
+
+def run(seed=0, nonmatches=500, repeat=3):
+    start = time.perf_counter()
+    store = common.loadStore()
+    load_time = time.perf_counter() - start
+
+    queries = corpus.searchCorpus(store, seed=seed, nonmatches=nonmatches)
+    types = sorted(cluster.terms[0] for cluster in store.index.clusters.values())
+
+    best = {} # (configuration, query index) -> best latency
+    correctness = {} # (configuration, query index) -> whether the result is correct
+    for _ in range(repeat):
+        store.corrections.clear()
+        for configuration in CONFIGURATIONS:
+            for index, (kind, query, item) in enumerate(queries):
+                type = searchType(configuration, item, types, index)
+
+                start = time.perf_counter()
+                result = store.search(query, type)
+                latency = time.perf_counter() - start
+
+                key = (configuration, index)
+                best[key] = min(latency, best.get(key, latency))
+                correctness[key] = isCorrect(result, item)
+
+    samples = {} # (kind, configuration) -> (latencies, correct)
+    for (configuration, index), latency in best.items():
+        latencies, correct = samples.setdefault((queries[index][0], configuration), ([], [0]))
+        latencies.append(latency)
+        correct[0] += correctness[(configuration, index)]
+
+    results = {}
+    for (kind, configuration), (latencies, correct) in sorted(samples.items()):
+        results['%s/%s' % (kind, configuration)] = summarize(latencies, correct[0])
+
+    all_latencies = [latency for latencies, correct in samples.values() for latency in latencies]
+    results['overall'] = summarize(all_latencies, sum(correct[0] for latencies, correct in samples.values()))
+
+    return {
+        'seed':             seed,
+        'queries':          len(queries),
+        'load_seconds':     round(load_time, 3),
+        'peak_memory_mb':   None if peakMemory() is None else round(peakMemory(), 1),
+        'results':          results,
+    }
+
+# compare(report, baseline, threshold, accuracy_threshold) - the list of
+# regressions of `report` against `baseline`, as printable strings
+def compare(report, baseline, threshold, accuracy_threshold, min_delta_ms=0.01):
+    regressions = []
+
+    for name, result in sorted(report['results'].items()):
+        if not name in baseline['results']:
+            continue
+        base = baseline['results'][name]
+
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if result[metric] > base[metric] * (1 + threshold) and result[metric] - base[metric] >= min_delta_ms:
+                regressions.append('%s %s: %.4f > %.4f' % (name, metric, result[metric], base[metric]))
+        if result['throughput'] < base['throughput'] * (1 - threshold):
+            regressions.append('%s throughput: %.1f < %.1f' % (name, result['throughput'], base['throughput']))
+        if result['accuracy'] < base['accuracy'] - accuracy_threshold:
+            regressions.append('%s accuracy: %.4f < %.4f' % (name, result['accuracy'], base['accuracy']))
+
+    if report['peak_memory_mb'] is not None and baseline.get('peak_memory_mb') is not None:
+        if report['peak_memory_mb'] > baseline['peak_memory_mb'] * (1 + threshold):
+            regressions.append('peak memory: %.1fMB > %.1fMB' % (report['peak_memory_mb'], baseline['peak_memory_mb']))
+
+    return regressions
+
+def printReport(report):
+    print("%d queries x %d configurations, store loaded in %.2fs, peak memory %sMB" % (
+        report['queries'], len(CONFIGURATIONS), report['load_seconds'], report['peak_memory_mb']))
+    print("%-24s %7s %9s %9s %9s %9s %11s" % ("", "count", "accuracy", "p50 ms", "p95 ms", "p99 ms", "searches/s"))
+    for name, result in sorted(report['results'].items(), key=lambda result: (result[0] == 'overall', result[0])):
+        print("%-24s %7d %9.4f %9.4f %9.4f %9.4f %11.1f" % (name, result['count'], result['accuracy'],
+            result['p50_ms'], result['p95_ms'], result['p99_ms'], result['throughput']))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ItemStore.search on the shipped data")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated corpus")
+    parser.add_argument('--nonmatches', type=int, default=500, help="number of non-matching queries")
+    parser.add_argument('--repeat', type=int, default=3, help="number of times the corpus is searched")
+    parser.add_argument('--output', help="write the results to this json file")
+    parser.add_argument('--baseline', help="compare the results against this json file")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed relative regression of latency, throughput and memory")
+    parser.add_argument('--accuracy-threshold', type=float, default=0.005,
+                        help="allowed absolute drop of accuracy")
+    parser.add_argument('--min-delta-ms', type=float, default=0.01,
+                        help="latency increases smaller than this are never regressions")
+    args = parser.parse_args(argv)
+
+    report = run(seed=args.seed, nonmatches=args.nonmatches, repeat=args.repeat)
+    printReport(report)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if baseline.get('seed') != report['seed'] or baseline.get('queries') != report['queries']:
+            print("warning: the baseline was run on a different corpus")
+
+        regressions = compare(report, baseline, args.threshold, args.accuracy_threshold, args.min_delta_ms)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+        print("no regressions against " + args.baseline)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+# similarity.py
+# ~~~~~~~~~~~~~
+# Compares the similarity scorers: time per ratio on candidate pairs
+# and time per ItemStore search on misspellings of the shipped terms.
+#
+#   python -m benchmarks.similarity
+
+from PokeFacts import Similarity
+from benchmarks import common
+from tests import corpus
+
+def main():
+    store = common.loadStore()
+
+    terms = sorted(store.exact)
+    typos = corpus.typos(terms, max_edits=2)
+
+    # every typo against the tokenized terms sharing its first word
+    pairs = []
+    for typo in typos[:2000]:
+        for cluster in store.index.clusters.values():
+            for term_id in cluster.termholder._wordToTermMap.get(typo.split()[0], []):
+                pairs.append((typo, store.terms[term_id].tokenized))
+
+    print("%d candidate pairs, %d searches" % (len(pairs), len(typos)))
+
+    # replacing the scorer clears the store's caches and corrections,
+    # so each scorer's searches start from an empty memo
+    times = {}
+    for name in sorted(Similarity.SCORERS):
+        store.scorer = Similarity.getScorer(name)
+        ratio_time = common.timePerCall(store.scorer.ratio, pairs)
+        search_time = common.timePerCall(store.searchUncached, [(typo,) for typo in typos], repeat=1)
+        times[name] = (ratio_time, search_time)
+        print("%-16s ratio %10s / pair   search %10s / call" % (
+            name, common.formatTime(ratio_time), common.formatTime(search_time)))
+
+    reference, fast = times['sequencematcher'], times['indel']
+    print("speedup: ratio %.1fx, search %.1fx" % (reference[0] / fast[0], reference[1] / fast[1]))
+
+if __name__ == '__main__':
+    main()
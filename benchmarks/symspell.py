@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# symspell.py
+# ~~~~~~~~~~~
+# Build-time and lookup-time benchmark of the SymSpell engines on the
+# vocabulary of the shipped data, also checks that every engine returns
+# the same best_word as LegacySymSpell.
+#
+#   python -m benchmarks.symspell
+
+import time
+
+from PokeFacts import SymSpell
+from benchmarks import common
+from tests import corpus
+
+# words in the order the store adds them to its spelling dictionary
+def vocabulary(store):
+    words = []
+    for cluster in store.index.clusters.values():
+        for term in cluster.items:
+            words += term.split()
+    return words
+
+def build(engine, words):
+    start = time.perf_counter()
+    for word in words:
+        engine.create_dictionary_entry(word)
+    return time.perf_counter() - start
+
+def main():
+    words = vocabulary(common.loadStore())
+    queries = corpus.typos(sorted(set(words)))
+    print("%d words (%d unique), %d queries" % (len(words), len(set(words)), len(queries)))
+
+    engines = [
+        ("LegacySymSpell", SymSpell.LegacySymSpell()),
+        ("SymSpell", SymSpell.SymSpell()),
+        ("SymSpell prefix_length=7", SymSpell.SymSpell(prefix_length=7)),
+    ]
+
+    expected = None
+    for name, engine in engines:
+        build_time = build(engine, words)
+        entries = len(engine.dictionary) if hasattr(engine, 'dictionary') else len(engine.deletes)
+
+        start = time.perf_counter()
+        results = [engine.best_word(query) for query in queries]
+        lookup_time = (time.perf_counter() - start) / len(queries)
+
+        if expected is None:
+            expected = results
+        mismatches = sum(1 for a, b in zip(expected, results) if a != b)
+
+        print("%-26s build %8.3fs  %7d entries  lookup %10s / call  %d mismatches" % (
+            name, build_time, entries, common.formatTime(lookup_time), mismatches))
+
+if __name__ == '__main__':
+    main()
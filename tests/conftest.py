@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import os, codecs, json, shutil
+import pytest
+from PokeFacts import Cache
+from PokeFacts import Config
+from PokeFacts import DataPulls
+from PokeFacts import RedditBot
+
+SCRIPTPATH = os.path.dirname(os.path.abspath(DataPulls.__file__))
+
+# the items of the test stores besides tests/test_data.json, with the
+# properties the Responder renders
+ITEMS = [{'term': 'pound', 'type': 'move', 'name': 'Pound', 'typing': 'Normal', 'pp': 35,
+          'category': 'physical', 'power': 40, 'accuracy': 100, 'description': 'Pounds the target.'},
+         {'term': 'leftovers', 'type': 'item', 'name': 'Leftovers', 'description': 'Restores HP.'},
+         {'term': 'rare candy', 'type': 'item', 'name': 'Rare Candy', 'description': 'Raises the level.'},
+         {'term': 'missingno', 'type': 'glitch'}]
+
+# createStore(items=[]) - a new store of tests/test_data.json, ITEMS and
+# `items`, without a result cache. A new one for each call, as the store
+# is built with the Config of the time
+@pytest.fixture
+def createStore():
+    def create(items=[]):
+        store = DataPulls.ItemStore({'term_property': 'term', 'type_property': 'type'}, cache_size=0)
+        with codecs.open('tests/test_data.json', "r", "utf-8") as data_file:
+            store.addItems(json.load(data_file))
+        store.addItems(ITEMS + items)
+        return store
+    return create
+
+# createCallResponse(reddit=False, done=None, store=None) - a bot on `store`,
+# a createStore() one by default
+@pytest.fixture
+def createCallResponse(createStore):
+    def create(reddit=False, done=None, store=None):
+        data = DataPulls.DataPulls(store=createStore() if store is None else store)
+        return RedditBot.CallResponse(reddit=reddit, data=data, done=done)
+    return create
+
+# the directory of a copy of the shipped data files and of their snapshot,
+# so that the tests don't write into PokeFacts/data
+@pytest.fixture(scope='session')
+def shippedData(tmp_path_factory):
+    scriptpath = tmp_path_factory.mktemp('shipped')
+    for file in Config.DATA_FILES + Config.DATA_SYNONYM_FILES:
+        path = scriptpath / file.lstrip('/')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(DataPulls.sourcePath(SCRIPTPATH, file), str(path))
+    DataPulls.buildSnapshot(str(scriptpath))
+    return str(scriptpath)
+
+# shippedStore - the store of the shipped data, without a result cache
+@pytest.fixture
+def shippedStore(shippedData):
+    store = DataPulls.loadStore(shippedData)
+    store.cache = Cache.LRUCache(0)
+    return store
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# corpus.py
+# ~~~~~~~~~
+# generates reproducible misspellings for the tests and the benchmarks
+
+import random
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+# misspell(word, edits, rnd) - applies `edits` random deletes, inserts,
+# replaces or transposes to `word`
+def misspell(word, edits, rnd):
+    chars = list(word)
+    for _ in range(edits):
+        i = rnd.randrange(len(chars))
+        op = rnd.randrange(4)
+        if op == 0 and len(chars) > 1:
+            del chars[i]
+        elif op == 1:
+            chars.insert(i, rnd.choice(LETTERS))
+        elif op == 2:
+            chars[i] = rnd.choice(LETTERS)
+        elif i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return ''.join(chars)
+
+# typos(words, max_edits=3, seed=0) - one misspelling of every word
+# for every number of edits from 1 to max_edits
+def typos(words, max_edits=3, seed=0):
+    rnd = random.Random(seed)
+    return [misspell(word, edits, rnd) for word in words for edits in range(1, max_edits + 1)]
+
+# searchCorpus(store, seed=0, nonmatches=500) - reproducible search queries
+# for the items of `store`, as a list of (kind, query, expected item):
+#   exact       - every term
+#   typo1..3    - every term with 1 to 3 edits
+#   runtogether - every multi-word term without its spaces, as is and with 1 edit
+#   nonmatch    - random letters that aren't a term, expected to find nothing
+def searchCorpus(store, seed=0, nonmatches=500):
+    rnd = random.Random(seed)
+
+    items = {}
+    for cluster in store.index.clusters.values():
+        for item in cluster.items.values():
+            items[(item.term, item.type)] = item
+    items = [items[key] for key in sorted(items, key=str)]
+
+    queries = []
+    for item in items:
+        queries.append(('exact', item.term, item))
+        for edits in range(1, 4):
+            queries.append(('typo%d' % edits, misspell(item.term, edits, rnd), item))
+        if ' ' in item.term:
+            queries.append(('runtogether', item.term.replace(' ', ''), item))
+            queries.append(('runtogether', misspell(item.term.replace(' ', ''), 1, rnd), item))
+
+    terms = set(item.term for item in items)
+    while nonmatches > 0:
+        query = ''.join(rnd.choice(LETTERS) for _ in range(rnd.randint(5, 12)))
+        if not query in terms:
+            queries.append(('nonmatch', query, None))
+            nonmatches -= 1
+
+    return queries
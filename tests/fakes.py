@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# fakes.py
+# ~~~~~~~~
+# a fake reddit standing in for praw.Reddit, for the tests and the replay
+# benchmark. Things are fed to it from records (see FakeReddit.feed), the
+# subreddit listings return them and the bot's replies and edits are kept
+# and counted. Sending a reply or an edit takes `latency` seconds and one
+# of the requests reddit allows (reddit.auth.limits).
+
+import time
+import threading
+
+import praw
+
+from PokeFacts import Config
+
+# fullname prefixes of the kinds of things
+PREFIXES = {'comment': 't1_', 'submission': 't3_', 'message': 't4_'}
+
+class FakeAuthor():
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+class FakeSubreddit():
+    def __init__(self, reddit):
+        self.reddit = reddit
+        self.mod    = self
+
+    def moderator(self):
+        return []
+
+    # the things of `kind`, newest first, newer than params['before'] if given
+    def listing(self, kind, limit, params):
+        things = [thing for thing in reversed(self.reddit.things) if thing.kind == kind]
+        if 'before' in params:
+            fullnames = [thing.fullname for thing in things]
+            things = things[:fullnames.index(params['before'])]
+        return things[:limit]
+
+    def comments(self, limit, params):
+        return self.listing('comment', limit, params)
+
+    def new(self, limit, params):
+        return self.listing('submission', limit, params)
+
+class FakeThing():
+    def __init__(self, reddit, kind, id):
+        self.reddit     = reddit
+        self.kind       = kind
+        self.id         = id
+        self.fullname   = PREFIXES[kind] + id
+        self.edited     = False
+        self.replies    = []
+
+    # update(record) - sets the text of the thing to that of the record
+    def update(self, record):
+        subreddit       = record.get('subreddit', 'pokemon')
+        author          = record.get('author', 'someone')
+
+        self.body       = record.get('body', '')
+        self.selftext   = self.body
+        self.title      = record.get('title', '')
+        self.subject    = record.get('subject', '')
+        self.is_self    = record.get('is_self', True)
+        self.author     = None if author is None else FakeAuthor(author)
+        self.subreddit  = praw.models.Subreddit(self.reddit, display_name=subreddit)
+        self.permalink  = '/r/%s/comments/%s/' % (subreddit, self.id)
+
+    def reply(self, body):
+        self.reddit.request()
+        return self.reddit.addReply(self, body)
+
+    def mark_read(self):
+        pass
+
+class FakeReply():
+    def __init__(self, reddit, parent, id, body):
+        self.reddit = reddit
+        self.parent = parent
+        self.id     = id
+        self.body   = body
+        self.mod    = self
+
+    def edit(self, body):
+        self.reddit.request()
+        self.body = body
+        self.reddit.sent(self.parent, 'edits')
+
+    def distinguish(self, sticky=False):
+        pass
+
+class FakeReddit():
+
+    def __init__(self, latency=0.0, remaining=1e9):
+        self.latency    = latency
+        self.things     = [] # the things fed, newest last
+        self.created    = {} # thing id -> creation time
+        self.replies    = {} # id -> FakeReply
+        self.fed        = {} # thing id -> time it was fed
+        self.counts     = {'replies': 0, 'edits': 0}
+        self.latencies  = [] # seconds from a thing being fed to its reply being sent
+        self.lock       = threading.Lock()
+        self.active     = 0
+        self.concurrent = 0  # the most requests sent at once
+        self.user       = self
+        self.auth       = self
+        self.inbox      = self
+        self.limits     = {'remaining': remaining, 'reset_timestamp': time.time() + 600, 'used': 0}
+
+    def me(self):
+        return Config.USERNAME
+
+    def subreddit(self, name):
+        return FakeSubreddit(self)
+
+    def comment(self, id):
+        return self.replies[id]
+
+    def unread(self, limit=None):
+        return []
+
+    def request(self):
+        with self.lock:
+            self.active += 1
+            self.concurrent = max(self.concurrent, self.active)
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+            self.limits['remaining'] -= 1
+
+    def addReply(self, parent, body):
+        with self.lock:
+            reply = FakeReply(self, parent, 'r%d' % len(self.replies), body)
+            self.replies[reply.id] = reply
+            parent.replies.append(reply)
+        self.sent(parent, 'replies')
+        return reply
+
+    def sent(self, thing, count):
+        with self.lock:
+            self.counts[count] += 1
+            self.latencies.append(time.perf_counter() - self.fed[thing.id])
+
+    # feed(record, suffix='') - the thing of the record, new or edited, its
+    # id suffixed with `suffix`. A new object each time, like praw's
+    def feed(self, record, suffix=''):
+        id = str(record['id']) + suffix
+        thing = FakeThing(self, record['kind'], id)
+        if id in self.created:
+            thing.edited = time.time() + 1
+        else:
+            self.created[id] = time.time()
+            self.things.append(thing)
+        thing.created_utc = self.created[id]
+        thing.update(record)
+        self.fed[id] = time.perf_counter()
+        return thing
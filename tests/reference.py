@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+# reference.py
+# ~~~~~~~~~~~~
+# An exhaustive reference for ItemStore.search, for differential testing
+# (see benchmarks/differential.py). It follows the same rules as the
+# search (ClusterSearchHelper.findItem): exact terms, unique prefixes,
+# spelling corrected words, then the most similar term of each cluster with
+# the same 90% / 80% thresholds. But nothing is looked up in an index:
+#  - a word is corrected by comparing it with every word of the spelling
+#    dictionary (the closest by Damerau-Levenshtein distance, then the most
+#    frequent) instead of going through the SymSpell deletes
+#  - a term is scored against every term of every cluster searched, instead
+#    of the terms using its least common word or sharing its trigrams
+#  - prefixes are matched against every term instead of a sorted list
+#  - exact terms are looked up in every cluster instead of the exact index
+# So where the two disagree, the search's candidate selection missed the
+# term the rules would have picked (or the reference's tie breaking differs).
+#
+# It scores every term for every query, use it to check the search,
+# not to answer queries. The store must not change after it's created.
+
+from PokeFacts import Config
+from PokeFacts import DataPulls
+from PokeFacts import Similarity
+
+class ReferenceResolver():
+
+    def __init__(self, store):
+        self.store      = store
+        self.scorer     = Similarity.getScorer(store.scorer.name)
+        self.words      = {} # id(cluster) -> words used by the terms of the cluster
+        self.tokens     = {} # id(cluster) -> [(term, tokenized term)] in the order they were added
+        self.suggestions = {} # word -> (best dictionary word or None, similarity)
+        self.corrections = {} # (id(cluster), word) -> wordCorrection(cluster, word)
+
+        for cluster in store.index.clusters.values():
+            self.words[id(cluster)] = set(word for term in cluster.items for word in term.split())
+            self.tokens[id(cluster)] = [(term, ''.join(sorted(term.split()))) for term in cluster.items]
+
+    # search(search_term, type=True) - the item ItemStore.search should find,
+    # `type` as in ItemStore.search
+    def search(self, search_term, type=True):
+        search_term = DataPulls.normalizeTerm(search_term)
+
+        item = self.findExact(search_term, type)
+        if item is not None:
+            return item
+
+        return self.findItem(self.clusters(type), search_term)
+
+    # the item whose term is exactly `search_term`, as ItemStore.findExact,
+    # but looking through the items of every cluster instead of its index
+    def findExact(self, search_term, type=True):
+        clusters = list(self.store.index.clusters.values())
+
+        if type == True:
+            for cluster in clusters:
+                if search_term in cluster.items:
+                    return cluster.items[search_term]
+            return None
+
+        for t in DataPulls.castArray(type):
+            for cluster in clusters:
+                if t in cluster.terms and search_term in cluster.items:
+                    return cluster.items[search_term]
+
+        return None
+
+    # the clusters searched for `type`, in the order they're searched
+    def clusters(self, type):
+        index = self.store.index
+        if type == True:
+            clusters = list(index.clusters.values())
+        elif isinstance(type, list):
+            clusters = [index.clusters[t] for t in type if t in index.clusters]
+        else:
+            clusters = [index.findCluster(type)]
+        return [cluster for cluster in clusters if not cluster.isFalse]
+
+    def findItem(self, clusters, search_term):
+        if not clusters:
+            return DataPulls.Item.newFalseItem()
+
+        # prefixes of terms made of known words aren't used, and the
+        # prefix item loses ties with the spelling correction
+        prefix_item = None
+        if not all(any(word in words for words in self.words.values()) for word in search_term.split()):
+            prefix_item = self.findPrefix(clusters, search_term)
+
+        term = DataPulls.TermEntry(search_term)
+        if len(clusters) == 1:
+            real_term, ratio = self.termCorrection(clusters[0], term, not self.knowsAnyWord(term))
+            source_cluster = clusters[0]
+        else:
+            real_term, source_cluster = self.findTerm(clusters, term)
+
+        if prefix_item is not None:
+            if real_term is None or self.scorer.ratio(search_term, real_term) < self.scorer.ratio(search_term, prefix_item.term):
+                return prefix_item
+
+        if real_term is None:
+            return DataPulls.Item.newFalseItem()
+
+        return source_cluster.items[real_term]
+
+    # the only item with a term starting with `prefix`, None if there are several or none
+    def findPrefix(self, clusters, prefix):
+        if len(prefix) < Config.DATA_PREFIX_MIN_LENGTH:
+            return None
+
+        items = {}
+        for cluster in clusters:
+            for term, item in cluster.items.items():
+                if term.startswith(prefix):
+                    items[id(item)] = item
+
+        if len(items) != 1:
+            return None
+        return list(items.values())[0]
+
+    # the cluster walk of ClusterSearchHelper.findTerm
+    def findTerm(self, clusters, term):
+        use_trigrams = not self.knowsAnyWord(term)
+
+        likely_ratio = 0
+        likely_term = None
+        likely_cluster = None
+
+        for cluster in clusters:
+            term_candidate, ratio_candidate = self.termCorrection(cluster, term, use_trigrams)
+
+            if ratio_candidate >= 0.9:
+                return term_candidate, cluster
+
+            if ratio_candidate <= 0.80:
+                continue
+
+            if ratio_candidate > likely_ratio:
+                likely_ratio    = ratio_candidate
+                likely_term     = term_candidate
+                likely_cluster  = cluster
+
+        return likely_term, likely_cluster
+
+    # termCorrection(cluster, term, use_trigrams=True) - (the term of `cluster`
+    # most similar to `term`, its ratio), as TermHolder.termcorrection, but
+    # scoring every term of the cluster
+    def termCorrection(self, cluster, term, use_trigrams=True):
+        if term.term in cluster.items:
+            return term.term, 1.00
+
+        words1, words2 = self.correctWords(cluster, term)
+
+        # the trigram fallback only accepts terms similar enough, sharing
+        # enough trigrams with the term
+        min_ratio = None
+        if not any(word in self.words[id(cluster)] for word in words1):
+            if not use_trigrams:
+                return None, 0.0
+            min_ratio = Config.DATA_TRIGRAM_MIN_RATIO
+
+        token1 = ''.join(sorted(words1))
+        token2 = ''.join(sorted(words2)) if min_ratio is None else token1
+        token_trigrams = DataPulls.trigrams(token1)
+
+        best_term = None
+        best_ratio = 0
+        for candidate, tokenized in self.tokens[id(cluster)]:
+            if min_ratio is not None:
+                candidate_trigrams = DataPulls.trigrams(tokenized)
+                common = len(token_trigrams & candidate_trigrams)
+                if 2.0 * common < Config.DATA_TRIGRAM_MIN_OVERLAP * (len(token_trigrams) + len(candidate_trigrams)):
+                    continue
+
+            # the scorers only return 0.0 for ratios below the cutoff, which
+            # couldn't replace the best term anyway
+            ratio = self.scorer.ratio(token1, tokenized, best_ratio)
+            if token2 != token1:
+                ratio = max(ratio, self.scorer.ratio(token2, tokenized, max(best_ratio, ratio)))
+
+            if ratio > best_ratio:
+                best_term = candidate
+                best_ratio = ratio
+
+        if best_term is None or (min_ratio is not None and best_ratio <= min_ratio):
+            return None, 0.0
+        return best_term, best_ratio
+
+    def knowsWord(self, cluster, term):
+        return any(word in self.words[id(cluster)] for word in self.correctWords(cluster, term)[0])
+
+    # whether any type of the store knows a word of `term`, trigrams are
+    # only used for the terms with no known word
+    def knowsAnyWord(self, term):
+        return any(self.knowsWord(cluster, term) for cluster in self.store.index.clusters.values()
+                   if not cluster.isFalse)
+
+    # the words of `term` corrected as TermHolder.correctwords does
+    def correctWords(self, cluster, term):
+        words1 = []
+        words2 = []
+        for word in term.words:
+            new_word, similarity = self.wordCorrection(cluster, word)
+
+            if new_word is None or similarity <= 0.7:
+                words1.append(word)
+            else:
+                words1.append(new_word)
+
+            if new_word is not None:
+                words2.append(new_word)
+
+        return words1, words2
+
+    # wordCorrection(cluster, word) - (most probable correction of `word`,
+    # its similarity to `word`), as TermHolder.wordcorrection
+    def wordCorrection(self, cluster, word):
+        key = (id(cluster), word)
+        if not key in self.corrections:
+            self.correctWord(word)
+        return self.corrections[key]
+
+    # correctWord(word) - corrects `word` for every cluster at once, so that
+    # without SymSpell the edits of `word` are only generated once
+    def correctWord(self, word):
+        edits1 = None
+        edits2 = None
+
+        for cluster in self.store.index.clusters.values():
+            holder = cluster.termholder
+            synonym = cluster.findSynonym(word)
+
+            if Config.DATA_USE_SYMSPELL:
+                best_word, similarity = self.spellingSuggestion(word)
+                if synonym is None:
+                    self.corrections[(id(cluster), word)] = (best_word, similarity)
+                    continue
+                candidates = [ best_word, synonym ]
+            else:
+                # the known words of the fewest edits,
+                # as in http://norvig.com/spell-correct.html
+                words = self.words[id(cluster)]
+                if word in words:
+                    candidates = set([word])
+                else:
+                    if edits1 is None:
+                        edits1 = DataPulls.TermHolder.edits1(word)
+                    candidates = words & edits1
+                    if not candidates:
+                        if edits2 is None:
+                            edits2 = set(DataPulls.TermHolder.edits2(word))
+                        candidates = (words & edits2) or set([word])
+
+                candidates = sorted(candidates)
+                if synonym is not None:
+                    candidates.append(synonym)
+
+            best_word = max(candidates, key=holder.P)
+            similarity = 0 if best_word is None else self.scorer.ratio(word, best_word)
+            self.corrections[(id(cluster), word)] = (best_word, similarity)
+
+    # spellingSuggestion(word) - (the dictionary word closest to `word`, its
+    # similarity to `word`), comparing `word` with every dictionary word
+    # ties of distance and frequency go to the word added first
+    def spellingSuggestion(self, word):
+        if not word in self.suggestions:
+            spelling = self.store.spelling
+
+            best_word = None
+            best_distance = spelling.max_edit_distance
+            best_count = 0
+            for dictionary_word, count in spelling.words.items():
+                if abs(len(dictionary_word) - len(word)) > best_distance:
+                    continue
+                distance = spelling.dameraulevenshtein(word, dictionary_word, best_distance)
+                if distance > best_distance:
+                    continue
+
+                if best_word is None or distance < best_distance or count > best_count:
+                    best_word = dictionary_word
+                    best_distance = distance
+                    best_count = count
+
+            similarity = 0 if best_word is None else self.scorer.ratio(word, best_word)
+            self.suggestions[word] = (best_word, similarity)
+        return self.suggestions[word]
+
+    # sameRank(cluster, word, a, b) - whether `a` and `b` are equally good
+    # corrections of `word`, so that either may be picked by a tie break
+    def sameRank(self, cluster, word, a, b):
+        if a is None or b is None:
+            return False
+
+        if Config.DATA_USE_SYMSPELL:
+            spelling = self.store.spelling
+            return spelling.dameraulevenshtein(word, a) == spelling.dameraulevenshtein(word, b) \
+                    and spelling.words.get(a) == spelling.words.get(b)
+        return cluster.termholder.P(a) == cluster.termholder.P(b)
+
+    # cause(search_term, type=True) - why the store's search can disagree
+    # with the reference for this query:
+    #   prefix      - the unique prefix items differ
+    #   spelling    - a word is corrected differently
+    #   tie         - a word is corrected to an equally good word (tie break)
+    #   candidates  - the words are corrected the same, so the store's
+    #                 candidates missed the most similar term
+    def cause(self, search_term, type=True):
+        search_term = DataPulls.normalizeTerm(search_term)
+        clusters = self.clusters(type)
+
+        if DataPulls.ClusterSearchHelper(clusters).findPrefix(search_term) is not \
+                self.findPrefix(clusters, search_term):
+            return 'prefix'
+
+        cause = 'candidates'
+        for cluster in clusters:
+            for word in search_term.split():
+                found = cluster.termholder.wordcorrection(word)[0]
+                expected = self.wordCorrection(cluster, word)[0]
+                if found != expected:
+                    if not self.sameRank(cluster, word, found, expected):
+                        return 'spelling'
+                    cause = 'tie'
+        return cause
+
+# compare(store, queries, reference=None) - the queries, as (search_term, type)
+# pairs, for which store.search and the reference find different items
+# returns a list of dicts with the query, its type, the (term, type) of the
+# item found and expected (or None) and the cause (see ReferenceResolver.cause)
+def compare(store, queries, reference=None):
+    if reference is None:
+        reference = ReferenceResolver(store)
+
+    divergences = []
+    for search_term, type in queries:
+        found = store.search(search_term, type)
+        expected = reference.search(search_term, type)
+        if found is expected or (found.isEmpty() and expected.isEmpty()):
+            continue
+
+        divergences.append({
+            'query':    search_term,
+            'type':     type,
+            'found':    None if found.isEmpty() else (found.term, found.type),
+            'expected': None if expected.isEmpty() else (expected.term, expected.type),
+            'cause':    reference.cause(search_term, type),
+        })
+
+    return divergences
@@ -1,7 +1,23 @@
 #!/usr/bin/env python3
 
-import codecs, json
+import gc, codecs, json, weakref, threading, tracemalloc
+from PokeFacts import Config
 from PokeFacts import DataPulls
+from PokeFacts import Payloads
+from PokeFacts import RedditBot
+from PokeFacts import Similarity
+
+# writes the test data as the first data file (and empty other
+# data files) under `scriptpath`, for DataPulls to load
+def writeTestData(scriptpath, test_data=None):
+    if test_data is None:
+        with codecs.open('tests/test_data.json', "r", "utf-8") as data_file:
+            test_data = data_file.read()
+
+    for file in Config.DATA_FILES + Config.DATA_SYNONYM_FILES:
+        path = scriptpath / file.lstrip('/')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(test_data if file == Config.DATA_FILES[0] else '[]' if file in Config.DATA_FILES else '{}')
 
 class TestDataPulls(object):
     def test_ItemStore(self):
@@ -20,4 +36,394 @@ class TestDataPulls(object):
         assert store.search("bulbasaur").get()['placeholder'] == 5
         assert store.search("bulbsaur").get('placeholder') == 5
         
-        assert store.search("foobar").isEmpty() == True
\ No newline at end of file
+        assert store.search("foobar").isEmpty() == True
+
+    def test_ItemStoreCache(self):
+        store = DataPulls.ItemStore({'term_property': 'term'}, cache_size=2)
+
+        with codecs.open('tests/test_data.json', "r", "utf-8") as data_file:
+            store.addItems(json.load(data_file))
+
+        first = store.search("charzard")
+        assert store.search("Charzard ") is first
+        assert store.cache.hits == 1 and store.cache.misses == 1
+
+        # misses are cached too
+        assert store.search("foobar").isEmpty() == True
+        assert store.search("foobar").isEmpty() == True
+        assert store.cache.hits == 2
+
+        # different search types are cached separately
+        store.search("charzard", type=None)
+        assert store.cache.evictions == 1
+        assert len(store.cache) == 2
+
+    def test_ExactMatch(self, monkeypatch):
+        store = DataPulls.ItemStore({'term_property': 'term', 'type_property': 'type'}, cache_size=0)
+        store.addItems([{'term': 'psychic',       'type': 'move',    'id': 1},
+                        {'term': 'psychic',       'type': 'type',    'id': 2},
+                        {'term': 'thunder',       'type': 'move',    'id': 3},
+                        {'term': 'thunder stone', 'type': 'item',    'id': 4},
+                        {'term': 'pikachu',       'type': 'pokemon', 'id': 5}])
+
+        assert store.findExact('psychic').get('id') == 1
+        assert store.findExact('psychic', 'type').get('id') == 2
+        assert store.findExact('psychic', ['pokemon', 'type', 'move']).get('id') == 2
+        assert store.findExact('psychic', 'item') is None
+        assert store.findExact('psychc') is None
+
+        # exact hits are returned without any fuzzy search
+        findItem = DataPulls.ClusterSearchHelper.findItem
+        def noFuzzySearch(*args):
+            raise AssertionError("fuzzy search for an exact term")
+        monkeypatch.setattr(DataPulls.ClusterSearchHelper, 'findItem', noFuzzySearch)
+        monkeypatch.setattr(DataPulls.ItemCluster, 'findItem', noFuzzySearch, raising=False)
+        assert store.search('psychic').get('id') == 1
+        assert store.search('psychic', 'type').get('id') == 2
+        assert store.search('thunder stone', ['move', 'item']).get('id') == 4
+        assert store.search('pikachu', 'pokemon').get('id') == 5
+
+        # misses fall through to the fuzzy search
+        fuzzy = []
+        monkeypatch.setattr(DataPulls.ClusterSearchHelper, 'findItem',
+                            lambda *args: fuzzy.append(args[1]) or findItem(*args))
+        assert store.search('thundr').get('id') == 3
+        assert store.search('thunder stone', ['move']).get('id') == 3
+        assert fuzzy[0] == 'thundr'
+
+    def test_CorrectionMemo(self):
+        store = DataPulls.ItemStore({'term_property': 'term'}, cache_size=0)
+        store.addItems([{'term': 'charizard', 'type': 'pokemon'},
+                        {'term': 'charcoal',  'type': 'item'},
+                        {'term': 'charm',     'type': 'move'}])
+
+        calls = []
+        best_word = store.spelling.best_word
+        store.spelling.best_word = lambda word: calls.append(word) or best_word(word)
+
+        # every type is searched, but each word is only corrected once
+        assert store.search("charzard").get()['term'] == 'charizard'
+        assert store.search("charcol").get()['term'] == 'charcoal'
+        assert calls == ['charzard', 'charcol']
+        assert store.search("charzard").get()['type'] == 'pokemon'
+        assert calls == ['charzard', 'charcol']
+
+        # adding items invalidates the memo
+        store.addItem({'term': 'charjabug', 'type': 'pokemon'})
+        assert len(store.corrections) == 0
+
+        # and so does replacing the scorer, which computed the similarities
+        store.search("charzard")
+        store.scorer = Similarity.IndelScorer()
+        assert len(store.corrections) == 0
+        store.search("charzard")
+        assert calls[-2:] == ['charzard', 'charzard']
+
+    def test_CrossTypeSearch(self):
+        store = DataPulls.ItemStore({'term_property': 'term'}, cache_size=0)
+        store.addItems([{'term': 'thunder',       'type': 'move'},
+                        {'term': 'thunder stone', 'type': 'item'},
+                        {'term': 'thunder punch', 'type': 'move'},
+                        {'term': 'thundurus',     'type': 'pokemon'},
+                        {'term': 'mega stone',    'type': 'item'},
+                        {'term': 'charizard mega','type': 'pokemon'}])
+
+        helper = DataPulls.ClusterSearchHelper(list(store.index.clusters.values()))
+        for term in ["thunder", "thundr", "thunder stone", "thundr ston", "tunder punch",
+                     "thundrus", "mega stone", "charzard mega", "mega", "foobar"]:
+            entry = DataPulls.TermEntry(term)
+            assert helper.findTerm(term) == helper.findTermEach(entry)
+
+        assert store.search("thundr ston").get()['type'] == 'item'
+        assert store.search("thundr ston", type=['move', 'pokemon']).isEmpty() == True
+        assert store.search("thundr", type=['item', 'move']).get()['term'] == 'thunder'
+
+    def test_TrigramFallback(self):
+        store = DataPulls.ItemStore({'term_property': 'term'}, cache_size=0)
+        store.addItems([{'term': 'tapu koko',     'type': 'pokemon'},
+                        {'term': 'garchomp mega', 'type': 'pokemon'},
+                        {'term': 'hooh',          'type': 'pokemon'},
+                        {'term': 'thunder punch', 'type': 'move'}])
+
+        # no word of these is known, or close enough to a known word
+        for search_term, term in [("kokotapu", 'tapu koko'), ("garchompmega", 'garchomp mega'),
+                                  ("ho oh", 'hooh'), ("punchthunder", 'thunder punch')]:
+            assert store.search(search_term).get()['term'] == term
+            assert store.search(search_term, type=['pokemon', 'move']).get()['term'] == term
+            assert store.index.findCluster(store.search(search_term).type).findItem(search_term).term == term
+
+        assert store.search("ho oh", type='move').isEmpty() == True
+        assert store.search("foobar").isEmpty() == True
+
+        helper = DataPulls.ClusterSearchHelper(list(store.index.clusters.values()))
+        for search_term in ["kokotapu", "garchompmega", "ho oh", "foobar"]:
+            assert helper.findTerm(search_term) == helper.findTermEach(DataPulls.TermEntry(search_term))
+
+    # terms of the types not searched aren't misspellings of the types
+    # searched: the trigram fallback doesn't turn them into another term
+    def test_TrigramOtherTypes(self):
+        store = DataPulls.ItemStore({'term_property': 'term'}, cache_size=0)
+        store.addItems([{'term': term, 'type': 'pokemon'} for term in
+                            ['gabite', 'aggron', 'absol', 'aegislash', 'cosmog']] +
+                       [{'term': term, 'type': 'move'} for term in
+                            ['bite', 'smog', 'rain dance', 'air slash', 'fairy lock', 'acupressure',
+                             'steel wing', 'oblivion wing']] +
+                       [{'term': term, 'type': 'ability'} for term in ['pressure', 'dancer', 'air lock']] +
+                       [{'term': term, 'type': 'item'} for term in ['aggronite', 'absolite', 'clever wing']])
+
+        for search_term, type in [("bite", 'pokemon'), ("aggronite", 'pokemon'), ("cosmog", 'move'),
+                                  ("dancer", 'move'), ("aegislash", 'move'), ("airlock", 'move'),
+                                  ("acupressure", 'ability'), ("acupressure", ['ability', 'item'])]:
+            assert store.search(search_term, type).isEmpty() == True, search_term
+
+        # known words go through the word candidates, ranked by the default scorer
+        assert store.search("clever wing", 'move').get()['term'] == 'oblivion wing'
+
+        # garbled terms are still recovered, at a ratio above the minimum only
+        assert store.search("gabitte", 'pokemon').get()['term'] == 'gabite'
+        termholder = store.index.findCluster('pokemon').termholder
+        assert termholder.trigramcorrection('aggronite', 'aggronite') == (None, 0.0)
+        assert store.scorer.ratio('aggronite', 'aggron') == 0.8
+
+    def test_PrefixSearch(self):
+        store = DataPulls.ItemStore({'term_property': 'term'}, cache_size=0)
+        store.addItems([{'term': 'crobat',        'type': 'pokemon'},
+                        {'term': 'croagunk',      'type': 'pokemon'},
+                        {'term': 'swords dance',  'type': 'move'},
+                        {'term': 'swift',         'type': 'move'},
+                        {'term': 'crown',         'type': 'item'}])
+
+        assert store.search("crob").get()['term'] == 'crobat'
+        assert store.search("Swords D").get()['term'] == 'swords dance'
+        assert store.search("swordsd").get()['term'] == 'swords dance'
+        assert store.index.clusters['pokemon'].findItem("croag").term == 'croagunk'
+        # unless the spelling correction is closer ("croa" is more like crobat)
+        assert store.index.clusters['pokemon'].findItem("croa").term == 'crobat'
+        # ambiguous prefixes are left to the spelling correction
+        assert DataPulls.ClusterSearchHelper(list(store.index.clusters.values())).findPrefix("cro") is None
+        assert DataPulls.ClusterSearchHelper(list(store.index.clusters.values())).findPrefix("crow") is not None
+        assert DataPulls.ClusterSearchHelper(store.index.clusters['pokemon']).findPrefix("crow") is None
+
+        assert [item.term for item in store.complete("cro")] == ['crown', 'crobat', 'croagunk']
+        assert [item.term for item in store.complete("CRO", k=1, type='pokemon')] == ['crobat']
+        assert [item.term for item in store.complete("sw", type=['move'])] == ['swift', 'swords dance']
+        assert store.complete("foo") == []
+
+    def test_PrefixOfWords(self):
+        store = DataPulls.ItemStore({'term_property': 'term'}, cache_size=0)
+        store.addItems([{'term': 'x attack',           'type': 'item'},
+                        {'term': 'attack order',       'type': 'move'},
+                        {'term': 'x defense',          'type': 'item'},
+                        {'term': 'defense curl',       'type': 'move'},
+                        {'term': 'me first',           'type': 'move'},
+                        {'term': 'first impression',   'type': 'move'},
+                        {'term': 'absol',              'type': 'pokemon'},
+                        {'term': 'absolite',           'type': 'item'},
+                        {'term': 'crobat',             'type': 'pokemon'}])
+
+        # known words aren't prefixes of longer terms
+        assert store.search("attack").get()['term'] == 'x attack'
+        assert store.search("defense").get()['term'] == 'x defense'
+        assert store.search("first").get()['term'] == 'me first'
+        # a closer spelling correction wins over the prefix
+        assert store.search("absoli").get()['term'] == 'absol'
+        assert store.search("absolit").get()['term'] == 'absolite'
+        assert store.search("crob").get()['term'] == 'crobat'
+
+    def test_TrieCandidates(self, monkeypatch):
+        monkeypatch.setattr(Config, 'DATA_USE_SYMSPELL', False)
+
+        store = DataPulls.ItemStore({'term_property': 'term'}, cache_size=0)
+        store.addItems([{'term': term} for term in
+                        ['abc', 'porygon 2', 'porygon z', 'charizard mega x', 'charmander', 'ab', 'xy']])
+        holder = store.index.clusters[None].termholder
+
+        # same candidates as the edits of http://norvig.com/spell-correct.html
+        for word in ['abc', 'ca', 'bac', 'acb', 'porygon', 'porygonn2', 'pory2gon', 'porygonz',
+                     'charzard', 'chamrander', 'carmander', 'x', 'yx', 'a2', 'foobar', '']:
+            assert holder.candidates(word) == holder.editcandidates(word)
+
+        assert store.search("charzard mega x").get()['term'] == 'charizard mega x'
+        assert store.search("chamrander").get()['term'] == 'charmander'
+
+    def test_MemoryReport(self):
+        store = DataPulls.ItemStore({'term_property': 'term'})
+        store.addItems([{'term': 'charizard', 'type': 'pokemon', 'dex': list(range(1000))},
+                        {'term': 'charcoal',  'type': 'item'}])
+
+        report = store.memoryReport()
+        assert sorted(report['clusters']) == ['item', 'pokemon']
+        # the item data is counted with its type
+        assert report['clusters']['pokemon']['items'] > report['clusters']['item']['items'] + 1000 * 8
+        assert report['spelling'] > 0 and report['index'] > 0
+        assert report['total'] == sum(sum(parts.values()) for parts in report['clusters'].values()) \
+                + report['spelling'] + report['index'] + report['payloads'] + report['caches']
+
+        for cluster in store.index.clusters.values():
+            assert cluster.termholder.getByteSize() > 0
+
+    def test_Snapshot(self, tmp_path, monkeypatch):
+        writeTestData(tmp_path)
+        saved = []
+        save = DataPulls.Snapshot.save
+        monkeypatch.setattr(DataPulls.Snapshot, 'save', lambda *args: saved.append(args[0]) or save(*args))
+
+        # built and written once, then loaded from the snapshot
+        for _ in range(2):
+            store = DataPulls.loadStore(str(tmp_path))
+            assert store.search("charzard").get()['placeholder'] == 1
+        assert len(saved) == 1
+
+        # rebuilt when a data file changes
+        data_file = tmp_path / Config.DATA_FILES[0].lstrip('/')
+        data_file.write_text(json.dumps([{'term': 'charizard', 'placeholder': 10}]))
+        assert DataPulls.loadStore(str(tmp_path)).search("charizard").get()['placeholder'] == 10
+        assert len(saved) == 2
+
+        # and when the configuration it's built with changes
+        monkeypatch.setattr(Config, 'DATA_SYMSPELL_PREFIX_LENGTH', None)
+        DataPulls.loadStore(str(tmp_path))
+        DataPulls.loadStore(str(tmp_path))
+        assert len(saved) == 3
+
+        # no temporary file is left behind
+        snapshot_dir = (tmp_path / Config.DATA_SNAPSHOT_FILE.lstrip('/')).parent
+        assert [path.name for path in snapshot_dir.iterdir() if path.name.endswith('.tmp')] == []
+
+    def test_LazyPayloads(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, 'DATA_LAZY_PAYLOADS', True)
+        monkeypatch.setattr(Config, 'DATA_PAYLOAD_CACHE_SIZE', 2)
+        writeTestData(tmp_path)
+
+        with codecs.open('tests/test_data.json', "r", "utf-8") as data_file:
+            test_data = json.load(data_file)
+
+        # built from the json files, then loaded from the snapshot
+        for _ in range(2):
+            data = DataPulls.DataPulls(scriptpath=str(tmp_path))
+            for value in test_data:
+                item = data.getInfo(value['term'])
+                assert isinstance(item._value, int)
+                assert item.get() == value
+                assert item.get('placeholder') == value['placeholder']
+            assert data.getInfo("charzard mga").get('placeholder') == 2
+            assert len(data.store.index.clusters[None].items['charizard'].payloads.cache) == 2
+
+        # an outdated payload file isn't used
+        payload_file = tmp_path / Config.DATA_PAYLOAD_FILE.lstrip('/')
+        payload_file.write_bytes(payload_file.read_bytes()[:-1])
+        data = DataPulls.DataPulls(scriptpath=str(tmp_path))
+        assert data.getInfo("bulbasaur").get() == test_data[-1]
+
+        # a failed write leaves the payload file and no temporary file behind
+        contents = payload_file.read_bytes()
+        try:
+            Payloads.save(str(payload_file), b'k' * 32, [{'term': object()}])
+            assert False
+        except TypeError:
+            pass
+        assert payload_file.read_bytes() == contents
+        assert [path.name for path in payload_file.parent.iterdir() if path.name.endswith('.tmp')] == []
+
+    def test_ReloadMemory(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, 'DATA_SNAPSHOT_FILE', None)
+
+        writeTestData(tmp_path)
+
+        data = DataPulls.DataPulls(scriptpath=str(tmp_path))
+        word_counts = dict(data.store.spelling.words)
+
+        tracemalloc.start()
+        try:
+            for _ in range(5):
+                data.reload()
+            gc.collect()
+            before, _ = tracemalloc.get_traced_memory()
+
+            for _ in range(45):
+                old_spelling = weakref.ref(data.store.spelling)
+                data.reload()
+                gc.collect()
+                # the spelling dictionary is freed together with the old store
+                assert old_spelling() is None
+            after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert after - before < 64 * 1024
+        assert dict(data.store.spelling.words) == word_counts
+        assert data.store.search("charzard mga").get()['placeholder'] == 2
+
+    def test_ReloadAsync(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, 'DATA_SNAPSHOT_FILE', None)
+        writeTestData(tmp_path)
+
+        data = DataPulls.DataPulls(scriptpath=str(tmp_path))
+        done = threading.Event()
+        results = []
+
+        def callback(store, seconds, error):
+            results.append((store, error))
+            done.set()
+
+        # a failed reload keeps the current store
+        old_store = data.store
+        writeTestData(tmp_path, '[{"term": "broken"')
+        assert data.reloadAsync(callback)
+        assert done.wait(10)
+        assert results[-1][1] is not None
+        assert data.store is old_store
+        assert data.getInfo("charzard").get()['placeholder'] == 1
+
+        # a successful reload swaps in the new store
+        done.clear()
+        writeTestData(tmp_path, '[{"term": "pikachu", "placeholder": 25}]')
+        assert data.reloadAsync(callback)
+        assert done.wait(10)
+        assert results[-1] == (data.store, None)
+        assert data.store is not old_store
+        assert data.store.itemCounts() == {None: 1}
+        assert data.getInfo("pikachu").get()['placeholder'] == 25
+
+    # the operator's ReloadData command: the new store is prepared before
+    # it's swapped in, and the replies are sent from the main loop
+    def test_ReloadData(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, 'DATA_SNAPSHOT_FILE', None)
+        monkeypatch.setattr(Config, 'REPLY_PRERENDER', True)
+        monkeypatch.setattr(Config, 'DATA_LAZY_PAYLOADS', False)
+        writeTestData(tmp_path)
+
+        main = RedditBot.CallResponse(reddit=False, data=DataPulls.DataPulls(scriptpath=str(tmp_path)))
+        old_store = main.data.store
+        prepared = []
+        renderAll = main.renders.renderAll
+        def checkedRenderAll(store):
+            prepared.append((store, main.data.store))
+            return renderAll(store)
+        monkeypatch.setattr(main.renders, 'renderAll', checkedRenderAll)
+
+        class Message(object):
+            def __init__(self, fails):
+                self.fails = fails
+                self.replies = []
+            def reply(self, body):
+                if self.fails:
+                    raise ValueError(body)
+                self.replies.append(body)
+
+        failing, message = Message(True), Message(False)
+        main.mgmt.queueReply(failing, 'first')
+        assert main.mgmt.bot_reloadData(message)
+        for i in range(100):
+            if main.mgmt.pending_replies.qsize() == 2:
+                break
+            threading.Event().wait(0.1)
+
+        # rendered while the current store was still in use
+        assert prepared[0][0] is main.data.store and prepared[0][1] is old_store
+        assert main.renders.state[0] is main.data.store and len(main.renders) > 0
+
+        # the failed reply doesn't keep the next ones from being sent
+        main.mgmt.sendPendingReplies()
+        assert message.replies[0].startswith('Data reloaded in ')
+        assert main.mgmt.pending_replies.empty()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import gc, time, sqlite3, weakref
+from PokeFacts import Config
+from PokeFacts import DoneQueue
+from PokeFacts import RedditBot
+
+class Thing(object):
+    def __init__(self, id, created_utc, edited=False):
+        self.id = id
+        self.created_utc = created_utc
+        self.edited = edited
+
+def rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return dict((row[0], row[1:]) for row in connection.execute("SELECT * FROM done"))
+    finally:
+        connection.close()
+
+class TestDoneQueue(object):
+    def test_Memory(self):
+        now = [1000.0]
+        done = DoneQueue.DoneQueue(size=3, ttl=60, clock=lambda: now[0])
+
+        for id in ['a', 'b', 'c']:
+            done.add(id)
+        done.setReply('a', 'ra')
+        assert done.get('a') == {"reply_id": 'ra', "last_process": 1000.0}
+        assert done.add('a')["reply_id"] == 'ra'
+
+        # the least recently used is dropped
+        done.add('d')
+        assert len(done) == 3 and not 'b' in done and 'a' in done
+
+        # and so are those processed too long ago
+        now[0] += 61
+        assert done.get('a') is None and not 'd' in done
+        assert done.add('a') == {"reply_id": None, "last_process": 1061.0}
+
+    def test_Sqlite(self, tmp_path):
+        path = str(tmp_path / 'done.sqlite3')
+        now = [1000.0]
+        done = DoneQueue.SqliteDoneQueue(path, size=2, ttl=600, batch=3, interval=60, clock=lambda: now[0])
+        assert done.lastActive() is None
+
+        # things are written in batches
+        done.add('a')
+        done.add('b')
+        assert rows(path) == {} and done.stats()['unwritten'] == 2
+        done.add('c')
+        assert sorted(rows(path)) == ['a', 'b', 'c']
+
+        # or after an interval
+        done.add('d')
+        now[0] += 60
+        done.add('e')
+        assert sorted(rows(path)) == ['a', 'b', 'c', 'd', 'e']
+
+        # replies right away
+        done.setReply('a', 'ra')
+        assert rows(path)['a'] == ('ra', 1000.0)
+
+        # only 2 are kept in memory, the others are read back from the file
+        assert len(done) == 2
+        assert done.get('b') == {"reply_id": None, "last_process": 1000.0}
+        done.close()
+
+        # after a restart
+        now[0] += 100
+        done = DoneQueue.SqliteDoneQueue(path, ttl=600, clock=lambda: now[0])
+        assert done.lastActive() == 1060.0
+        assert done.get('a')["reply_id"] == 'ra' and 'e' in done and not 'f' in done
+
+        # expired things are forgotten, and removed from the file when it's written
+        now[0] += 470
+        assert not 'a' in done and 'e' in done
+        done.add('f')
+        done.flush()
+        assert sorted(rows(path)) == ['e', 'f']
+
+        done.clear()
+        assert rows(path) == {} and not 'e' in done
+        done.close()
+
+    def test_Pending(self, tmp_path):
+        path = str(tmp_path / 'done.sqlite3')
+        now = [1000.0]
+        done = DoneQueue.SqliteDoneQueue(path, ttl=600, batch=1, clock=lambda: now[0])
+
+        # things being replied to are known, but not written
+        done.start('a', created=990.0)
+        done.start('b', created=995.0)
+        assert 'a' in done and done.stats()['pending'] == 2
+        done.flush()
+        assert rows(path) == {}
+
+        # until they're done, with or without a reply
+        now[0] += 10
+        done.setReply('b', 'rb')
+        done.add('c')
+        assert sorted(rows(path)) == ['b', 'c'] and done.stats()['pending'] == 1
+        assert done.start('b') == {"reply_id": 'rb', "last_process": 1000.0}
+
+        # the bot stops while "a" is pending: it was last active when "a" was posted
+        done.close()
+        done = DoneQueue.SqliteDoneQueue(path, ttl=600, clock=lambda: now[0])
+        assert done.lastActive() == 990.0 and not 'a' in done
+        done.add('a')
+        done.flush()
+        assert done.stats()['pending'] == 0
+        done.close()
+        done = DoneQueue.SqliteDoneQueue(path, ttl=600, clock=lambda: now[0])
+        assert done.lastActive() == 1010.0 and 'a' in done
+        done.close()
+
+    # the pending things are bounded, even without the SQLite file
+    def test_PendingBound(self, tmp_path):
+        now = [1000.0]
+        done = DoneQueue.DoneQueue(size=4, ttl=60, clock=lambda: now[0])
+
+        for number in range(5):
+            done.start('t%d' % number, created=1000.0 + number)
+        assert sorted(done.pending) == ['t3', 't4']
+
+        # expired ones are forgotten first
+        now[0] += 70
+        for number in range(5, 8):
+            done.start('t%d' % number, created=now[0])
+        assert sorted(done.pending) == ['t5', 't6', 't7']
+        done.start('t8', created=1000.0)
+        done.start('t9', created=now[0])
+        assert sorted(done.pending) == ['t5', 't6', 't7', 't9']
+
+        # the open files are closed when the bot exits, but not kept alive
+        done = DoneQueue.SqliteDoneQueue(str(tmp_path / 'done.sqlite3'))
+        assert done in DoneQueue.OPEN
+        done.close()
+        assert not done in DoneQueue.OPEN
+        reference = weakref.ref(DoneQueue.SqliteDoneQueue(str(tmp_path / 'done.sqlite3')))
+        gc.collect()
+        assert reference() is None
+
+    def test_CatchUp(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, 'DONE_CATCHUP_MAX', 3600)
+        path = str(tmp_path / 'done.sqlite3')
+        now = time.time()
+
+        # the bot was last active 10 minutes ago, and had replied to "a"
+        done = DoneQueue.SqliteDoneQueue(path, clock=lambda: now - 600)
+        done.setReply('a', 'ra')
+        done.close()
+
+        main = RedditBot.CallResponse(reddit=False, done=DoneQueue.SqliteDoneQueue(path))
+        assert main.startTime == now - 600
+
+        # posted while the bot was down: processed, but not twice
+        assert main.should_break(Thing('a', now - 700)) == True
+        assert main.should_break(Thing('a', now - 300)) == True
+        assert main.should_break(Thing('a', now - 300, edited=now - 60)) == False
+        assert main.should_break(Thing('b', now - 300)) == False
+
+        # "c" is queued, and the bot stops before replying to it: it's
+        # processed again after the restart
+        main.done.start('c', now - 200)
+        assert main.should_break(Thing('c', now - 200)) == True
+        main.done.close()
+        main = RedditBot.CallResponse(reddit=False, done=DoneQueue.SqliteDoneQueue(path))
+        assert main.startTime == now - 200
+        assert main.should_break(Thing('c', now - 200)) == False
+        main.done.close()
+
+        # down for longer than DONE_CATCHUP_MAX: only the last hour
+        done = DoneQueue.SqliteDoneQueue(path, clock=lambda: now - 5 * 3600)
+        done.flush()
+        done.close()
+        main = RedditBot.CallResponse(reddit=False, done=DoneQueue.SqliteDoneQueue(path))
+        assert now - 3600 <= main.startTime < now - 3500
+        main.done.close()
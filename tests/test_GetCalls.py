@@ -17,4 +17,11 @@ def test_GetCalls():
 
     calls = main.get_calls("{charizard} {charzard} { charizard }")
     assert len(calls) == 1
-    assert calls[0].term == 'charizard'
\ No newline at end of file
+    assert calls[0].term == 'charizard'
+
+    calls = main.get_calls("{venusaur mga} <bulbsaur> {charzard} {Venusaur Mga}")
+    assert [call.get('placeholder') for call in calls] == [4, 5, 1]
+
+    # standalone calls after whitespace, mismatched pairs are ignored
+    calls = main.get_calls("what about !bulbsaur and {charizard>")
+    assert [call.term for call in calls] == ['bulbasaur']
@@ -62,4 +62,25 @@ class TestHelpers(object):
                 result, res_prefix = helpers.validateIdentifier(prefix + input_data)
 
                 assert result == expected_result
-                assert res_prefix == prefix
\ No newline at end of file
+                assert res_prefix == prefix
+
+    def test_normalizeIdentifier(self):
+        for query, expected_result in self.validateIdentifier_getTestData().items():
+            assert helpers.normalizeIdentifier(query) == expected_result
+
+        # decomposed accents are removed too
+        assert helpers.normalizeIdentifier("Flabe\u0301be\u0301") == "flabebe"
+
+    def test_CallExtractor(self):
+        extractor = Helpers.CallExtractor()
+        body = "!Flabébé and {Charizard  Mega-X}, <mr. mime> {mismatched>\n!pikachu but not a!b"
+
+        calls = list(extractor.extract(body))
+        assert [(prefix, identifier) for prefix, identifier, span in calls] == [
+            ('!', 'flabebe'), ('{', 'charizard megax'), ('<', 'mr mime'), ('!', 'pikachu')]
+        assert [body[start:end] for prefix, identifier, (start, end) in calls] == [
+            "!Flabébé", "{Charizard  Mega-X}", "<mr. mime>", "!pikachu"]
+
+        # the same identifiers as validateIdentifier
+        for prefix, identifier, (start, end) in calls:
+            assert helpers.validateIdentifier(body[start:end]) == (identifier, prefix)
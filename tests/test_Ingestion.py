@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+from PokeFacts import Config
+from PokeFacts import Ingestion
+
+class Thing(object):
+    def __init__(self, number):
+        self.fullname = 't1_%d' % number
+
+# a listing of things numbered in the order they were created, like reddit's
+# it returns the newest first, and with `before` those newer than a thing
+class FakeListing(object):
+    def __init__(self):
+        self.things = []
+        self.requests = []
+        self.created = 0
+
+    def add(self, count):
+        self.things.extend(Thing(number) for number in range(self.created, self.created + count))
+        self.created += count
+
+    def fetch(self, limit, params):
+        self.requests.append(dict(params))
+        things = self.things
+        if 'before' in params:
+            fullnames = [thing.fullname for thing in things]
+            if not params['before'] in fullnames:
+                return []
+            things = things[fullnames.index(params['before']) + 1:]
+            things = things[:limit]
+        else:
+            things = things[-limit:]
+        return list(reversed(things))
+
+# a listing fetched like praw's ListingGenerator: a page at a time until it
+# has `limit` things, going on with `after` (the things older than the last
+# one) when a page is short. With `overlap`, a page starts with the last
+# thing of the previous one, as when the listing changes between requests
+class PagingListing(FakeListing):
+    def __init__(self, page_size, overlap=False):
+        FakeListing.__init__(self)
+        self.page_size = page_size
+        self.overlap = overlap
+        self.yielded = 0
+
+    def page(self, params):
+        fullnames = [thing.fullname for thing in self.things]
+        if 'after' in params:
+            end = fullnames.index(params['after']) + (1 if self.overlap else 0)
+            return list(reversed(self.things[max(0, end - self.page_size):end]))
+        if 'before' in params:
+            start = fullnames.index(params['before']) + 1
+            return list(reversed(self.things[start:start + self.page_size]))
+        return list(reversed(self.things[-self.page_size:]))
+
+    def fetch(self, limit, params):
+        self.requests.append(dict(params))
+        params = dict(params)
+        count = 0
+        while count < limit:
+            page = self.page(params)
+            for thing in page[:limit - count]:
+                count += 1
+                self.yielded += 1
+                yield thing
+            # a short page ends the listing, unless it's the one newer than `before`
+            if not page or (len(page) < self.page_size and not 'before' in params):
+                return
+            params.pop('before', None)
+            params['after'] = page[-1].fullname
+
+# a listing of edited things, a thing edited again moves to the top
+class EditedListing(FakeListing):
+    def edit(self, number, edited):
+        self.things = [thing for thing in self.things if thing.fullname != 't1_%d' % number]
+        thing = Thing(number)
+        thing.edited = edited
+        self.things.append(thing)
+
+def numbers(things):
+    return [int(thing.fullname[3:]) for thing in things]
+
+class TestIngestion(object):
+    def test_Cursor(self):
+        listing = FakeListing()
+        source = Ingestion.ListingSource('comments', listing.fetch, limit=5)
+
+        listing.add(8)
+        assert numbers(source.poll(0)) == [3, 4, 5, 6, 7]
+        assert source.poll(10) == []
+        assert listing.requests[-1] == {'before': 't1_7'}
+
+        # a busy listing is caught up a page at a time, oldest first
+        listing.add(7)
+        assert numbers(source.poll(20)) == [8, 9, 10, 11, 12]
+        assert numbers(source.poll(30)) == [13, 14]
+
+    def test_CursorReset(self, monkeypatch):
+        monkeypatch.setattr(Config, 'INGEST_CURSOR_RESET_POLLS', 2)
+        listing = FakeListing()
+        source = Ingestion.ListingSource('comments', listing.fetch, limit=5)
+
+        listing.add(3)
+        source.poll(0)
+        # the thing of the cursor is deleted
+        del listing.things[2]
+        listing.add(2)
+        assert source.poll(10) == [] and source.poll(20) == []
+        assert source.cursor is None
+
+        # the things seen before are not returned again
+        assert numbers(source.poll(30)) == [3, 4]
+        assert source.cursor == 't1_4'
+
+    def test_Interval(self, monkeypatch):
+        monkeypatch.setattr(Config, 'INGEST_MIN_INTERVAL', 5)
+        monkeypatch.setattr(Config, 'INGEST_MAX_INTERVAL', 120)
+        monkeypatch.setattr(Config, 'INGEST_TARGET_BATCH', 20)
+        listing = FakeListing()
+        source = Ingestion.ListingSource('comments', listing.fetch, limit=100)
+
+        # quiet: the interval doubles up to the maximum
+        intervals = []
+        for now in range(0, 700, 100):
+            source.poll(now)
+            intervals.append(source.interval)
+        assert intervals == [10, 20, 40, 80, 120, 120, 120]
+
+        # 2 things per second: about 20 things per poll
+        for now in range(700, 1000, 10):
+            listing.add(20)
+            source.poll(now)
+        assert 9 < source.interval < 11
+
+        # a full page: polled again as soon as possible
+        listing.add(150)
+        source.poll(1010)
+        assert source.interval == 5
+
+    def test_Scheduler(self, monkeypatch):
+        monkeypatch.setattr(Config, 'INGEST_MIN_INTERVAL', 5)
+        monkeypatch.setattr(Config, 'INGEST_MAX_INTERVAL', 120)
+        monkeypatch.setattr(Config, 'INGEST_TARGET_BATCH', 20)
+        monkeypatch.setattr(Config, 'INGEST_REQUESTS_PER_MINUTE', 2)
+        busy, quiet = FakeListing(), FakeListing()
+        scheduler = Ingestion.Scheduler([Ingestion.ListingSource('busy', busy.fetch),
+                                         Ingestion.ListingSource('quiet', quiet.fetch)])
+
+        # both are due at first
+        assert [source.name for source, things in scheduler.poll(0)] == ['busy', 'quiet']
+
+        # a thing per second on the busy listing, for an hour
+        now = 0
+        while now < 3600:
+            now += scheduler.sleepTime(now)
+            busy.add(int(now) - busy.created)
+            scheduler.poll(now)
+
+        # the budget is kept and mostly goes to the busy listing
+        polls = dict((name, stats['polls']) for name, stats in scheduler.stats().items())
+        assert polls['busy'] + polls['quiet'] <= 2 * 60 + 2
+        assert polls['busy'] > 5 * polls['quiet']
+        assert scheduler.stats()['busy']['things'] == len(busy.things)
+
+        # a reloaded listing keeps its cursor and traffic
+        stats = scheduler.stats()['busy']
+        scheduler.setSources([Ingestion.ListingSource('busy', busy.fetch)])
+        assert scheduler.stats()['busy'] == stats
+        assert scheduler.poll(now) == [] and scheduler.sleepTime(now) > 0
+
+    def test_Paging(self):
+        listing = PagingListing(page_size=3)
+        source = Ingestion.ListingSource('comments', listing.fetch, limit=5)
+
+        listing.add(4)
+        assert numbers(source.poll(0)) == [0, 1, 2, 3]
+
+        # the page newer than the cursor is short, the things older than it
+        # praw goes on with are not read
+        listing.add(2)
+        listing.yielded = 0
+        assert numbers(source.poll(10)) == [4, 5]
+        assert listing.yielded == 3 and source.cursor == 't1_5'
+
+        # a thing in two pages is only returned once
+        listing = PagingListing(page_size=3, overlap=True)
+        source = Ingestion.ListingSource('comments', listing.fetch, limit=5)
+        listing.add(8)
+        assert numbers(source.poll(0)) == [4, 5, 6, 7]
+
+    def test_Edited(self):
+        listing = EditedListing()
+        source = Ingestion.ListingSource('edited', listing.fetch, limit=5, use_cursor=False, key=Ingestion.editKey)
+
+        listing.edit(0, 100)
+        listing.edit(1, 110)
+        assert numbers(source.poll(0)) == [0, 1]
+
+        # edited again: new again, once
+        listing.edit(0, 120)
+        things = source.poll(10)
+        assert numbers(things) == [0] and things[0].edited == 120
+        assert source.poll(20) == []
+
+        # the newest thing edited again, it would have been the cursor
+        listing.edit(0, 130)
+        things = source.poll(30)
+        assert numbers(things) == [0] and things[0].edited == 130
+        assert listing.requests[-1] == {}
+
+        # more edits than a page
+        for number in range(2, 9):
+            listing.edit(number, 140 + number)
+        assert numbers(source.poll(40)) == [4, 5, 6, 7, 8]
+        assert source.poll(50) == []
+
+    def test_FixedInterval(self, monkeypatch):
+        monkeypatch.setattr(Config, 'INGEST_MIN_INTERVAL', 5)
+        monkeypatch.setattr(Config, 'INGEST_MAX_INTERVAL', 120)
+        monkeypatch.setattr(Config, 'INGEST_REQUESTS_PER_MINUTE', 14)
+        busy, inbox = FakeListing(), FakeListing()
+        scheduler = Ingestion.Scheduler([Ingestion.ListingSource('busy', busy.fetch),
+                                         Ingestion.ListingSource('inbox', inbox.fetch, limit=5,
+                                                                 use_cursor=False, interval=5)])
+
+        # the inbox stays at its interval while quiet, and isn't stretched,
+        # the busy listing gets what's left of the budget
+        now = 0
+        while now < 600:
+            busy.add(100)
+            scheduler.poll(now)
+            now += scheduler.sleepTime(now)
+
+        polls = dict((name, stats['polls']) for name, stats in scheduler.stats().items())
+        assert scheduler.stats()['inbox']['interval'] == 5
+        assert polls['inbox'] == 120
+        assert polls['busy'] <= 2 * 10 + 1
+
+        # a reloaded inbox keeps its interval
+        scheduler.setSources([Ingestion.ListingSource('inbox', inbox.fetch, limit=5,
+                                                      use_cursor=False, interval=5)])
+        assert scheduler.sleepTime(now) <= 5
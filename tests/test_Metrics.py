@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import threading
+from PokeFacts import Config
+from PokeFacts import Management
+from PokeFacts import Metrics
+
+class TestMetrics(object):
+    def test_RollingHistogram(self):
+        histogram = Metrics.RollingHistogram((1, 10), window=4)
+        for value in [0.5, 5, 50, 2, 3, 4]:
+            histogram.add(value)
+
+        summary = histogram.summary()
+        # the count and mean are of every sample, the rest of the last 4
+        assert summary['count'] == 6 and summary['mean'] == 64.5 / 6
+        assert summary['window'] == 4
+        assert summary['p50'] == 4 and summary['max'] == 50
+        assert summary['buckets'] == [(1, 0), (10, 3), (None, 1)]
+
+    # the pipeline's threads add samples while others are summarized
+    def test_Threads(self):
+        histogram = Metrics.RollingHistogram((1, 10), window=100)
+        def add():
+            for i in range(20000):
+                histogram.add(i % 20)
+
+        threads = [threading.Thread(target=add) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            assert histogram.summary()['window'] <= 100
+        for thread in threads:
+            thread.join()
+
+        summary = histogram.summary()
+        assert summary['count'] == 80000 and summary['mean'] == 9.5
+
+    def test_Disabled(self, monkeypatch, createCallResponse):
+        monkeypatch.setattr(Config, 'METRICS_ENABLED', False)
+        Metrics.reset()
+
+        main = createCallResponse()
+        assert main.get_calls("{charzard} {venusaur mga}")
+        assert Metrics.start() is None
+        assert Metrics.report() == {'enabled': False, 'timers': {}, 'sizes': {}}
+
+    def test_Stages(self, monkeypatch, createCallResponse):
+        monkeypatch.setattr(Config, 'METRICS_ENABLED', True)
+        Metrics.reset()
+
+        main = createCallResponse()
+        assert len(main.get_calls("{charzard} {venusaur mga} {charizard} <bulbasaur>")) == 3
+
+        report = Metrics.report()
+        assert report['timers']['get_calls']['count'] == 1
+        assert report['timers']['extractCalls']['count'] == 1
+        assert report['timers']['normalizeTerm']['count'] == 4
+        assert report['timers']['search']['count'] == 4
+        # "charizard" and "bulbasaur" are exact terms, only the words of the others are corrected
+        assert report['timers']['spelling']['count'] == 3
+        assert report['timers']['scoring']['count'] == report['sizes']['candidates']['count']
+        assert report['sizes']['calls']['max'] == 4
+        assert report['timers']['getInfo']['mean'] >= report['timers']['search']['mean']
+
+        table = Management.Management.formatMetricsReport(report)
+        assert 'Search metrics are **on**' in table
+        assert '\nextractCalls | 1 | ' in table
+        assert '\ncandidates | ' in table
+
+        Metrics.reset()
+        assert Metrics.report()['timers'] == {}
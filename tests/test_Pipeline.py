@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import time
+import pytest
+from PokeFacts import Config
+from PokeFacts import DoneQueue
+from PokeFacts import Pipeline
+from tests import fakes
+
+class TestPipeline(object):
+    def test_TokenBucket(self):
+        now = [0.0]
+        def sleep(seconds):
+            now[0] += seconds
+
+        bucket = Pipeline.TokenBucket(2.0, 3, clock=lambda: now[0], sleep=sleep)
+        assert [bucket.acquire() for i in range(5)] == [0, 0, 0, 0.5, 0.5]
+
+        # reddit allows 31 more requests in 10 seconds, 1 per second is kept
+        # for the listings: 2 per second are left, then 1 per 10 seconds
+        bucket.follow(31, time.time() + 10, 1.0)
+        assert bucket.rate == 2.0
+        bucket.follow(5, time.time() + 10, 1.0)
+        assert abs(bucket.rate - 0.1) < 0.01 and bucket.tokens == 0
+        assert abs(bucket.acquire() - 10) < 0.1
+
+    def test_Pipeline(self, monkeypatch, createCallResponse):
+        monkeypatch.setattr(Config, 'PIPELINE_ENABLED', True)
+        monkeypatch.setattr(Config, 'PIPELINE_REPLY_WORKERS', 4)
+        monkeypatch.setattr(Config, 'PIPELINE_REPLY_RATE', 1000.0)
+        monkeypatch.setattr(Config, 'PIPELINE_REPLY_BURST', 1000)
+        monkeypatch.setattr(Config, 'INGEST_MIN_INTERVAL', 0.01)
+        monkeypatch.setattr(Config, 'RESPONDER_CHECK_EDITED', False)
+
+        reddit = fakes.FakeReddit(latency=0.05, remaining=600)
+        main = createCallResponse(reddit=reddit, done=DoneQueue.DoneQueue())
+        try:
+            self.checkPipeline(reddit, main)
+        finally:
+            assert main.pipeline.close(10)
+
+    def checkPipeline(self, reddit, main):
+        for number in range(20):
+            body = "{leftovers}" if number % 2 == 0 else "no call"
+            reddit.feed({'kind': 'comment', 'id': 'c%d' % number, 'body': body})
+
+        started = time.time()
+        main.action()
+        assert main.pipeline.drain(10)
+
+        # the replies were sent concurrently, each called comment got one
+        assert reddit.concurrent > 1
+        assert time.time() - started < 10 * reddit.latency
+        for comment in reddit.things:
+            assert len(comment.replies) == (1 if comment.body == "{leftovers}" else 0)
+        assert '**Leftovers**' in reddit.things[0].replies[0].body
+        assert reddit.limits['remaining'] == 590
+        assert main.pipeline.stats()['sent'] == 10
+
+        # an edited comment gets its reply edited, not a second reply
+        comment = reddit.things[0]
+        comment.body = "{rare candy}"
+        comment.edited = time.time() + 1
+        main.process(comment)
+        assert main.pipeline.drain(10)
+        assert len(comment.replies) == 1 and '**Rare Candy**' in comment.replies[0].body
+
+    def test_Errors(self):
+        sent = []
+        failed = []
+        def resolve(thing):
+            if thing.body == "fails":
+                raise ValueError(thing.body)
+            return Pipeline.Reply(thing, thing.body.upper(), 1)
+
+        bucket = Pipeline.TokenBucket(1000.0, 1000)
+        pipeline = Pipeline.Pipeline(resolve, sent.append, workers=2, size=2, bucket=bucket, failed=failed.append)
+        # more things than the queues hold: put waits for room
+        reddit = fakes.FakeReddit()
+        things = [reddit.feed({'kind': 'comment', 'id': number, 'body': "fails" if number == 3 else "call"})
+                  for number in range(10)]
+        for thing in things:
+            pipeline.put(thing)
+        assert pipeline.drain(10)
+        assert len(sent) == 9 and pipeline.stats()['pending'] == 0
+        assert failed == [things[3]]
+
+        # closing sends what's still queued, then stops the threads
+        for thing in things:
+            pipeline.put(thing)
+        assert pipeline.close(10)
+        assert len(sent) == 18 and not any(thread.is_alive() for thread in pipeline.threads)
+        assert pipeline.close(10)
+        with pytest.raises(RuntimeError):
+            pipeline.put(things[0])
+
+    # a thing that fails isn't left pending in the done queue, with the
+    # pipeline or without it
+    def test_Failures(self, monkeypatch, createCallResponse):
+        monkeypatch.setattr(Config, 'PIPELINE_REPLY_RATE', 1000.0)
+        monkeypatch.setattr(Config, 'PIPELINE_REPLY_BURST', 1000)
+        monkeypatch.setattr(Config, 'RESPONDER_CHECK_EDITED', False)
+
+        def reply(thing, body):
+            raise RuntimeError('reddit is down')
+        monkeypatch.setattr(fakes.FakeThing, 'reply', reply)
+
+        for enabled in (False, True):
+            monkeypatch.setattr(Config, 'PIPELINE_ENABLED', enabled)
+            reddit = fakes.FakeReddit()
+            main = createCallResponse(reddit=reddit, done=DoneQueue.DoneQueue())
+            things = [reddit.feed({'kind': 'comment', 'id': 'c%d' % number, 'body': "{leftovers}"})
+                      for number in range(2)]
+
+            # the reply to the first fails, resolving the second fails
+            resolveCalls = main.resolveCalls
+            monkeypatch.setattr(main, 'resolveCalls',
+                                lambda thing: 1 / 0 if thing is things[1] else resolveCalls(thing))
+            for thing in things:
+                if main.pipeline is None:
+                    with pytest.raises(Exception):
+                        main.process(thing)
+                else:
+                    main.process(thing)
+            if main.pipeline is not None:
+                assert main.pipeline.drain(10) and main.pipeline.close(10)
+
+            assert reddit.counts['replies'] == 0
+            assert main.done.stats()['pending'] == 0
+            assert all(main.done.get(thing.id)["reply_id"] is None for thing in things)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import random
+from PokeFacts import Config
+from tests import corpus
+from tests import reference
+
+TYPES = [True, 'pokemon', ['move', 'item'], None]
+
+ITEMS = [{'term': 'thunder',       'type': 'move'},
+         {'term': 'thunder stone', 'type': 'item'},
+         {'term': 'thunder punch', 'type': 'move'},
+         {'term': 'thunder wave',  'type': 'move'},
+         {'term': 'thundurus',     'type': 'pokemon'},
+         {'term': 'mega stone',    'type': 'item'},
+         {'term': 'tapu koko',     'type': 'pokemon'},
+         {'term': 'klefki',        'type': 'pokemon'}]
+
+class TestReference(object):
+    def test_ReferenceAgrees(self, monkeypatch, createStore):
+        for use_symspell in (True, False):
+            monkeypatch.setattr(Config, 'DATA_USE_SYMSPELL', use_symspell)
+            store = createStore(ITEMS)
+            terms = sorted(set(term for cluster in store.index.clusters.values() for term in cluster.items))
+
+            queries = terms + corpus.typos(terms, max_edits=1) + ["foobar", "thundr ston", "kokotapu", "mega"]
+            assert reference.compare(store, [(query, type) for query in queries for type in TYPES]) == []
+
+    def test_ReferenceCauses(self, createStore):
+        store = createStore(ITEMS)
+        terms = sorted(set(term for cluster in store.index.clusters.values() for term in cluster.items))
+
+        # harder typos may be resolved differently, but only because the
+        # store's candidates or tie breaks differ, not its word corrections
+        queries = corpus.typos(terms, max_edits=3, seed=1)
+        for divergence in reference.compare(store, [(query, type) for query in queries for type in TYPES]):
+            assert divergence['cause'] in ('candidates', 'tie')
+
+    def test_ReferenceDivergence(self, createStore):
+        store = createStore(ITEMS)
+        resolver = reference.ReferenceResolver(store)
+
+        # the store only scores the terms using the least common word of
+        # "klefki tapu" ("tapu"), the reference scores "klefki" too
+        assert store.search("klefki tapu", 'pokemon').term == 'tapu koko'
+        assert resolver.search("klefki tapu", 'pokemon').term == 'klefki'
+        assert reference.compare(store, [("klefki tapu", 'pokemon'), ("klefky", 'pokemon')]) == [{
+            'query':    "klefki tapu",
+            'type':     'pokemon',
+            'found':    ('tapu koko', 'pokemon'),
+            'expected': ('klefki', 'pokemon'),
+            'cause':    'candidates',
+        }]
+
+    # the reference doesn't use the store's exact index, so a broken index
+    # shows up as a divergence
+    def test_ReferenceExact(self, monkeypatch, createStore):
+        store = createStore(ITEMS)
+        resolver = reference.ReferenceResolver(store)
+        thunder = store.search('thunder')
+
+        findExact = store.findExact
+        monkeypatch.setattr(store, 'findExact',
+                            lambda term, type=True: thunder if term == 'thunder stone' else findExact(term, type))
+        assert resolver.search('thunder stone').term == 'thunder stone'
+        assert resolver.search('thunderstone', ['move', 'item']).term == 'thunder stone'
+        assert resolver.search('thunder stone', 'move').term == 'thunder'
+        assert [divergence['query'] for divergence in reference.compare(store, [('thunder stone', True), ('thunder', True)])] == ['thunder stone']
+
+    # the divergences on a sample of typos of the shipped terms: the store
+    # misses terms whose least common word is misspelled, and breaks some
+    # ties differently. A change to the search that changes this list must
+    # update it (benchmarks/differential.py reports on the whole corpus)
+    def test_ShippedDivergences(self, shippedStore):
+        queries = [query for kind, query, item in corpus.searchCorpus(shippedStore, nonmatches=0)
+                   if kind.startswith('typo')]
+        queries = random.Random(0).sample(queries, 150)
+
+        divergences = reference.compare(shippedStore, [(query, True) for query in queries])
+        assert [(divergence['query'], divergence['found'], divergence['expected'], divergence['cause'])
+                for divergence in divergences] == [
+            ('rocbat',          ('crobat', 'pokemon'),          None,                           'tie'),
+            ('raind unce',      None,                           ('rain dance', 'move'),         'candidates'),
+            ('ipoka boll',      None,                           ('poke ball', 'item'),          'candidates'),
+            ('night saze',      None,                           ('night daze', 'move'),         'candidates'),
+            ('sykstrike',       None,                           ('psystrike', 'move'),          'candidates'),
+            ('pumpkaboo sure',  ('pumpkaboo super', 'pokemon'), ('pumpkaboo large', 'pokemon'), 'candidates'),
+        ]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import cProfile
+from benchmarks import replay
+
+RECORDS = [
+    {'kind': 'comment', 'id': 'a', 'body': "{leftovers} or <rare candy>?"},
+    {'kind': 'comment', 'id': 'b', 'body': "no call here"},
+    {'kind': 'comment', 'id': 'c', 'body': "{leftovers}", 'author': None},
+    {'kind': 'comment', 'id': 'd', 'body': "{leftovers}", 'author': 'PokeFacts'},
+    {'kind': 'submission', 'id': 'e', 'title': "Help", 'body': "what's {leftovrs}?"},
+    {'kind': 'submission', 'id': 'f', 'title': "Link", 'body': "{leftovers}", 'is_self': False},
+    {'kind': 'message', 'id': 'g', 'subject': "hi", 'body': "{leftovers}"},
+    # edits: the reply to "a" is edited, "b" gets its first reply
+    {'kind': 'comment', 'id': 'a', 'body': "{rare candy}"},
+    {'kind': 'comment', 'id': 'b', 'body': "now !leftovers"},
+]
+
+class TestReplay(object):
+    def test_Replay(self, createStore):
+        store = createStore()
+        for pipeline in (False, True):
+            reddit, latencies, seconds = replay.replayPass(store, RECORDS, repeat=2, pipeline=pipeline, latency=0.001)
+            assert len(latencies) == 18
+            assert reddit.counts == {'replies': 6, 'edits': 2}
+            assert len(reddit.latencies) == 8
+
+            # the reply to "a" was edited to only have the rare candy
+            bodies = [reply.body for reply in reddit.replies.values()]
+            assert sum(body.startswith('**Leftovers**') for body in bodies) == 4
+            assert sum(body.startswith('**Rare Candy**') and not '**Leftovers**' in body for body in bodies) == 2
+
+    def test_Report(self, createStore):
+        store = createStore()
+        profile = cProfile.Profile()
+        replay.replayPass(store, RECORDS, profile=profile)
+
+        hotspots = replay.hotspots(profile, 5)
+        assert len(hotspots) == 5
+        assert hotspots[0]['own_ms'] >= hotspots[-1]['own_ms']
+        assert any('PokeFacts/' in function['function'] for function in replay.hotspots(profile, 50))
+
+        report = {'throughput': 100.0, 'process': {'p50_ms': 1.0, 'p95_ms': 2.0, 'p99_ms': 3.0},
+                  'reply': None, 'replies': 6, 'edits': 2}
+        assert replay.compare(report, report, 0.2) == []
+        slower = dict(report, throughput=70.0, process={'p50_ms': 1.0, 'p95_ms': 3.0, 'p99_ms': 3.0}, replies=5)
+        assert replay.compare(slower, report, 0.2) == ['throughput: 70.0 < 100.0',
+                                                       'process p95_ms: 3.0000 > 2.0000',
+                                                       'replies: 5 != 6']
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import codecs
+from PokeFacts import Responder
+
+class TestResponder(object):
+    def test_ReplyTemplate(self):
+        with codecs.open('PokeFacts/data/response.txt', "r", "utf-8") as template_file:
+            text = template_file.read()
+
+        values = {'author': 'someone', 'subreddit': 'pokemon', 'permalink': None,
+                  'botname': 'PokeFacts', 'body': '**Pound**'}
+        assert Responder.ReplyTemplate(text).format(**values) == text.format(**values)
+
+        for text in ["{{literal}} {a!r:>8} {b:.2f}{a}", "{a.real} {b}", "{b:{a}}", "no fields", ""]:
+            assert Responder.ReplyTemplate(text).format(a=5, b=1.5) == text.format(a=5, b=1.5)
+
+    def test_RenderCache(self, monkeypatch, createStore):
+        store = createStore()
+        items = [store.search(term) for term in ['pound', 'leftovers', 'missingno']]
+
+        response = ''.join([Responder.getResponse(items[0]), Responder.getResponse(items[1]),
+                            Responder.getResponse(items[2], True)])
+
+        rendered = []
+        getFragment = Responder.getFragment
+        monkeypatch.setattr(Responder, 'getFragment', lambda item: rendered.append(item.term) or getFragment(item))
+
+        cache = Responder.RenderCache()
+        fragments = [cache.get(store, item) for item in items]
+        assert fragments[0].startswith('**Pound** (Category: physical)')
+        assert fragments[2] == ""
+        assert Responder.SEPARATOR.join(fragments) == response
+
+        # each item is only rendered once per store
+        assert [cache.get(store, item) for item in items] == fragments
+        assert rendered == ['pound', 'leftovers', 'missingno']
+
+        # a new store (the data was reloaded) gets new fragments
+        store = createStore()
+        cache.get(store, store.search('pound'))
+        assert len(cache) == 1 and rendered[-1] == 'pound'
+
+        # every item of the store is rendered
+        cache.prerender(store)
+        assert len(cache) == len(set(id(item) for cluster in store.index.clusters.values()
+                                     for item in cluster.items.values())) == 9
+        count = len(rendered)
+        assert cache.get(store, store.search('leftovers')) == fragments[1]
+        assert len(rendered) == count
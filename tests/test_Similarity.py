@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import random
+from PokeFacts import Similarity
+from tests import corpus
+
+def lcsLength(a, b):
+    row = [0] * (len(b) + 1)
+    for char in a:
+        diagonal = 0
+        for j in range(len(b)):
+            diagonal, row[j + 1] = row[j + 1], diagonal + 1 if char == b[j] else max(row[j + 1], row[j])
+    return row[-1]
+
+class TestSimilarity(object):
+    def test_IndelScorer(self):
+        scorer = Similarity.IndelScorer()
+        rnd = random.Random(0)
+
+        for _ in range(2000):
+            a = ''.join(rnd.choice('abcd') for _ in range(rnd.randrange(12)))
+            b = ''.join(rnd.choice('abcd') for _ in range(rnd.randrange(12)))
+            assert scorer.lcsLength(a, b) == lcsLength(a, b)
+
+        assert scorer.ratio('', '') == 1.0
+        assert scorer.ratio('charizard', 'charizard') == 1.0
+        assert scorer.ratio('charizard', 'charzard') == Similarity.SequenceMatcherScorer().ratio('charizard', 'charzard')
+        assert scorer.ratio('mew', 'charizardmegax', cutoff=0.5) == 0.0
+
+        # below the cutoff the ratio may be 0.0, above it it's exact
+        for _ in range(2000):
+            a = ''.join(rnd.choice('abcdef') for _ in range(rnd.randrange(1, 12)))
+            b = ''.join(rnd.choice('abcdef') for _ in range(rnd.randrange(1, 12)))
+            cutoff = rnd.random()
+            exact = scorer.ratio(a, b)
+            assert scorer.ratio(a, b, cutoff) in ((exact,) if exact >= cutoff else (0.0, exact))
+        # stops at the characters of `b` missing from `a`
+        assert scorer.lcsLength('abc', 'xyzabc', minimum=4) is None
+        assert scorer.lcsLength('abc', 'xyzabc', minimum=3) == 3
+
+    # both scorers should resolve misspellings of the shipped terms to the
+    # same items. Divergences are reported, the only ones allowed are
+    # misspellings the fast scorer resolves to the right term
+    def test_SameWinner(self, shippedStore):
+        store = shippedStore
+        fast = store.scorer = Similarity.IndelScorer()
+        reference = Similarity.SequenceMatcherScorer()
+
+        items = {}
+        for cluster in store.index.clusters.values():
+            for item in cluster.items.values():
+                items[item.term] = item
+        terms = sorted(items)
+
+        # corpus.typos gives one typo per term for each number of edits
+        queries = zip([term for term in terms for edits in (1, 2)],
+                      corpus.typos(terms, max_edits=2, seed=1))
+
+        divergences = []
+        total = 0
+        # replacing the scorer clears the store's memo, so each search
+        # computes its similarities with the scorer under test
+        for expected, typo in queries:
+            total += 1
+            store.scorer = reference
+            reference_result = store.searchUncached(typo)
+            store.scorer = fast
+            fast_result = store.searchUncached(typo)
+
+            if reference_result.term != fast_result.term or reference_result.type != fast_result.type:
+                divergences.append((typo, expected, reference_result.term, fast_result.term))
+
+        print("%d divergences in %d queries" % (len(divergences), total))
+        for divergence in divergences:
+            print("  %r: expected %r, reference %r, fast %r" % divergence)
+
+        assert all(fast_term == expected for _, expected, _, fast_term in divergences)
+        assert len(divergences) <= total // 100
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import codecs, json, random
+from PokeFacts import DataPulls
+from PokeFacts import SymSpell
+
+def getWords():
+    with codecs.open('PokeFacts/data/pokemon.json', "r", "utf-8") as data_file:
+        terms = [DataPulls.normalizeTerm(item['term']) for item in json.load(data_file)]
+
+    words = []
+    for term in terms:
+        words += term.split() + [term.replace(' ', '')]
+    return words
+
+def getTypos(words, seed=0):
+    rnd = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    typos = []
+    for word in sorted(set(words)):
+        for edits in (1, 2, 3):
+            typo = list(word)
+            for _ in range(edits):
+                i = rnd.randrange(len(typo))
+                op = rnd.randrange(3)
+                if op == 0 and len(typo) > 1:
+                    del typo[i]
+                elif op == 1:
+                    typo.insert(i, rnd.choice(letters))
+                else:
+                    typo[i] = rnd.choice(letters)
+            typos.append(''.join(typo))
+    return typos
+
+class TestSymSpell(object):
+    def test_dameraulevenshtein(self):
+        spelling = SymSpell.SymSpell()
+        legacy = SymSpell.LegacySymSpell()
+
+        for a, b in [('ba', 'abc'), ('fee', 'deed'), ('charizard', 'charzard'),
+                     ('venusaur', 'veunsaur'), ('pikachu', 'raichu')]:
+            distance = legacy.dameraulevenshtein(a, b)
+            assert spelling.dameraulevenshtein(a, b) == distance
+            for max_distance in range(4):
+                assert spelling.dameraulevenshtein(a, b, max_distance) == min(distance, max_distance + 1)
+
+    def test_SameAsLegacy(self):
+        words = getWords()
+
+        legacy = SymSpell.LegacySymSpell()
+        engines = [SymSpell.SymSpell(), SymSpell.SymSpell(prefix_length=7)]
+        for word in words:
+            legacy.create_dictionary_entry(word)
+            for spelling in engines:
+                spelling.create_dictionary_entry(word)
+
+        for typo in getTypos(words) + ['m', 'x', 'ab', 'foobar']:
+            expected = legacy.best_word(typo)
+            for spelling in engines:
+                assert spelling.best_word(typo) == expected, typo